@@ -6,6 +6,15 @@ import wget
 import os
 import pickle as pkl
 import numpy as np
+import threading
+
+#: Seconds to wait for the bot to acknowledge a request of each action.
+COMMAND_TIMEOUTS = {'move': 120, 'move_rel': 60, 'prune_radial': 10, 'photo': 60, 'water': 10,
+                    'read_pin': 10, 'servo': 10, 'prune_scissor': 10}
+#: Seconds the water stays on.
+WATER_TIME = 3.5
+#: Seconds the scissors servo turns to close and to open the scissors, and to stop.
+SCISSOR_CLOSE_TIME, SCISSOR_OPEN_TIME, SCISSOR_STOP_TIME = 5.5, 5.2, 0.5
 
 # Before we begin, we must download an access token from the
 # API. To avoid copy/pasting passwords, it is best to create
@@ -50,7 +59,7 @@ class MyHandler:
     # The `on_connect` event is called whenever the device
     # connects to the MQTT server. You can place initialization
     # logic here.
-    def __init__(self):
+    def __init__(self, time_scale=1.0):
         self.action = None
         self.coords = None
 
@@ -58,69 +67,99 @@ class MyHandler:
         self.bot = None
         self.read = None
 
+        # Actions wait for the responses to their requests instead of sleeping.
+        self.connected = threading.Event()
+        self.responses = {}
+        self.response_cv = threading.Condition()
+        self.read_done = threading.Event()
+        # Scales the water and scissors times, to run against a fake bot faster.
+        self.time_scale = time_scale
+
     def update(self, action, coords):
         assert action in ['prune_radial', 'move', 'photo', 'move_rel', 'water', 'read_pin', 'servo', 'prune_scissor'], "Not in list of actions"
         self.action = action
         self.coords = coords
         self.execute()  
 
+    def wait(self, request_id):
+        """ Block until the bot responds to a request, at most the timeout of the current action.
+            Raises a RuntimeError with the errors of a failed request.
+        """
+        timeout = COMMAND_TIMEOUTS[self.action]
+        with self.response_cv:
+            if not self.response_cv.wait_for(lambda: request_id in self.responses, timeout):
+                raise TimeoutError("No response to " + self.action + " request " + str(request_id) + " in " + str(timeout) + "s")
+            errors = self.responses.pop(request_id)
+        if errors is not None:
+            raise RuntimeError(self.action + " request " + str(request_id) + " failed: " + str(errors))
+
     def execute(self):
         if self.action == 'move':
             if isinstance(self.coords, list):
                 for i in self.coords:
                     request_id = self.bot.move_absolute(x=max(0, min(i[0], 2715)), y=max(0, min(i[1], 1200)), z=i[2])
                     print("MOVE_ABS REQUEST ID: " + request_id)
+                    self.wait(request_id)
             else:
                 x, y, z = self.coords[0], self.coords[1], self.coords[2]
                 request_id = self.bot.move_absolute(x=x, y=y, z=z)
                 print("MOVE_ABS REQUEST ID: " + request_id)
+                self.wait(request_id)
 
         elif self.action == 'move_rel':
             request_id = self.bot.move_relative(self.coords[0],self.coords[1],self.coords[2])
             print("TOGGLE PIN REQUEST ID: " + request_id)
+            self.wait(request_id)
 
         elif self.action == 'prune_radial':
             request_id = self.bot.toggle_pin(48)
             print("TOGGLE PIN REQUEST ID: " + request_id)
+            self.wait(request_id)
 
         elif self.action == 'photo':
             request_id = self.bot.take_photo()
             print("PHOTO REQUEST ID: " + request_id)
+            self.wait(request_id)
 
         elif self.action == 'water':
             request_id = self.bot.toggle_pin(8)
             print("WATER REQUEST ID: " + request_id)
+            self.wait(request_id)
             # time.sleep(2.409)
-            time.sleep(3.5)
+            time.sleep(WATER_TIME * self.time_scale)
             request_id = self.bot.toggle_pin(8)
             print("WATER OFF REQUEST ID: " + request_id)
+            self.wait(request_id)
 
         elif self.action == 'read_pin':
             pin = self.coords
+            self.read_done.clear()
             if pin == 8:
-                request_id = self.bot.read_pin(pin)
                 self.read = 'read_water.p'
+                request_id = self.bot.read_pin(pin)
             elif pin == 54: 
                 print('--------')
-                request_id = self.bot.read_pin(pin, pin_mode='analog')
                 self.read = 'read_depth.p'
+                request_id = self.bot.read_pin(pin, pin_mode='analog')
             print("PIN #" + str(pin) + ": " + str(request_id))
+            self.wait(request_id)
+            # The value comes in a log, saved by on_log.
+            if not self.read_done.wait(COMMAND_TIMEOUTS['read_pin']):
+                raise TimeoutError("No value logged for pin " + str(pin))
 
         elif self.action == 'servo':
             # Pin 11 = orientation, pin 6 = vertiical/horiztonal
             pin, angle = self.coords[0], self.coords[1]
             request_id = self.bot.set_servo_angle(pin, angle)
             print("SERVO REQUEST ID: " + request_id)
+            self.wait(request_id)
 
         elif self.action == 'prune_scissor':
-            request_id = self.bot.set_servo_angle(5, 180)
-            time.sleep(5.5)#5.2
-            request_id = self.bot.set_servo_angle(5, 90)
-            time.sleep(0.5)
-            request_id = self.bot.set_servo_angle(5, 0)
-            time.sleep(5.2)#4.95
-            request_id = self.bot.set_servo_angle(5, 90)
-            time.sleep(0.5)
+            # The servo turns continuously, the scissors close and open by turning it for a set time.
+            for angle, duration in [(180, SCISSOR_CLOSE_TIME), (90, SCISSOR_STOP_TIME), (0, SCISSOR_OPEN_TIME), (90, SCISSOR_STOP_TIME)]:
+                request_id = self.bot.set_servo_angle(5, angle)
+                self.wait(request_id)
+                time.sleep(duration * self.time_scale)
             print("TOGGLE SERVO STOP ID: " + request_id)
 
     # The callback is passed a FarmBot instance, plus an MQTT
@@ -133,6 +172,7 @@ class MyHandler:
         # callbacks):
         self.CLIENT = mqtt_client
         self.bot = bot
+        self.connected.set()
 
     def on_change(self, bot, state):
         # The `on_change` event is most frequently triggered
@@ -170,6 +210,7 @@ class MyHandler:
             elif self.read == 'read_water.p':
                 pkl.dump(water_value(str.split(log['message'])[5]), open('./FB_data/' + self.read, 'wb'))
             self.read = False
+            self.read_done.set()
 
     # When a response succeeds, the `on_response` callback
     # fires. This callback is passed a FarmBot object, as well
@@ -180,6 +221,9 @@ class MyHandler:
     def on_response(self, bot, response):
         print("ID of successful request: " + response.id)
         print("Current position: (%.2f, %.2f, %.2f)" % bot.position())
+        with self.response_cv:
+            self.responses[response.id] = None
+            self.response_cv.notify_all()
 
     # If an RPC request fails (example: stalled motors, firmware
     # timeout, etc..), the `on_error` callback is called.
@@ -193,6 +237,9 @@ class MyHandler:
         # We can also retrieve a list of error message(s) by
         # calling response.errors:
         print("Reason(s) for failure: " + str(response.errors))
+        with self.response_cv:
+            self.responses[response.id] = response.errors
+            self.response_cv.notify_all()
 
 
 # Now that we have a handler class to use, let's create an
@@ -253,39 +300,28 @@ def water_value(inp):
     else:
         return 1
 
-def dismount_nozzle():
+# The tool changes run on the FarmBotThread fb of the caller, over its connection.
+def dismount_nozzle(fb):
     # Position Correctly, Move into slot, Disconnect
-    fb = start()
-    handler = MyHandler("move", [(2600, 121, -385), (2690, 121, -385), (2690, 121, -350)])
-    fb.connect(handler)
+    fb.update_action("move", [(2600, 121, -385), (2690, 121, -385), (2690, 121, -350)])
 
-def mount_nozzle():
+def mount_nozzle(fb):
     # Position Correctly, Move into slot, Disconnect
-    fb = start()
-    handler = MyHandler("move", [(2690, 121, -350), (2690, 121, -385), (2600, 121, -385)])
-    fb.connect(handler)
+    fb.update_action("move", [(2690, 121, -350), (2690, 121, -385), (2600, 121, -385)])
 
-def dismount_yPruner():
+def dismount_yPruner(fb):
     # Position Correctly, Move into slot, Disconnect
-    fb = start()
-    handler = MyHandler("move", [(2600, 221, -383), (2690, 221, -383), (2690, 221, -350)])
-    fb.connect(handler)
+    fb.update_action("move", [(2600, 221, -383), (2690, 221, -383), (2690, 221, -350)])
 
-def mount_yPruner():
+def mount_yPruner(fb):
     # Position Correctly, Move into slot, Disconnect
-    fb = start()
-    handler = MyHandler("move", [(2690, 221, -350), (2690, 221, -383), (2600, 221, -383)])
-    fb.connect(handler)
+    fb.update_action("move", [(2690, 221, -350), (2690, 221, -383), (2600, 221, -383)])
 
-def dismount_xPruner():
+def dismount_xPruner(fb):
     # Position Correctly, Move into slot, Disconnect
-    fb = start()
-    handler = MyHandler("move", [(2600, 321, -383), (2690, 321, -383), (2690, 321, -350)])
-    fb.connect(handler)
+    fb.update_action("move", [(2600, 321, -383), (2690, 321, -383), (2690, 321, -350)])
 
-def mount_xPruner():
+def mount_xPruner(fb):
     # Position Correctly, Move into slot, Disconnect
-    fb = start()
-    handler = MyHandler("move", [(2690, 321, -350), (2690, 321, -383), (2600, 321, -383)])
-    fb.connect(handler)
+    fb.update_action("move", [(2690, 321, -350), (2690, 321, -383), (2600, 321, -383)])
     
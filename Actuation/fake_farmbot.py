@@ -0,0 +1,191 @@
+import os
+import threading
+import time
+import tempfile
+import uuid
+import argparse
+
+#: Seconds the fake bot takes to respond to each kind of request, and to open a session.
+DEFAULT_LATENCIES = {'move_absolute': 1.0, 'move_relative': 1.0, 'toggle_pin': 0.3, 'take_photo': 2.0,
+                     'read_pin': 0.3, 'set_servo_angle': 0.3, 'connect': 2.0}
+#: Gantry speed in mm/s, moves take their latency plus the time of their longest axis at this speed.
+DEFAULT_SPEED = 100.0
+
+class FakeResponse(object):
+    """ Response to a request, like the OkResponse and ErrorResponse of farmbot-py """
+
+    def __init__(self, request_id, errors=None):
+        self.id = request_id
+        self.errors = errors
+
+class FakeFarmbot(object):
+    """ In-process stand-in for the farmbot-py Farmbot. Each request is answered on a timer thread
+    after a configurable latency, through the on_log and on_response callbacks of the handler,
+    so actuation scripts can be timed and tested without the hardware or the MQTT broker.
+    It loops the requests back in place of the broker, one session at a time.
+    """
+
+    def __init__(self, latencies=None, speed=DEFAULT_SPEED, time_scale=1.0, analog_values=None):
+        """ Constructor
+        Args
+            latencies (dict): seconds to respond to each request, see DEFAULT_LATENCIES
+            speed (float): gantry speed in mm/s
+            time_scale (float): scale of all latencies, to run faster than the real bot
+            analog_values (dict): values read on analog pins, 688 (10cm to the depth sensor) if missing
+        """
+        self.latencies = dict(DEFAULT_LATENCIES, **(latencies or {}))
+        self.speed = speed
+        self.time_scale = time_scale
+        self.analog_values = analog_values or {}
+        self.handler = None
+        self.pos = [0.0, 0.0, 0.0]
+        self.pins = {}
+        self.requests = []
+        self.lock = threading.Lock()
+        self.disconnected = threading.Event()
+
+    def connect(self, handler):
+        """ Connect the handler, blocks until disconnect() like the real bot """
+        self.disconnected.clear()
+        time.sleep(self.latencies['connect'] * self.time_scale)
+        self.handler = handler
+        handler.on_connect(self, None)
+        self.disconnected.wait()
+
+    def disconnect(self):
+        self.disconnected.set()
+
+    def position(self):
+        return tuple(self.pos)
+
+    def _request(self, kind, latency=0, log=None):
+        """ Record a request and respond to it after its latency, returns the request id """
+        request_id = str(uuid.uuid4())
+        with self.lock:
+            self.requests.append((kind, request_id))
+
+        def respond():
+            if log is not None:
+                self.handler.on_log(self, {'message': log})
+            self.handler.on_response(self, FakeResponse(request_id))
+
+        timer = threading.Timer((self.latencies[kind] + latency) * self.time_scale, respond)
+        timer.daemon = True
+        timer.start()
+        return request_id
+
+    def _move_to(self, pos):
+        travel = max(abs(a - b) for a, b in zip(pos, self.pos))
+        self.pos = list(pos)
+        return travel / self.speed
+
+    def move_absolute(self, x, y, z):
+        return self._request('move_absolute', self._move_to((x, y, z)))
+
+    def move_relative(self, x, y, z):
+        return self._request('move_relative', self._move_to((self.pos[0] + x, self.pos[1] + y, self.pos[2] + z)))
+
+    def toggle_pin(self, pin):
+        self.pins[pin] = 1 - self.pins.get(pin, 0)
+        return self._request('toggle_pin')
+
+    def take_photo(self):
+        return self._request('take_photo')
+
+    def read_pin(self, pin, pin_mode='digital'):
+        # Logged like the bot, the value is the sixth word, see MyHandler.on_log.
+        if pin_mode == 'analog':
+            value = str(self.analog_values.get(pin, 688))
+        else:
+            value = 'ON' if self.pins.get(pin, 0) else 'OFF'
+        return self._request('read_pin', log="Pin " + str(pin) + " value read as: " + value)
+
+    def set_servo_angle(self, pin, angle):
+        return self._request('set_servo_angle')
+
+def benchmark_throughput(targets, prepare_time=2.0, time_scale=0.01):
+    """ Time moving to each target after preparing it, such as finding it in an image and converting
+        it to bot coordinates, with a new session per action, one session, and one session with the
+        next target prepared while the bot moves to the current one
+        Args
+            targets (list): (x, y) targets in mm
+            prepare_time (float): seconds to prepare each target
+            time_scale (float): scale of all bot and prepare times
+        Return
+            Seconds of each mode, in bot time.
+        """
+    from thread import FarmBotThread
+
+    def prepare(target):
+        time.sleep(prepare_time * time_scale)
+        return (target[0], target[1], 0)
+
+    times = {}
+    bot = FakeFarmbot(time_scale=time_scale)
+    start = time.perf_counter()
+    for target in targets:
+        coords = prepare(target)
+        fb = FarmBotThread(bot, time_scale)
+        fb.update_action("move", coords)
+        fb.close()
+    times['session per action'] = time.perf_counter() - start
+
+    bot = FakeFarmbot(time_scale=time_scale)
+    fb = FarmBotThread(bot, time_scale)
+    start = time.perf_counter()
+    for target in targets:
+        fb.update_action("move", prepare(target))
+    times['one session'] = time.perf_counter() - start
+    fb.close()
+
+    bot = FakeFarmbot(time_scale=time_scale)
+    fb = FarmBotThread(bot, time_scale)
+    start = time.perf_counter()
+    moved = None
+    for target in targets:
+        coords = prepare(target)
+        if moved is not None:
+            moved.result()
+        moved = fb.submit("move", coords)
+    fb.drain()
+    times['pipelined'] = time.perf_counter() - start
+    fb.close()
+    return {mode: seconds / time_scale for mode, seconds in times.items()}
+
+
+if __name__ == "__main__":
+    # Times a day of watering against the fake bot and compares it to the fixed sleeps it used to take,
+    # then the throughput of moving to prepared targets with and without pipelining.
+    from thread import FarmBotThread
+    from route import plan_route
+    import numpy as np
+
+    parser = argparse.ArgumentParser(description="Time a day of watering and the action throughput against a fake FarmBot")
+    parser.add_argument("--sectors", "-n", type=int, default=16, help="Number of sectors to water.")
+    parser.add_argument("--prepare", "-p", type=float, default=2.0, help="Seconds to prepare each target.")
+    parser.add_argument("--time_scale", "-t", type=float, default=0.01, help="Scale of all bot times.")
+    parser.add_argument("--seed", "-s", type=int, default=0, help="Random seed.")
+    args = parser.parse_args()
+
+    # MyHandler saves the pins it reads under FB_data/ of the working directory, keep them out of the repo.
+    os.chdir(tempfile.mkdtemp())
+    os.mkdir("FB_data")
+    rng = np.random.default_rng(args.seed)
+    sectors = [tuple(p) for p in rng.uniform((0, 0), (1373.3, 1252.8), (args.sectors, 2)).astype(int)]
+    bot = FakeFarmbot(time_scale=args.time_scale)
+    fb = FarmBotThread(bot, time_scale=args.time_scale)
+    start = time.perf_counter()
+    for i in [sectors[i] for i in plan_route(sectors)]:
+        fb.update_action("move", (i[0], i[1], 0))
+        fb.update_action("water", None)
+        fb.update_action("read_pin", 8)
+    elapsed = (time.perf_counter() - start) / args.time_scale
+    # watergrid_oneday_lookahead slept 20s after moving, 6s after watering and 3s after reading,
+    # on top of the 3s update_action slept before each action.
+    fixed = args.sectors * (20 + 6 + 3 + 3 * 3)
+    print("{} requests, ack-driven: {:.0f}s, fixed sleeps: {}s".format(len(bot.requests), elapsed, fixed))
+    fb.close()
+
+    targets = [sectors[i] for i in plan_route(sectors)]
+    for mode, seconds in benchmark_throughput(targets, args.prepare, args.time_scale).items():
+        print("{:<20}{:8.0f}s {:6.2f} actions/min".format(mode, seconds, 60 * len(targets) / seconds))
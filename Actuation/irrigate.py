@@ -9,15 +9,18 @@ import glob
 from movement import batch_target_approach
 from control import start, MyHandler, mount_xPruner, mount_yPruner, dismount_xPruner, dismount_yPruner, mount_nozzle, dismount_nozzle, photo
 from thread import FarmBotThread
+from route import plan_route
 import pickle
 import argparse
 from urllib.request import urlopen
 from datetime import datetime, timezone
 import os
 from time import gmtime, strftime
-import time
 from PIL import Image, ImageOps
 import sys
+sys.path.append("../Learning")
+from daily_planner import DailyPlanner
+from create_state import CENTER_TRACKING_PATH
 
 GARDEN_START_DATE = 1625526000
 SIDE = None
@@ -48,35 +51,35 @@ def auto_irrigate_withsim():
         farmbotx = int(i[0] * 10 * (274.66/2/150))
         farmboty = int(i[1] * 10 * (125.28/150))
 
-        fb.update_action("move", (farmbotx, farmboty,0)) #sim to farmbot coord * scaling factor
-        time.sleep(100)
-        fb.update_action("water", None) #sim to farmbot coord * scaling factor
+        # Queue the whole day, the next sector is converted while the bot moves
+        fb.submit("move", (farmbotx, farmboty,0)) #sim to farmbot coord * scaling factor
+        fb.submit("water", None) #sim to farmbot coord * scaling factor
         #farmbot watering action
+    fb.drain()
     
     return
 
-def watergrid_oneday_lookahead(sim2FB, side, timestep=0):
+def watergrid_oneday_lookahead(sim2FB, side, timestep=None, planner=None):
     """ Use the simulator to determine which sectors to water by doing a one day lookahead
         Args
             sim2FB (dict): simulator to farmbot coordinates
             side (string): side of the garden (left or right)
-            timestep(int): timestep of the garden
+            timestep(int): timestep of the garden, the one saved by State-Estimation if None
+            planner (obj): DailyPlanner to reuse across days, a new one if None
         """
 
-    #-------------alternative way-------------
-    # load garden state
-    os.system('python3 ../Learning/create_state.py -t ' + str(timestep))
-
-    os.system('python3 ../Learning/create_state.py ' + side)
-    time.sleep(2)
-    os.system('python3 ../Learning/eval_policy.py -p ba -s 1 -d 1')
-    timestep = pickle.load(open("/Users/mpresten/Desktop/AlphaGarden_git/AlphaGarden/Center-Tracking/timestep.p", "rb")) #change path accordingly
+    # Connect while the simulator runs the lookahead
+    fb = FarmBotThread()
 
-    with open('./policy_metrics/auto_irrigate_'+ SIDE +'/watered_sectors' + '_' + str(timestep) + '.pkl','rb') as f:
-        sectors = pickle.load(f)
-        print(len(sectors), sectors)
+    #-------------alternative way-------------
+    # Plan the day from the circles of the garden in process
+    planner = planner or DailyPlanner()
+    real_data = pickle.load(open(CENTER_TRACKING_PATH + "current_dic_" + side + ".p", "rb"))
+    if timestep is None:
+        timestep = pickle.load(open(CENTER_TRACKING_PATH + "timestep.p", "rb"))
+    sectors = planner.plan(real_data, timestep)['watered_sectors']
+    print(len(sectors), sectors)
     #-----------------------------------------
-    fb = FarmBotThread()
 
     ratio_x = 1373.3/150 #mm/plant_loc : 2746.6 -> 1373.3
     ratio_y = 1252.8/150 #mm/plant_loc
@@ -92,26 +95,25 @@ def watergrid_oneday_lookahead(sim2FB, side, timestep=0):
             sectors_fb.append((sim2FB[i[0] + i[1]][0], sim2FB[i[0] + i[1]][1]))
 
     sectors_fb = [i for i in sim2FB.values()]
-    sorted_sectors_fb = sorted(sectors_fb, key=lambda x: x[0])#sectors sorted by increasing x
+    # Visit the sectors along the shortest route from the origin, back to it on the left side
+    route = plan_route(sectors_fb, start=(0, 0), end=(0, 0) if side == 'l' else None)
+    sorted_sectors_fb = [sectors_fb[i] for i in route]
     print(sorted_sectors_fb)
     for i in sorted_sectors_fb:
         print(i[0], i[1])
 
-        fb.update_action("move", (i[0], i[1], 0)) #sim to farmbot coord * scaling factor
-        time.sleep(20) 
-        fb.update_action("water", None)
-        time.sleep(6)
+        # Queued back to back, an error in either is raised by the read below
+        fb.submit("move", (i[0], i[1], 0)) #sim to farmbot coord * scaling factor
+        fb.submit("water", None)
 
         #Check if water is still on, if it is turn it off
         fb.update_action("read_pin", 8)
-        time.sleep(3)
         value = pickle.load(open('./FB_data/read_water.p', 'rb'))
         if value:
             fb.update_action("water", None)
 
     #Check if water is still on, if it is turn it off
     fb.update_action("read_pin", 8)
-    time.sleep(3)
     value = pickle.load(open('./FB_data/read_water.p', 'rb'))
     if value:
         fb.update_action("water", None)
@@ -53,20 +53,114 @@ def determine_error():
         return [22, 10]
 
 
-def find_local_in_overhead(local_image, overhead_image, target):
+def load_local(local_image):
+    """ Local image rotated to align with the overhead image, BGR like the preprocessed images
+    Args
+        local_image(obj): local image.
+    """
+    image_path  = os.path.join(os.getcwd(), "rpi_images", local_image)
+    return cv2.rotate(cv2.imread(image_path, 1), cv2.ROTATE_90_COUNTERCLOCKWISE)
+
+def scale_local(local, scale):
+    """ Rescale the local image in memory, like resize_local
+    Args
+        local(array): local image from load_local.
+        scale(float): scale factor
+    """
+    dim = (int(local.shape[1] * scale), int(local.shape[0] * scale))
+    return cv2.resize(local, dim, interpolation = cv2.INTER_AREA) # for shrinking INTER_AREA preferred
+
+def search_window(targetpx, local_shape, template_shape, error, sf=11.9):
+    """ Bounds (x lower, x upper, y lower, y upper) of the top left corners of the local image searched
+        around the target, clipped to the match result
+    Args
+        targetpx(tuple): target pixel in the overhead image
+        local_shape(tuple): shape of the local image
+        template_shape(tuple): shape of the overhead image
+        error(list): border around the target in cm
+        sf(float): scale factor for overhead image ex. 11.9 px = 1 cm
+    """
+    res_h, res_w = template_shape[0] - local_shape[0] + 1, template_shape[1] - local_shape[1] + 1
+    x_lower = max(int(targetpx[0] - local_shape[0]/2 - int(error[0]*sf/2)), 0)
+    x_upper = min(int(targetpx[0] - local_shape[0]/2 + int(error[0]*sf/2)), res_w)
+    y_lower = max(int(targetpx[1] - local_shape[1]/2 - int(error[1]*sf/2)), 0)
+    y_upper = min(int(targetpx[1] - local_shape[1]/2 + int(error[1]*sf/2)), res_h)
+    return x_lower, x_upper, y_lower, y_upper
+
+def match_window(local, template, window, method=cv2.TM_CCOEFF_NORMED):
+    """ Match result of the local image in the overhead image for the top left corners in window only,
+        the same as the window of the full result, by matching on the part of the overhead image it covers
+    Args
+        local(array): local image
+        template(array): overhead image
+        window(tuple): bounds from search_window
+        method(int): cv2 matching method
+    """
+    x_lower, x_upper, y_lower, y_upper = window
+    h, w = local.shape[:2]
+    return cv2.matchTemplate(template[y_lower:y_upper + h - 1, x_lower:x_upper + w - 1], local, method)
+
+def pyramid_match(local, template, targetpx, error, scales, levels=2, keep=3, margin=2, method=cv2.TM_CCOEFF_NORMED):
+    """ Coarse to fine search of the local image, rescaled by each scale, in the overhead image around the target.
+        Every scale is matched in the search window on both images downsampled levels times, then the keep best
+        scales are matched at full resolution within margin coarse pixels of their coarse match.
+    Args
+        local(array): local image from load_local
+        template(array): overhead image
+        targetpx(tuple): target pixel in the overhead image
+        error(list): border around the target in cm, see search_window
+        scales(list): scale factors of the local image
+        levels(int): number of pyramid levels, each halves the images
+        keep(int): number of scales refined at full resolution
+        margin(int): coarse pixels refined around each coarse match
+        method(int): cv2 matching method
+    Return
+        Best match value, top left corner in the overhead image and scale, None if the local image fits nowhere.
+    """
+    f = 2 ** levels
+    small_template = template
+    for _ in range(levels):
+        small_template = cv2.pyrDown(small_template)
+
+    coarse = []
+    for scale in scales:
+        img = scale_local(local, scale)
+        window = search_window(targetpx, img.shape, template.shape, error)
+        small = img
+        for _ in range(levels):
+            small = cv2.pyrDown(small)
+        # Coarse window covering the full resolution one
+        res_h, res_w = small_template.shape[0] - small.shape[0] + 1, small_template.shape[1] - small.shape[1] + 1
+        small_window = (window[0] // f, min(-(-window[1] // f), res_w), window[2] // f, min(-(-window[3] // f), res_h))
+        if window[0] >= window[1] or window[2] >= window[3] or small_window[0] >= small_window[1] or small_window[2] >= small_window[3]:
+            continue
+        _, max_val, _, max_loc = cv2.minMaxLoc(match_window(small, small_template, small_window, method))
+        coarse.append((max_val, scale, img, window, ((small_window[0] + max_loc[0]) * f, (small_window[2] + max_loc[1]) * f)))
+
+    best = None
+    for _, scale, img, window, (x, y) in sorted(coarse, key=lambda c: c[0], reverse=True)[:keep]:
+        fine = (max(x - margin * f, window[0]), min(x + margin * f + 1, window[1]),
+                max(y - margin * f, window[2]), min(y + margin * f + 1, window[3]))
+        if fine[0] >= fine[1] or fine[2] >= fine[3]:
+            continue
+        _, max_val, _, max_loc = cv2.minMaxLoc(match_window(img, template, fine, method))
+        if best is None or max_val > best[0]:
+            best = (max_val, (fine[0] + max_loc[0], fine[2] + max_loc[1]), scale)
+    return best
+
+def find_local_in_overhead(local_image, overhead_image, target, template=None):
     """ Preprocess the overhead image and the raspberry pi local image
     Args
         local_image(obj): local image.
         overhead_image(obj): overhead image
         target(list): target point
+        template(array): preprocessed overhead image, from overhead_image_preprocess if None
     """
     
     local_name = local_image
     
-    overhead_image = overhead_image_preprocess(overhead_image)
-
-    
-    template = overhead_image
+    # The result is drawn on the template, keep the caller's copy clean.
+    template = overhead_image_preprocess(overhead_image) if template is None else template.copy()
     w, h = template.shape[:2][::-1]
 
     meth = 'cv2.TM_CCOEFF_NORMED'
@@ -81,43 +175,15 @@ def find_local_in_overhead(local_image, overhead_image, target):
 
     error = [44, 20] #determine_error()
 
-    best_sf = 1
-    best_max_val = 0
-    best_max_loc = None
     sf = 11.9 #scale factor for overhead image ex. 11.9 px = 1 cm
 
-    for scale in np.linspace(0.4, 0.85, 15)[::-1]:
-        img, rpi_path_d = local_image_preprocess(local_image, scale)
-        img2 = img.copy()
-        img = img2.copy()
-        r = img.shape[1] / float(img.shape[1])
-
-
-        res = cv2.matchTemplate(img, template.astype(np.uint8) ,method)
-
-        masked_res = np.zeros(res.shape)
-        res_x_lower = int(targetpx_x - img.shape[0]/2 - int(error[0]*sf/2))
-        res_x_lower = res_x_lower if res_x_lower >=0 else 0
-        res_x_upper = int(targetpx_x - img.shape[0]/2 + int(error[0]*sf/2))
-        res_x_upper = res_x_upper if res_x_upper <=masked_res.shape[1] else masked_res.shape[1]
-
-        res_y_lower = int(targetpx_y - img.shape[1]/2 - int(error[1]*sf/2))
-        res_y_lower = res_y_lower if res_y_lower >=0 else 0
-        res_y_upper = int(targetpx_y - img.shape[1]/2 + int(error[1]*sf/2))
-        res_y_upper = res_y_upper if res_y_upper <=masked_res.shape[0] else masked_res.shape[0]
-
-        masked_res[res_y_lower:res_y_upper, res_x_lower:res_x_upper] = res[res_y_lower:res_y_upper, res_x_lower:res_x_upper]
-            
-        _, max_val, _, max_loc = cv2.minMaxLoc(masked_res)
-
-        print(max_val, max_loc, scale)
-
-        if max_val > best_max_val:
-            best_max_val = max_val
-            best_max_loc = max_loc
-            best_sf = scale
-
-        os.remove(rpi_path_d)
+    local = load_local(local_image)
+    best = pyramid_match(local, template.astype(np.uint8), (targetpx_x, targetpx_y), error,
+                         np.linspace(0.4, 0.85, 15)[::-1], method=method)
+    if best is None:
+        raise ValueError("The local image does not fit in the overhead image around " + str(target))
+    best_max_val, best_max_loc, best_sf = best
+    print(best_max_val, best_max_loc, best_sf)
 
     # -------get top 5 points from best sf -------
     # num_cand = 5
@@ -144,9 +210,7 @@ def find_local_in_overhead(local_image, overhead_image, target):
 
     top_left = best_max_loc
     bottom_right = (top_left[0] + w, top_left[1] + h)
-    img, _ = local_image_preprocess(local_image, best_sf)
-    img2 = img.copy()
-    img = img2.copy()
+    img = scale_local(local, best_sf)
 
     cv2.rectangle(img,top_left, bottom_right, 255, 2)
 
@@ -156,8 +220,6 @@ def find_local_in_overhead(local_image, overhead_image, target):
     t.close()
 
     #checking the cross correlation, white = more correlated
-    plt.subplot(121),plt.imshow(res,cmap = 'gray')
-    plt.title('Matching Result'), plt.xticks([]), plt.yticks([])
     plt.subplot(122),plt.imshow(img,cmap = 'gray')
     plt.title('Detected Point'), plt.xticks([]), plt.yticks([])
     plt.suptitle(meth)
@@ -255,10 +317,12 @@ def farmbot_target_approach(fb, target_point, overhead_image, y_offset):
     epsilon = 1 # the threshold needed to satisfy the closeness requirement
     max_y = (125-abs(y_offset))
     # print("HERE: ", max_y)
-    fb.update_action("move", (target_point[0] * 10, min(target_point[1] * 10, max_y*10), 0)) #target_point[1] * 10,0))
-    time.sleep(30)
+    moved = fb.submit("move", (target_point[0] * 10, min(target_point[1] * 10, max_y*10), 0)) #target_point[1] * 10,0))
+    # Preprocess the overhead image once while the gantry moves
+    template = overhead_image_preprocess(overhead_image)
+    moved.result()
 
-    curr_pos = curr_pos_from_local(fb, overhead_image, target_point)#get from local image
+    curr_pos = curr_pos_from_local(fb, overhead_image, target_point, template)#get from local image
         
     coord_x = target_point[0]
     coord_y = target_point[1]
@@ -281,9 +345,8 @@ def farmbot_target_approach(fb, target_point, overhead_image, y_offset):
         coord_y = max(0, coord_y)
 
         fb.update_action("move", (coord_x * 10, coord_y * 10,0))
-        time.sleep(3)
 
-        curr_pos = curr_pos_from_local(fb, overhead_image, target_point)#get from local image
+        curr_pos = curr_pos_from_local(fb, overhead_image, target_point, template)#get from local image
         count += 1
         previous_points.append(tuple((coord_x, coord_y)))
     if count >= 6:
@@ -332,12 +395,13 @@ def crop_o_px_to_cm(x_px, y_px):
     pred_pt = (round(274.66 - (x_px - 102)/11.9), round((y_px - 72)/11.9))
     return pred_pt
 
-def curr_pos_from_local(fb, overhead_image, target):
+def curr_pos_from_local(fb, overhead_image, target, template=None):
     """ Find the current position from the local rpi image in the overhead image
     Args
         fb(obj): farmbot instance.
         overhead_image(obj): overhead image.
         target(list): target point.
+        template(array): preprocessed overhead image, see find_local_in_overhead
     """
     cwd = os.getcwd()
     rpi_folder_path = os.path.join(cwd, "rpi_images")
@@ -356,8 +420,57 @@ def curr_pos_from_local(fb, overhead_image, target):
 
     local_name = latest_file[latest_file.find("rpi_images")+11:]
 
-    pt = find_local_in_overhead(local_name, overhead_image, target)
+    pt = find_local_in_overhead(local_name, overhead_image, target, template)
     return pt
 
+def exhaustive_match(local, template, targetpx, error, scales, method=cv2.TM_CCOEFF_NORMED):
+    """ Search of find_local_in_overhead before pyramid_match: every scale matched over the full overhead
+        image, then masked to the search window. Kept as the reference to benchmark pyramid_match against.
+        Same arguments and return as pyramid_match.
+    """
+    best = None
+    for scale in scales:
+        img = scale_local(local, scale)
+        x_lower, x_upper, y_lower, y_upper = search_window(targetpx, img.shape, template.shape, error)
+        if x_lower >= x_upper or y_lower >= y_upper:
+            continue
+        res = cv2.matchTemplate(template, img, method)
+        _, max_val, _, max_loc = cv2.minMaxLoc(res[y_lower:y_upper, x_lower:x_upper])
+        if best is None or max_val > best[0]:
+            best = (max_val, (x_lower + max_loc[0], y_lower + max_loc[1]), scale)
+    return best
+
 if __name__ == "__main__":  
-    print(determine_error())
\ No newline at end of file
+    # Benchmarks pyramid_match against exhaustive_match on local views cut out of an overhead image.
+    parser = argparse.ArgumentParser(description="Benchmark the localization of local images in the overhead image")
+    parser.add_argument("--overhead", default="snc-21081119280000.jpg_cropped.jpg", help="Preprocessed overhead image.")
+    parser.add_argument("--trials", "-n", type=int, default=10, help="Number of local views.")
+    parser.add_argument("--seed", "-s", type=int, default=0, help="Random seed.")
+    args = parser.parse_args()
+
+    template = cv2.imread(args.overhead, 1)
+    scales = np.linspace(0.4, 0.85, 15)[::-1]
+    error = [44, 20]
+    rng = np.random.default_rng(args.seed)
+    times = {"exhaustive": 0, "pyramid": 0}
+    errors = []
+    for _ in range(args.trials):
+        # A view the local image resized by scale would show, 1000 x 750 px before resizing
+        scale = rng.choice(scales)
+        h, w = int(1000 * scale), int(750 * scale)
+        x, y = int(rng.integers(0, template.shape[1] - w)), int(rng.integers(0, template.shape[0] - h))
+        local = cv2.resize(template[y:y + h, x:x + w], (750, 1000), interpolation=cv2.INTER_CUBIC)
+        # Another camera, lighting and noise
+        local = np.clip(local * rng.uniform(0.7, 1.3) + rng.normal(0, 20, local.shape), 0, 255).astype(np.uint8)
+        # The expected position is off by up to a quarter of the search window
+        targetpx = (x + h / 2 + rng.integers(-130, 131), y + w / 2 + rng.integers(-60, 61))
+        found = {}
+        for name, match in [("exhaustive", exhaustive_match), ("pyramid", pyramid_match)]:
+            t0 = time.perf_counter()
+            found[name] = match(local, template, targetpx, error, scales)
+            times[name] += time.perf_counter() - t0
+        errors.append(max(abs(a - b) for a, b in zip(found["pyramid"][1], found["exhaustive"][1])))
+        print("view at", (x, y), "scale {:.3f}".format(scale), "exhaustive", found["exhaustive"], "pyramid", found["pyramid"])
+    for name, seconds in times.items():
+        print("{:<12}{:8.3f}s per view".format(name, seconds / args.trials))
+    print("Largest offset of the pyramid match from the exhaustive match: {} px".format(max(errors)))
\ No newline at end of file
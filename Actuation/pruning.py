@@ -9,6 +9,7 @@ import glob
 from movement import batch_target_approach, correct_image, get_points
 from control import start, MyHandler, mount_xPruner, mount_yPruner, dismount_xPruner, dismount_yPruner, mount_nozzle, dismount_nozzle, photo
 from thread import FarmBotThread
+from route import plan_route
 import argparse
 import time
 import pickle as pkl
@@ -43,8 +44,8 @@ def batch_prune(target_list, overhead, rpi_check):
     # print("--x_list: ", x_list)
     # print("--y_list: ", y_list)
 
-    # dismount_nozzle()
-    # mount_yPruner()
+    # dismount_nozzle(fb)
+    # mount_yPruner(fb)
     for i in y_list:
         response = input("===== Enter 'y' in yPruner MOUNTED.")
 
@@ -61,7 +62,6 @@ def batch_prune(target_list, overhead, rpi_check):
                 fb.update_action("move_rel", (0,0,-250))
                 fb.update_action("move_rel", (0,0, 249))
                 fb.update_action("prune", None)
-                time.sleep(180) #modify!!!
                 print("PHOTO TIME")
 
                 aft_name = recent_rpi_photo(fb)
@@ -76,20 +76,17 @@ def batch_prune(target_list, overhead, rpi_check):
             print("---TIME TO CALC DEPTH")
             dsensor_adjusted = tuple((i[0] - 1.5, i[1])) #depth sensor offset
             fb.update_action("move", (dsensor_adjusted[0] * 10, dsensor_adjusted[1] * 10,0))
-            time.sleep(5)
             print("---DONE SLEEPING")
             z = get_depth(fb)
-            time.sleep(3)
             print("---Depth: ", z)
             z = min(z, 40)
             fb.update_action("prune", None)
             fb.update_action("move_rel", (0,0,(z * -10)))
             fb.update_action("move_rel", (0,0,(z * 10)))
             fb.update_action("prune", None)
-            time.sleep(180)
 
-    # dismount_yPruner()
-    # mount_xPruner()
+    # dismount_yPruner(fb)
+    # mount_xPruner(fb)
 
     for i in x_list:
         response = input("===== Enter 'y' in xPruner MOUNTED.")
@@ -106,7 +103,6 @@ def batch_prune(target_list, overhead, rpi_check):
                 fb.update_action("move_rel", (0,0,inc))
                 fb.update_action("move_rel", (0,0,(-1 * inc) - 1))
                 fb.update_action("prune", None)
-                time.sleep(180)
 
                 aft_name = recent_rpi_photo(fb)
                 chk = compare_recent_rpi(i, bef_name, aft_name)
@@ -120,19 +116,16 @@ def batch_prune(target_list, overhead, rpi_check):
             print("---TIME TO CALC DEPTH")
             dsensor_adjusted = tuple((i[0] - 1.5, i[1])) #depth sensor offset
             fb.update_action("move", (dsensor_adjusted[0] * 10, dsensor_adjusted[1] * 10,0))
-            time.sleep(5)
             print("---DONE SLEEPING")
             z = get_depth(fb)
-            time.sleep(3)
             print("---Depth: ", z)
             z = min(z, 40)
             fb.update_action("prune", None)
             fb.update_action("move_rel", (0,0,(z * -10)))
             fb.update_action("move_rel", (0,0,(z * 10)))
             fb.update_action("prune", None)
-            time.sleep(180)
-    # dismount_xPruner()
-    # mount_nozzle()
+    # dismount_xPruner(fb)
+    # mount_nozzle(fb)
 
     return None
 
@@ -172,6 +165,10 @@ def batch_prune_scissors(target_list, overhead, rpi_check):
             overhead (obj): overhead image
             rpi_check(bool): use the rpi to check
         """
+    # Visit the targets along the shortest route from the origin, in farmbot cm
+    route = plan_route([crop_o_px_to_cm(*target) for center, target in target_list], start=(0, 0))
+    target_list = [target_list[i] for i in route]
+
     pos_x, pos_y = 110, 47 #47
     ang_sf = (pos_x-pos_y)/90
     sci_rad = 13
@@ -196,21 +193,17 @@ def batch_prune_scissors(target_list, overhead, rpi_check):
         print("---CURR PT, MOD_ANGLE: ", cur_point, mod_angle)
 
         fb.update_action("servo", (11, mod_angle)) #move scissors to corrected angle according to real-life contraints
-        time.sleep(2)
 
         print("---TIME TO CALC DEPTH")
         dsensor_adjusted = tuple((cur_point[0] - 1.5, cur_point[1])) #depth sensor offset
         fb.update_action("move", (dsensor_adjusted[0] * 10, dsensor_adjusted[1] * 10,0))
-        time.sleep(50)
         print("---DONE SLEEPING")
         z = get_depth(fb)
-        time.sleep(2)
         print("---Depth: ", z)
         z = min(z, 35)
 
         fb.update_action("move_rel", (15, 0,0)) #reset to account for depth sensor
 
-        time.sleep(10)
         curr_rpi = recent_rpi_photo(fb) #name of rpi image of current state
         
         scissors_offset = (sci_rad*math.cos(angle*math.pi/180) + 2, -1 *sci_rad*math.sin(angle*math.pi/180) - 1) #scissor offset
@@ -232,20 +225,13 @@ def batch_prune_scissors(target_list, overhead, rpi_check):
 
         if prune_top: 
             fb.update_action("servo", (6, 101)) # Ordinary Scissor cut
-            time.sleep(1)
             fb.update_action("servo", (11, 70))
-            time.sleep(1)
             fb.update_action("move_rel", (200, -180, 0))
-            time.sleep(25)
             fb.update_action("move_rel", (0, 0, (z * -10)+30))#move to z position from the depth sensor after setting up the scissors
-            time.sleep(30)
             fb.update_action("move_rel", (-200, 0, 0))
-            time.sleep(25)
         else:
             fb.update_action("servo", (6, 38)) # Ordinary Scissor cut
-            time.sleep(2)
             fb.update_action("move_rel", (0, 0, (z * -10)+ 30))#move to z position from the depth sensor after setting up the scissors
-            time.sleep(90)
 
         print("---TIME TO CUT")
         done = False
@@ -253,17 +239,13 @@ def batch_prune_scissors(target_list, overhead, rpi_check):
         while (done == False and i < 2):  #change iteration threshold
             if prune_top:
                 fb.update_action("prune_scissor", None)
-                time.sleep(11)
                 fb.update_action("move_rel", (0, 0, (z * 10)- 30.5))#move to z position from the depth sensor after setting up the scissors
-                time.sleep(20)
                 done = True
             else:
                 # fb.update_action("servo", (6, 38)) # Ordinary Scissor cut
                 # time.sleep(2)
                 fb.update_action("prune_scissor", None) #prune with angle
-                time.sleep(11)
                 fb.update_action("move_rel", (0, 0, (z * 10) - 30.5))#move to z position from the depth sensor after setting up the scissors
-                time.sleep(90)
                 done = True
             # done, curr_rpi = prune_check_sensor(fb, i, curr_rpi, z, cur_point, dsensor_adjusted, scissors_offset)
             # print("---DONE: ", done)
@@ -286,22 +268,18 @@ def reposition_scissors(fb, k, scissors_offset, rpi_pos):
     reposition_dist = 2 #length of reposition vector in cm
     change = [k[0]*np.sqrt(reposition_dist), k[1]*np.sqrt(reposition_dist)]
     fb.update_action("move_rel", (scissors_offset[0] *10, scissors_offset[1]*10,0))
-    time.sleep(5)
     z = get_depth(fb)
     z = min(z, 40)
     fb.update_action("move_rel", (change[0] *10, change[1]*10,(z * -10)+ 70))
     
-    time.sleep(5)
     return z
 
 def prune_check_sensor(fb, i, prev_rpi, prev_depth, rpi_pos, depthsen_pos, scissors_offset):
     #use depthsen_pos to check the depth with consistent offset
     fb.update_action("move", (depthsen_pos[0] * 10, depthsen_pos[1] * 10,0)) #move to depth sensor
-    time.sleep(15)
     print(depthsen_pos)
     epsilon = 3 # min depth difference threshold in cm
     curr_depth = get_depth(fb)
-    time.sleep(2)
     print(curr_depth)
     if curr_depth - prev_depth > epsilon: #curr_depth has to be lower if leaf was cut
         return True
@@ -313,7 +291,6 @@ def prune_check_sensor(fb, i, prev_rpi, prev_depth, rpi_pos, depthsen_pos, sciss
 def get_depth(fb):
     #get depth necessary to prune the leaf with the depth sensor
     fb.update_action('read_pin', 54)
-    time.sleep(3)
     value = pkl.load(open('./FB_data/read_depth.p', 'rb'))
     return value
 
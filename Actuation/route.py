@@ -0,0 +1,139 @@
+import numpy as np
+import argparse
+
+
+def travel_costs(points, metric="chebyshev"):
+    """ Pairwise travel cost between points
+        Args
+            points (array): n x 2 points
+            metric (string): "chebyshev" for the gantry, which moves its axes at the same time, so
+                             a move takes as long as its longest axis, or "euclidean"
+        """
+    diff = np.abs(points[:, np.newaxis] - points[np.newaxis])
+    if metric == "chebyshev":
+        return diff.max(axis=-1)
+    if metric == "euclidean":
+        return np.sqrt((diff ** 2).sum(axis=-1))
+    raise ValueError("Unknown metric " + str(metric))
+
+def route_cost(costs, route):
+    """ Total cost of visiting the nodes in route order
+        Args
+            costs (array): pairwise travel costs
+            route (array): node order
+        """
+    return costs[route[:-1], route[1:]].sum()
+
+def nearest_neighbor(costs):
+    """ Route from node 0 to node n - 1 through all nodes, always moving to the closest unvisited node
+        Args
+            costs (array): pairwise travel costs
+        """
+    n = len(costs)
+    route = [0]
+    unvisited = np.ones(n, dtype=bool)
+    unvisited[[0, n - 1]] = False
+    for _ in range(n - 2):
+        nxt = np.flatnonzero(unvisited)[np.argmin(costs[route[-1], unvisited])]
+        route.append(nxt)
+        unvisited[nxt] = False
+    return np.array(route + [n - 1])
+
+def two_opt(costs, route, eps=1e-9):
+    """ Reverse route segments while that shortens the route, keeping its first and last node
+        Args
+            costs (array): pairwise travel costs
+            route (array): node order
+            eps (float): least improvement to keep going
+        """
+    route = route.copy()
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, len(route) - 2):
+            # Gain of reversing route[i:k+1] for every k at once.
+            k = np.arange(i + 1, len(route) - 1)
+            gain = costs[route[i - 1], route[i]] + costs[route[k], route[k + 1]] \
+                - costs[route[i - 1], route[k]] - costs[route[i], route[k + 1]]
+            best = np.argmax(gain)
+            if gain[best] > eps:
+                route[i:k[best] + 1] = route[i:k[best] + 1][::-1]
+                improved = True
+    return route
+
+def or_opt(costs, route, max_segment=3, eps=1e-9):
+    """ Move segments of up to max_segment nodes, possibly reversed, elsewhere in the route while
+        that shortens it, keeping its first and last node
+        Args
+            costs (array): pairwise travel costs
+            route (array): node order
+            max_segment (int): longest segment moved
+            eps (float): least improvement to keep going
+        """
+    route = route.copy()
+    improved = True
+    while improved:
+        improved = False
+        for length in range(1, max_segment + 1):
+            for s in range(1, len(route) - length):
+                seg = route[s:s + length]
+                prev, nxt = route[s - 1], route[s + length]
+                removal = costs[prev, seg[0]] + costs[seg[-1], nxt] - costs[prev, nxt]
+                rest = np.concatenate((route[:s], route[s + length:]))
+                a, b = rest[:-1], rest[1:]
+                insert = costs[a, seg[0]] + costs[seg[-1], b] - costs[a, b]
+                insert_reversed = costs[a, seg[-1]] + costs[seg[0], b] - costs[a, b]
+                best = np.argmin(np.minimum(insert, insert_reversed))
+                if min(insert[best], insert_reversed[best]) < removal - eps:
+                    if insert_reversed[best] < insert[best]:
+                        seg = seg[::-1]
+                    route = np.concatenate((rest[:best + 1], seg, rest[best + 1:]))
+                    improved = True
+                    break
+            if improved:
+                break
+    return route
+
+def plan_route(points, start=(0, 0), end=None, metric="chebyshev"):
+    """ Order in which to visit points, starting from start and ending at end, with a nearest
+        neighbor route improved by 2-opt and Or-opt moves
+        Args
+            points (list): (x, y) points to visit
+            start (tuple): position the route starts at
+            end (tuple): position the route ends at, or None to end at the last point
+            metric (string): see travel_costs
+        Return
+            Indices of points in visiting order.
+        """
+    if len(points) < 2:
+        return list(range(len(points)))
+    nodes = np.array([start] + [tuple(p)[:2] for p in points] + [end if end is not None else start], dtype=float)
+    costs = travel_costs(nodes, metric)
+    if end is None:
+        # An open route ends wherever it is, free to reach from any point.
+        costs[:, -1] = 0
+    route = nearest_neighbor(costs)
+    best = None
+    while best is None or route_cost(costs, route) < best:
+        best = route_cost(costs, route)
+        route = or_opt(costs, two_opt(costs, route))
+    return [int(i) - 1 for i in route[1:-1]]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare planned routes to visiting targets sorted by x on synthetic gardens")
+    parser.add_argument("--num", "-n", type=int, default=40, help="Number of targets.")
+    parser.add_argument("--trials", "-t", type=int, default=20, help="Number of synthetic gardens.")
+    parser.add_argument("--seed", "-s", type=int, default=0, help="Random seed.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    ratios = []
+    for _ in range(args.trials):
+        points = rng.uniform((0, 0), (1373.3, 1252.8), (args.num, 2)) #one side of the garden, in mm
+        costs = travel_costs(np.vstack(([0, 0], points, [0, 0])))
+        costs[:, -1] = 0
+        by_x = np.concatenate(([0], 1 + np.argsort(points[:, 0], kind="stable"), [len(points) + 1]))
+        planned = np.concatenate(([0], 1 + np.array(plan_route(points)), [len(points) + 1]))
+        ratios.append(route_cost(costs, planned) / route_cost(costs, by_x))
+    print("Planned route travel / sorted by x travel: mean {:.3f}, worst {:.3f}".format(np.mean(ratios), np.max(ratios)))
@@ -1,29 +1,122 @@
 import threading
-import time
+import queue
+from concurrent.futures import Future
 from control import *
 
+#: Seconds to wait for the bot to connect before the first action.
+CONNECT_TIMEOUT = 60
+
 class FarmBotThread(object):
     """ Threading class
     The run() method will be started and it will run in the background
-    until the application exits.
+    until close() or the application exits. Actions are queued and sent in order over
+    this one connection by the send() thread, one at a time, so the caller
+    can prepare the next action while the bot runs the current one.
     """
 
-    def __init__(self):
+    def __init__(self, bot=None, time_scale=1.0):
         """ Constructor
+        Args
+            bot (obj): bot to connect to, such as a FakeFarmbot, the FarmBot of start() if None
+            time_scale (float): scale of the water and scissors times, see MyHandler
         """
-        self.handler = None
+        self.bot = bot
+        self.handler = MyHandler(time_scale)
+        self.commands = queue.Queue()
+        self.lock = threading.Lock()
+        self.submitted = 0
+        # Once an action fails the actions queued by then are not sent, they could depend on it.
+        # Later actions are sent again.
+        self.failure = None
+        self.failed_before = 0
+        # Error of the first failed action not raised to the caller yet, see drain().
+        self.error = None
+
+        self.thread = threading.Thread(target=self.run, args=())
+        self.thread.daemon = True                       # Daemonize thread
+        self.thread.start()                             # Start the execution
+
+        self.sender = threading.Thread(target=self.send, args=())
+        self.sender.daemon = True
+        self.sender.start()
 
-        thread = threading.Thread(target=self.run, args=())
-        thread.daemon = True                            # Daemonize thread
-        thread.start()                                  # Start the execution
+    def submit(self, action, coords):
+        """ Queue an action, returns a Future done once the bot acknowledged all its requests """
+        future = Future()
+        with self.lock:
+            self.commands.put((self.submitted, action, coords, future))
+            self.submitted += 1
+        return future
 
     def update_action(self, action, coords):
-        time.sleep(3)
-        self.handler.update(action, coords)
+        """ Run an action, returns once the bot acknowledged all its requests """
+        try:
+            return self.submit(action, coords).result()
+        except Exception as e:
+            # Raised here, drain() does not raise it again.
+            with self.lock:
+                if e is self.error:
+                    self.error = None
+            raise
+
+    def drain(self):
+        """ Block until all the queued actions are done, raises the error of the first action
+            failed since the last error raised
+        """
+        self.commands.join()
+        with self.lock:
+            error, self.error = self.error, None
+        if error is not None:
+            raise error
+
+    def fail(self, error):
+        """ Fail the actions queued by now with error """
+        with self.lock:
+            self.failure, self.failed_before = error, self.submitted
+            if self.error is None:
+                self.error = error
+
+    def close(self, timeout=None):
+        """ Stop the send() thread once the queued actions are done and disconnect from the bot,
+            which ends run()
+            Args
+                timeout (float): seconds to wait for each thread, forever if None
+        """
+        self.commands.put(None)
+        self.sender.join(timeout)
+        if self.handler.CLIENT is not None:
+            # connect() of the FarmBot of start() returns once its MQTT client disconnects.
+            self.handler.CLIENT.disconnect()
+        elif self.bot is not None:
+            self.bot.disconnect()
+        self.thread.join(timeout)
+
+    def send(self):
+        """ Method that sends the queued actions until close() """
+        while True:
+            command = self.commands.get()
+            try:
+                if command is None:
+                    return
+                index, action, coords, future = command
+                if not future.set_running_or_notify_cancel():
+                    continue
+                if index >= self.failed_before and not self.handler.connected.wait(CONNECT_TIMEOUT):
+                    self.fail(TimeoutError("FarmBot did not connect in " + str(CONNECT_TIMEOUT) + "s"))
+                if index < self.failed_before:
+                    future.set_exception(self.failure)
+                    continue
+                try:
+                    self.handler.update(action, coords)
+                except Exception as e:
+                    self.fail(e)
+                    future.set_exception(e)
+                else:
+                    future.set_result(None)
+            finally:
+                self.commands.task_done()
 
     def run(self):
-        """ Method that runs forever """
-        fb = start()
-        self.handler = MyHandler()
+        """ Method that runs until close() """
+        fb = self.bot if self.bot is not None else start()
         fb.connect(self.handler)
-
@@ -7,8 +7,9 @@ import argparse
 import imutils
 import math
 import glob
-from control import start, MyHandler, mount_xPruner, mount_yPruner, dismount_xPruner, dismount_yPruner, mount_nozzle, dismount_nozzle, photo
+from control import start, mount_xPruner, mount_yPruner, dismount_xPruner, dismount_yPruner, mount_nozzle, dismount_nozzle, photo
 from thread import FarmBotThread
+from movement import pyramid_match
 import argparse
 import time
 
@@ -118,25 +119,11 @@ def find_local_in_overhead(local_image, overhead_image, target):
 
     sf = 11.9 #scale factor for overhead image ex. 11.9 px = 1 cm
 
-    res = cv2.matchTemplate(img, template.astype(np.uint8) ,method)
-
-    masked_res = np.zeros(res.shape)
-    res_x_lower = int(targetpx_x - img.shape[0]/2 - int(error[0]*sf/2))
-    res_x_lower = res_x_lower if res_x_lower >=0 else 0
-    res_x_upper = int(targetpx_x - img.shape[0]/2 + int(error[0]*sf/2))
-    res_x_upper = res_x_upper if res_x_upper <=masked_res.shape[1] else masked_res.shape[1]
-
-    res_y_lower = int(targetpx_y - img.shape[1]/2 - int(error[1]*sf/2))
-    res_y_lower = res_y_lower if res_y_lower >=0 else 0
-    res_y_upper = int(targetpx_y - img.shape[1]/2 + int(error[1]*sf/2))
-    res_y_upper = res_y_upper if res_y_upper <=masked_res.shape[0] else masked_res.shape[0]
-
-    print(masked_res.shape, res_x_lower, res_x_upper, res_y_lower, res_y_upper)
-    masked_res[res_y_lower:res_y_upper, res_x_lower:res_x_upper] = res[res_y_lower:res_y_upper, res_x_lower:res_x_upper]
-    
-    #cv2.imwrite("Masked_res.png", masked_res)
-    
-    min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(masked_res)
+    # Coarse to fine search in the region of interest only, the local image is already rescaled
+    best = pyramid_match(img, template.astype(np.uint8), (targetpx_x, targetpx_y), error, [1], method=method)
+    if best is None:
+        raise ValueError("The local image does not fit in the overhead image around " + str(target))
+    max_val, max_loc, _ = best
     print(max_val, max_loc)
     
 
@@ -146,8 +133,6 @@ def find_local_in_overhead(local_image, overhead_image, target):
     cv2.rectangle(img,top_left, bottom_right, 255, 2)
 
     #checking the cross correlation, white = more correlated
-    plt.subplot(121),plt.imshow(res,cmap = 'gray')
-    plt.title('Matching Result'), plt.xticks([]), plt.yticks([])
     plt.subplot(122),plt.imshow(img,cmap = 'gray')
     plt.title('Detected Point'), plt.xticks([]), plt.yticks([])
     plt.suptitle(meth)
@@ -233,8 +218,7 @@ def resize_local(local_image):
 def farmbot_target_approach(fb, target_point, overhead_image):
     #have farmbot apporach the target within same local image
     epsilon = 1 # the threshold needed to satisfy the closeness requirement
-    handler = MyHandler("move", (target_point[0] * 10, target_point[1] * 10,0))
-    fb.connect(handler)
+    fb.update_action("move", (target_point[0] * 10, target_point[1] * 10,0))
 
     curr_pos = curr_pos_from_local(fb, overhead_image, target_point)#get from local image
         
@@ -250,8 +234,7 @@ def farmbot_target_approach(fb, target_point, overhead_image):
         print(diff_x, diff_y)
         coord_x += int(np.sign(diff_x) * min(3, np.abs(diff_x)))
         coord_y += int(np.sign(diff_y) * min(3, np.abs(diff_y)))
-        handler = MyHandler("move", (coord_x * 10, coord_y * 10,0))
-        fb.connect(handler)
+        fb.update_action("move", (coord_x * 10, coord_y * 10,0))
         curr_pos = curr_pos_from_local(fb, overhead_image, target_point)#get from local image
         count += 1
         previous_points.append(tuple((coord_x, coord_y)))
@@ -264,8 +247,7 @@ def farmbot_target_approach(fb, target_point, overhead_image):
         y = int(input("Enter y adjustment (cm): "))
         coord_x += x
         coord_y += y
-        handler = MyHandler("move", (coord_x * 10, coord_y * 10,0))
-        fb.connect(handler)
+        fb.update_action("move", (coord_x * 10, coord_y * 10,0))
     
     return tuple((coord_x, coord_y))
 
@@ -299,51 +281,45 @@ def batch_prune(target_list, overhead, rpi_check):
     x_list, y_list = separate_list(target_list)
 
     #tool_mounted = ""
-    dismount_nozzle()
-    mount_xPruner()
+    dismount_nozzle(fb)
+    mount_xPruner(fb)
     for i in x_list:
-        handler = MyHandler("move", (i[0] * 10, i[1] * 10,0))
-        fb.connect(handler)
+        fb.update_action("move", (i[0] * 10, i[1] * 10,0))
         if rpi_check:
             done = False
             while (done == False):
                 #go down z cm prune and come back up
                 bef_name = recent_rpi_photo(fb)
         
-                handler = MyHandler("prune", None)
-                fb.connect(handler)
+                fb.update_action("prune", None)
 
                 aft_name = recent_rpi_photo(fb)
                 done = check_prune(bef_name, aft_name)
         else:
-            handler = MyHandler("prune", None) #TODO add functionality to go up and down and prune
-            fb.connect(handler)
+            fb.update_action("prune", None) #TODO add functionality to go up and down and prune
         #prune action
 
-    dismount_xPruner()
-    mount_yPruner()
+    dismount_xPruner(fb)
+    mount_yPruner(fb)
 
     for i in y_list:
-        handler = MyHandler("move", (i[0] * 10 - 40, i[1] * 10 + 40,0)) #y requires offset
-        fb.connect(handler)
+        fb.update_action("move", (i[0] * 10 - 40, i[1] * 10 + 40,0)) #y requires offset
         if rpi_check:
             done = False
             while (done == False):
                 #go down z cm prune and come back up
                 bef_name = recent_rpi_photo(fb)
         
-                handler = MyHandler("prune", None)
-                fb.connect(handler)
+                fb.update_action("prune", None)
 
                 aft_name = recent_rpi_photo(fb)
                 done = check_prune(bef_name, aft_name)
         else:
-            handler = MyHandler("prune", None) #TODO add functionality to go up and down and prune
-            fb.connect(handler)
+            fb.update_action("prune", None) #TODO add functionality to go up and down and prune
         #prune action
 
-    dismount_yPruner()
-    mount_nozzle()
+    dismount_yPruner(fb)
+    mount_nozzle(fb)
 
     return None
 
@@ -352,8 +328,7 @@ def crop_o_px_to_cm(x_px, y_px):
     return pred_pt
 
 def recent_rpi_photo(fb):
-    handler = MyHandler("photo", None)
-    fb.connect(handler)
+    fb.update_action("photo", None)
     cwd = os.getcwd()
     rpi_folder_path = os.path.join(cwd, "rpi_images")
     time.sleep(15)
@@ -398,8 +373,7 @@ def curr_pos_from_local(fb, overhead_image, target):
         os.makedirs(rpi_folder_path)
     
     #TODO take photo API and place in rpi_images directory
-    handler = MyHandler("photo", None)
-    fb.connect(handler)
+    fb.update_action("photo", None)
 
     time.sleep(15)
     photo(rpi_folder_path + "/")
@@ -8,7 +8,8 @@ import argparse
 import pickle
 import sys
 
-side = sys.argv[1]
+#: Folder of the circles and timestep of the real garden, and of the garden copy for eval_policy.
+CENTER_TRACKING_PATH = "/Users/mpresten/Desktop/AlphaGarden_git/AlphaGarden/Center-Tracking/" #update path
 
 ''' From garden.py '''
 def compute_growth_map():
@@ -107,55 +108,83 @@ def copy_garden(garden_state, rows, cols, sector_row, sector_col, prune_win_rows
 # }
 
 # real_data = {'cilantro': {((137, 36), 30), ((14, 31), 30)}, 'green_lettuce': {((24, 16), 30), ((116, 18), 30)}, 'radicchio': {((90, 24), 30), ((24, 84), 40)}, 'swiss_chard': {((27, 55), 40), ((121, 121), 40)}, 'turnip': {((84, 58), 40), ((34, 116), 40)}, 'kale': {((56, 35), 40), ((94, 97), 40)}, 'borage': {((65, 120), 40), ((121, 73), 40)}, 'red_lettuce': {((90, 135), 40), ((134, 22), 40)}}
-real_data = pickle.load(open("/Users/mpresten/Desktop/AlphaGarden_git/AlphaGarden/Center-Tracking/current_dic_"+side+".p", "rb")) #update path
-print("LOADED: ", side)
-print(real_data)
-timestep = pickle.load(open("/Users/mpresten/Desktop/AlphaGarden_git/AlphaGarden/Center-Tracking/timestep.p", "rb")) #9
-
-plant_type = PlantType()
-plant_types = plant_type.plant_names
-plant_objs = plant_type.get_plant_seeds(0, ROWS, COLS, SECTOR_ROWS, SECTOR_COLS,
-                                        start_from_germination=False, existing_data=real_data,
-                                        timestep=timestep)
-
-plants = [{} for _ in range(len(plant_types))]
-
-grid = np.empty((ROWS, COLS), dtype=[('water', 'f'), ('health', 'i'), ('nearby', 'O'), ('last_watered', 'i')])
-grid['water'] = np.random.normal(0.2, 0.04, grid['water'].shape) if timestep == 0 else pickle.load(open("policy_metrics/water_grid_" + SIDE + "/water_grid_"  + str(timestep-1) + "_2after_evap.pkl", "rb"))
-grid['last_watered'] = grid['last_watered'] = np.zeros(grid['last_watered'].shape).astype(int) if timestep == 0 else pickle.load(open("policy_metrics/water_grid_" + SIDE + "/last_watered_"  + str(timestep-1) + "_2after_evap.pkl", "rb"))
-
-for i in range(ROWS):
-    for j in range(COLS):
-        grid[i, j]['nearby'] = set()
-
-plant_grid = np.zeros((ROWS, COLS, len(plant_types)))
-
-plant_prob = np.zeros((ROWS, COLS, 1 + len(plant_types)))
-
-leaf_grid = np.zeros((ROWS, COLS, len(plant_types)))
-
-plant_locations = {}
-
-id_ctr = 0
-for plant in plant_objs:
-    add_plant(plant, id_ctr, plants, plant_types, plant_locations, grid, plant_grid, leaf_grid)
-    id_ctr += 1
-    
-grid['health'] = compute_plant_health(grid, grid['health'].shape, plants)
-
-growth_map = compute_growth_map()
-
-radius_grid = np.zeros((ROWS, COLS, 1))
-for p_type in real_data:
-    for plant in real_data[p_type]:
-        r, c = plant[0]
-        radius = plant[1]
-        radius_grid[r, c, 0] = radius 
-
-garden_state = GardenState(plants, grid, plant_grid, plant_prob, leaf_grid, plant_type,
-                           plant_locations, growth_map, radius_grid, timestep, existing_data=True)
-garden_copy = copy_garden(garden_state=garden_state, rows=ROWS, cols=COLS, sector_row=SECTOR_ROWS,
-                          sector_col=SECTOR_COLS, prune_win_rows=PRUNE_WINDOW_ROWS,
-                          prune_win_cols=PRUNE_WINDOW_COLS, step=STEP, prune_rate=PRUNE_RATE)
-pickle.dump([garden_copy, plant_type], open("/Users/mpresten/Desktop/AlphaGarden_git/AlphaGarden/Center-Tracking/garden_copy.pkl", "wb")) 
-print("SAVED!")
+
+def load_water_grid(timestep):
+    """ Water levels and days since watering of the garden at the start of a day, from the grids
+    the simulator saved after the evaporation of the day before, random on the first day.
+    Args:
+        timestep (int): day of the garden.
+    Return:
+        Water grid and last watered grid.
+    """
+    if timestep == 0:
+        return np.random.normal(0.2, 0.04, (ROWS, COLS)), np.zeros((ROWS, COLS)).astype(int)
+    water = pickle.load(open("policy_metrics/water_grid_" + SIDE + "/water_grid_"  + str(timestep-1) + "_2after_evap.pkl", "rb"))
+    last_watered = pickle.load(open("policy_metrics/water_grid_" + SIDE + "/last_watered_"  + str(timestep-1) + "_2after_evap.pkl", "rb"))
+    return water, last_watered
+
+def garden_state_from_circles(real_data, timestep, growth_map=None):
+    """ Garden state of the real garden from the circles fit to its plants.
+    Args:
+        real_data (dict): plant type to set of ((row, col), radius) circles.
+        timestep (int): day of the garden.
+        growth_map (list): see compute_growth_map, computed if None.
+    Return:
+        GardenState of the garden.
+    """
+    plant_type = PlantType()
+    plant_types = plant_type.plant_names
+    plant_objs = plant_type.get_plant_seeds(0, ROWS, COLS, SECTOR_ROWS, SECTOR_COLS,
+                                            start_from_germination=False, existing_data=real_data,
+                                            timestep=timestep)
+
+    plants = [{} for _ in range(len(plant_types))]
+
+    grid = np.empty((ROWS, COLS), dtype=[('water', 'f'), ('health', 'i'), ('nearby', 'O'), ('last_watered', 'i')])
+    grid['water'], grid['last_watered'] = load_water_grid(timestep)
+
+    for i in range(ROWS):
+        for j in range(COLS):
+            grid[i, j]['nearby'] = set()
+
+    plant_grid = np.zeros((ROWS, COLS, len(plant_types)))
+
+    plant_prob = np.zeros((ROWS, COLS, 1 + len(plant_types)))
+
+    leaf_grid = np.zeros((ROWS, COLS, len(plant_types)))
+
+    plant_locations = {}
+
+    id_ctr = 0
+    for plant in plant_objs:
+        add_plant(plant, id_ctr, plants, plant_types, plant_locations, grid, plant_grid, leaf_grid)
+        id_ctr += 1
+        
+    grid['health'] = compute_plant_health(grid, grid['health'].shape, plants)
+
+    if growth_map is None:
+        growth_map = compute_growth_map()
+
+    radius_grid = np.zeros((ROWS, COLS, 1))
+    for p_type in real_data:
+        for plant in real_data[p_type]:
+            r, c = plant[0]
+            radius = plant[1]
+            radius_grid[r, c, 0] = radius 
+
+    return GardenState(plants, grid, plant_grid, plant_prob, leaf_grid, plant_type,
+                       plant_locations, growth_map, radius_grid, timestep, existing_data=True)
+
+if __name__ == "__main__":
+    side = sys.argv[1]
+    real_data = pickle.load(open(CENTER_TRACKING_PATH + "current_dic_"+side+".p", "rb"))
+    print("LOADED: ", side)
+    print(real_data)
+    timestep = pickle.load(open(CENTER_TRACKING_PATH + "timestep.p", "rb")) #9
+
+    garden_state = garden_state_from_circles(real_data, timestep)
+    garden_copy = copy_garden(garden_state=garden_state, rows=ROWS, cols=COLS, sector_row=SECTOR_ROWS,
+                              sector_col=SECTOR_COLS, prune_win_rows=PRUNE_WINDOW_ROWS,
+                              prune_win_cols=PRUNE_WINDOW_COLS, step=STEP, prune_rate=PRUNE_RATE)
+    pickle.dump([garden_copy, garden_state.plant_type], open(CENTER_TRACKING_PATH + "garden_copy.pkl", "wb")) 
+    print("SAVED!")
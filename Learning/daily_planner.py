@@ -0,0 +1,75 @@
+import numpy as np
+import pickle
+import argparse
+import time
+import simulator.baselines.wrapper_analytic_policy as wrapper_policy
+from simulator.sim_globals import ROWS, COLS, STEP, SECTOR_ROWS, SECTOR_COLS, PRUNE_WINDOW_ROWS, PRUNE_WINDOW_COLS, PRUNE_RATE, NUM_IRR_ACTIONS, NUM_PLANTS, PERCENT_NON_PLANT_CENTERS
+from create_state import CENTER_TRACKING_PATH, compute_growth_map, copy_garden, garden_state_from_circles
+
+
+class DailyPlanner:
+    def __init__(self, water_threshold=1.0, seed=None):
+        """ Plans the irrigation and pruning of a day of the real garden in process, like create_state.py
+        followed by a one day run of the analytic policy with eval_policy.py, without starting an interpreter
+        and importing the simulator for each day. Keep one planner for all the days.
+
+        Args
+            water_threshold (float): Threshold when the policy irrigates.
+            seed (int): Seed of the sectors the policy observes each day, not seeded if None.
+        """
+        self.water_threshold = water_threshold
+        self.seed = seed
+        self.sector_obs_per_day = int(NUM_PLANTS + PERCENT_NON_PLANT_CENTERS * NUM_PLANTS)
+        # Only depends on the garden size, the same for all days.
+        self.growth_map = compute_growth_map()
+
+    def plan(self, real_data, timestep):
+        """ Simulate a day of the garden under the analytic policy.
+
+        Note:
+            The simulator still saves the watered sectors and the water grids of the day under policy_metrics/,
+            the water grids are the start of the next day.
+
+        Args
+            real_data (dict): Plant type to set of ((row, col), radius) circles of the plants, see track.py.
+            timestep (int): Day of the garden.
+
+        Return
+            Dictionary with the watered sectors, the coordinates to irrigate and the coordinates to prune per plant type.
+        """
+        if self.seed is not None:
+            np.random.seed(self.seed)
+        garden_state = garden_state_from_circles(real_data, timestep, self.growth_map)
+        garden = copy_garden(garden_state=garden_state, rows=ROWS, cols=COLS, sector_row=SECTOR_ROWS,
+                             sector_col=SECTOR_COLS, prune_win_rows=PRUNE_WINDOW_ROWS,
+                             prune_win_cols=PRUNE_WINDOW_COLS, step=STEP, prune_rate=PRUNE_RATE)
+        cc_per_plant = garden.get_cc_per_plant()
+        cc_vec = np.append(ROWS * COLS * STEP - np.sum(cc_per_plant), cc_per_plant).reshape((-1, 1))
+        # eval_policy.py evaluates a single day, so its steps start at 0.
+        sectors_center, actions = wrapper_policy.plan_day(garden, cc_vec, ROWS, COLS, 0, SECTOR_ROWS, SECTOR_COLS,
+                                                          PRUNE_WINDOW_ROWS, PRUNE_WINDOW_COLS, STEP,
+                                                          self.water_threshold, NUM_IRR_ACTIONS,
+                                                          self.sector_obs_per_day)
+        garden.perform_timestep(sectors_center, actions)
+        watered_sectors = [sector for sector, action in zip(sectors_center, actions)
+                           if action in (NUM_IRR_ACTIONS, NUM_IRR_ACTIONS + 2)]
+        return {'watered_sectors': watered_sectors, 'irr_coords': garden.irr_coords,
+                'prune_coords': garden.prune_coords}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Plan the days of the real garden with one warm planner')
+    parser.add_argument('side', help='Side of the garden, l or r.')
+    parser.add_argument('-d', '--days', type=int, default=1, help='Days planned, from the timestep of the garden.')
+    parser.add_argument('-s', '--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    real_data = pickle.load(open(CENTER_TRACKING_PATH + "current_dic_" + args.side + ".p", "rb"))
+    timestep = pickle.load(open(CENTER_TRACKING_PATH + "timestep.p", "rb"))
+    start = time.perf_counter()
+    planner = DailyPlanner(seed=args.seed)
+    print("Planner ready in {:.2f}s".format(time.perf_counter() - start))
+    for day in range(timestep, timestep + args.days):
+        start = time.perf_counter()
+        plan = planner.plan(real_data, day)
+        print("Day {}: {} watered sectors in {:.2f}s".format(day, len(plan['watered_sectors']), time.perf_counter() - start))
@@ -7,6 +7,8 @@ from simulator.sim_globals import NUM_IRR_ACTIONS, NUM_PLANTS, PERCENT_NON_PLANT
 import simalphagarden
 import simulator.baselines.analytic_policy as analytic_policy
 import simulator.baselines.wrapper_analytic_policy as wrapper_policy
+from simulator.baselines.candidate_evaluator import CandidateEvaluator
+from simulator.baselines.lookahead_planner import LookaheadPlanner
 from net import Net
 from constants import TrainingConstants
 import numpy as np
@@ -23,12 +25,16 @@ parser.add_argument('-t', '--tests', type=int, default=1)
 parser.add_argument('-n', '--net', type=str, default='/')
 parser.add_argument('-m', '--moments', type=str, default='/')
 parser.add_argument('-s', '--seed', type=int, default=0)
-parser.add_argument('-p', '--policy', type=str, default='ba', help='[ba|bw|n|l|i] baseline analytic [ba], baseline wrapper [bw], naive baseline [n], learned [l], irrigation [i]')
+parser.add_argument('-p', '--policy', type=str, default='ba', help='[ba|bw|bh|n|l|i] baseline analytic [ba], baseline wrapper [bw], baseline wrapper with lookahead planner [bh], naive baseline [n], learned [l], irrigation [i]')
 parser.add_argument('--multi', action='store_true', help='Enable multiprocessing.')
 parser.add_argument('-l', '--threshold', type=float, default=1.0)
 parser.add_argument('-d', '--days', type=int, default=100)
 parser.add_argument('-w', '--water_threshold', type=float, default=1.0)
 parser.add_argument('-o', '--output_directory', type=str, default='policy_metrics/')
+parser.add_argument('--horizon', type=int, default=3, help='Days simulated ahead by the lookahead planner.')
+parser.add_argument('--beam', type=int, default=0, help='Beam width of the lookahead planner, 0 for successive halving.')
+parser.add_argument('--workers', type=int, default=0, help='Worker processes simulating the wrapper policy candidates, 0 to simulate them in this process.')
+parser.add_argument('--candidate_gardens', action='store_true', help='Simulate the wrapper policy candidates side by side in CandidateGardens instead of one after the other.')
 args = parser.parse_args()
 
 def init_env(rows, cols, depth, sector_rows, sector_cols, prune_window_rows,
@@ -186,7 +192,8 @@ def evaluate_analytic_policy_multi(env, policy, collection_time_steps, sector_ro
     
 def evaluate_analytic_policy_serial(env, policy, wrapper_sel, collection_time_steps, sector_rows, sector_cols, 
                             prune_window_rows, prune_window_cols, garden_step, water_threshold,
-                            sector_obs_per_day, trial, save_dir, vis_identifier):
+                            sector_obs_per_day, trial, save_dir, vis_identifier, candidate_evaluator=None, planner=None,
+                            seed=0, candidate_gardens=False):
     wrapper = wrapper_sel # If wrapper_sel is True then the wrapper_adapative policy will be used, if false then the normal fixed adaptive policy will be used
     prune_rates_order = []
     irrigation_amounts_order = []
@@ -208,24 +215,38 @@ def evaluate_analytic_policy_serial(env, policy, wrapper_sel, collection_time_st
                 pr = 0
                 prune_rates = [0.05, 0.1, 0.16, 0.2, 0.3, 0.4]
                 irrigation_amounts = [0.002]
-                covs, divs, cv = [], [], []
                 day_p = (i / sector_obs_per_day) - PRUNE_DELAY
                 w1 = day_p / 50 # weights are 0 to 1 between days 20 and 70
                 w2 = 1 - w1
-                for irr_amt in irrigation_amounts:
-                    for pr_i in range(len(prune_rates)):
-                        garden_state = env.get_simulator_state_copy()
-                        cov, div = wrapper_policy.wrapperPolicy(div_cov, env, env.wrapper_env.rows, env.wrapper_env.cols, i, obs, cc_vec, sector_rows, sector_cols, prune_window_rows,
+                candidates = [(prune_rate, irr_amt) for irr_amt in irrigation_amounts for prune_rate in prune_rates]
+                if planner is not None:
+                    # Roll all candidates out several days ahead, dropping the weak ones along the way.
+                    pr, ir = planner.plan(garden_state, candidates, i, w1, w2)
+                    print("Planner: {} rollouts, {:.2f} rollouts/s".format(planner.rollouts, planner.rollouts_per_second))
+                else:
+                    if candidate_evaluator is not None:
+                        # Each candidate is simulated one day ahead in a worker process.
+                        covs, divs = map(list, zip(*candidate_evaluator.evaluate(garden_state, candidates, i, cc_vec, seed=seed)))
+                    elif candidate_gardens:
+                        # All candidates are simulated side by side, one day ahead.
+                        metrics = wrapper_policy.wrapperPolicyBatched(env, env.wrapper_env.rows, env.wrapper_env.cols, i, sector_rows, sector_cols, prune_window_rows,
                                     prune_window_cols, garden_step, water_threshold, NUM_IRR_ACTIONS,
-                                    sector_obs_per_day, garden_state, prune_rates[pr_i], irr_amt,
-                                    vectorized=False)
-                        covs.append(cov)
-                        divs.append(div)
-                        cv.append((w1 * div + w2 * cov, (prune_rates[pr_i], irr_amt)))
-                        # cv.append((mme1, (prune_rates[pr_i], irr_amt)))
-                        # cv.append((mme2, (prune_rates[pr_i], irr_amt)))
-                pr = cv[np.argmax([result[0] for result in cv])][1][0]
-                ir = cv[np.argmax([result[0] for result in cv])][1][1]
+                                    sector_obs_per_day, garden_state, candidates, seed=seed)
+                        covs, divs = list(metrics['coverage']), list(metrics['diversity'])
+                    else:
+                        covs, divs = [], []
+                        for prune_rate, irr_amt in candidates:
+                            cov, div = wrapper_policy.wrapperPolicy(div_cov, env, env.wrapper_env.rows, env.wrapper_env.cols, i, obs, cc_vec, sector_rows, sector_cols, prune_window_rows,
+                                        prune_window_cols, garden_step, water_threshold, NUM_IRR_ACTIONS,
+                                        sector_obs_per_day, garden_state, prune_rate, irr_amt,
+                                        vectorized=False, seed=seed)
+                            covs.append(cov)
+                            divs.append(div)
+                    cv = [(w1 * div + w2 * cov, candidate) for cov, div, candidate in zip(covs, divs, candidates)]
+                    # cv = list(zip(metrics['mme1'], candidates))
+                    # cv = list(zip(metrics['mme2'], candidates))
+                    pr = cv[np.argmax([result[0] for result in cv])][1][0]
+                    ir = cv[np.argmax([result[0] for result in cv])][1][1]
                 prune_rates_order.append(pr)
                 irrigation_amounts_order.append(ir)
                 env.set_prune_rate(pr)
@@ -428,9 +449,25 @@ if __name__ == '__main__':
                                         prune_window_rows, prune_window_cols, garden_step, water_threshold,
                                         sector_obs_per_day, trial)
             else:
+                candidate_evaluator = None
+                if args.workers > 0:
+                    candidate_evaluator = CandidateEvaluator(args.workers, rows, cols, sector_rows, sector_cols,
+                                                             prune_window_rows, prune_window_cols, garden_step,
+                                                             water_threshold, sector_obs_per_day)
                 evaluate_analytic_policy_serial(env, analytic_policy.policy, True, collection_time_steps, sector_rows, sector_cols,
                                         prune_window_rows, prune_window_cols, garden_step, water_threshold,
-                                        sector_obs_per_day, trial, save_dir, vis_identifier)
+                                        sector_obs_per_day, trial, save_dir, vis_identifier,
+                                        candidate_evaluator=candidate_evaluator, seed=seed,
+                                        candidate_gardens=args.candidate_gardens)
+                if candidate_evaluator is not None:
+                    candidate_evaluator.close()
+        elif args.policy == 'bh':
+            planner = LookaheadPlanner(rows, cols, sector_rows, sector_cols, prune_window_rows, prune_window_cols,
+                                       garden_step, water_threshold, sector_obs_per_day, horizon=args.horizon,
+                                       beam_width=args.beam, seed=seed)
+            evaluate_analytic_policy_serial(env, analytic_policy.policy, True, collection_time_steps, sector_rows, sector_cols,
+                                    prune_window_rows, prune_window_cols, garden_step, water_threshold,
+                                    sector_obs_per_day, trial, save_dir, vis_identifier, planner=planner)
         elif args.policy == 'n':
             evaluate_fixed_policy(env, garden_days, sector_obs_per_day, trial, naive_water_freq, naive_prune_threshold, save_dir='fixed_policy_data_thresh_' + str(args.threshold) + '/')
         elif args.policy == 'i':
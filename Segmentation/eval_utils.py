@@ -47,18 +47,16 @@ def generate_full_label_map(test_image, model):
 
 def colors_to_labels(original_mask):
     ground_truth_label_map = np.full((original_mask.shape[0],original_mask.shape[1]), 0)
+    # Pack the green and blue channels, the ones telling the classes apart, into one key per pixel.
+    keys = (original_mask[:, :, 1].astype(int) << 8) | original_mask[:, :, 2]
     for j in range(len(COLORS)):
-        pred_indices = np.argwhere((original_mask[:, :, 1] == COLORS[j][1]) & (original_mask[:, :, 2] == COLORS[j][2]))
-        for pred_index in pred_indices:
-            ground_truth_label_map[pred_index[0]][pred_index[1]] = j
+        ground_truth_label_map[keys == (COLORS[j][1] << 8 | COLORS[j][2])] = j
     return ground_truth_label_map
 
 def labels_to_colors(label_map):
     predicted_mask = np.full((label_map.shape[0], label_map.shape[1], 3), 0)
-    for j in range(len(COLORS)):
-        pred_indices = np.argwhere(label_map == j)
-        for pred_index in pred_indices:
-            predicted_mask[pred_index[0], pred_index[1], :] = COLORS[j]
+    known = (label_map >= 0) & (label_map < len(COLORS))
+    predicted_mask[known] = np.asarray(COLORS)[label_map[known]]
     return predicted_mask
 
 def iou_score(target, prediction, label):
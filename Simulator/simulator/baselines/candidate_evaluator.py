@@ -0,0 +1,132 @@
+import numpy as np
+import itertools
+import multiprocessing as mp
+import os
+import pickle
+import tempfile
+import simulator.baselines.wrapper_analytic_policy as wrapper_policy
+from simulator.candidate_gardens import CandidateGardens
+from simulator.sim_globals import IRR_THRESHOLD, NUM_IRR_ACTIONS
+
+# Per worker process: settings shared by all rollouts and the garden state of the day being evaluated.
+_worker_config = {}
+_worker_state = {'token': None, 'garden_state': None}
+
+
+def _init_worker(config):
+    """ Store the rollout settings in a new worker process.
+    Args
+        config (dict): Keyword arguments of rollout_candidate besides the per day ones.
+    """
+    _worker_config.update(config)
+
+
+def _load_garden_state(token, path):
+    """ Load the garden state of the day, once per worker and day.
+    Args
+        token (int): Number of the evaluate call, temporary file paths can be reused by later calls.
+        path (str): File the parent process wrote the pickled garden state to.
+    Return
+        GardenState of the day.
+    """
+    if _worker_state['token'] != token:
+        with open(path, 'rb') as f:
+            _worker_state['garden_state'] = pickle.load(f)
+        _worker_state['token'] = token
+    return _worker_state['garden_state']
+
+
+def _evaluate_candidate(task):
+    """ Pool task running the rollout of one candidate.
+    Args
+        task (tuple): Call token and path of the garden state, candidate, timestep, global canopy cover and seed.
+    Return
+        Coverage and diversity after the day.
+    """
+    token, path, candidate, timestep, cc_vec, seed = task
+    return rollout_candidate(_load_garden_state(token, path), candidate, timestep, cc_vec, seed, **_worker_config)
+
+
+def rollout_candidate(garden_state, candidate, timestep, cc_vec, seed, rows, cols, sector_rows, sector_cols,
+                      prune_window_rows, prune_window_cols, step, water_threshold, sector_obs_per_day):
+    """ Simulate one day of the analytic policy with the prune rate and irrigation amount of a candidate.
+
+    Note:
+        The sectors are drawn after np.random.seed(seed) and the water from the streams of water_seed=seed, like
+        wrapperPolicyBatched (and wrapperPolicy with BATCHED_WATER and OCCUPANCY_INDEX on), so the result only
+        depends on the garden state, the candidate and the seed, not on which process runs it or what it ran before.
+
+    Args
+        garden_state (GardenState): State of the garden at the start of the day.
+        candidate (tuple of (float, float)): Prune rate and irrigation amount.
+        timestep (int): simulation time step.
+        cc_vec (array): Global canopy cover.
+        seed (int): Seed of the rollout.
+
+    Return
+        Coverage and diversity after the day.
+    """
+    np.random.seed(seed)
+    batch = CandidateGardens(garden_state, [candidate], N=rows, M=cols, sector_rows=sector_rows,
+                             sector_cols=sector_cols, prune_window_rows=prune_window_rows,
+                             prune_window_cols=prune_window_cols, irr_threshold=IRR_THRESHOLD, step=step,
+                             animate=False, water_seed=seed)
+    sectors_center, actions = wrapper_policy.plan_day(batch.gardens[0], cc_vec, rows, cols, timestep, sector_rows,
+                                                      sector_cols, prune_window_rows, prune_window_cols, step,
+                                                      water_threshold, NUM_IRR_ACTIONS, sector_obs_per_day)
+    metrics = batch.perform_timestep(sectors_center, actions)
+    return metrics['coverage'][0], metrics['diversity'][0]
+
+
+class CandidateEvaluator:
+    def __init__(self, processes, rows, cols, sector_rows, sector_cols, prune_window_rows, prune_window_cols, step,
+                 water_threshold, sector_obs_per_day):
+        """ Persistent pool of worker processes simulating the wrapper policy's candidates in parallel.
+
+        Note:
+            The garden state of a day is pickled to a file once and every worker loads it once, however many
+            candidates it simulates that day.
+
+        Args
+            processes (int): Amount of worker processes, all cores if None.
+            rows (int): Amount rows for the grid modeling the garden (N in paper).
+            cols (int): Amount columns for the grid modeling the garden (M in paper).
+            sector_rows (int): Row size of a sector.
+            sector_cols (int): Column size of a sector.
+            prune_window_rows (int): Row size of pruning window.
+            prune_window_cols (int): Column size of pruning window.
+            step (int): Distance between adjacent points in grid.
+            water_threshold (float): Threshold when policy irrigates.
+            sector_obs_per_day (int): Number of sectors observed per days.
+        """
+        config = dict(rows=rows, cols=cols, sector_rows=sector_rows, sector_cols=sector_cols,
+                      prune_window_rows=prune_window_rows, prune_window_cols=prune_window_cols, step=step,
+                      water_threshold=water_threshold, sector_obs_per_day=sector_obs_per_day)
+        self.pool = mp.Pool(processes, initializer=_init_worker, initargs=(config,))
+        self.calls = itertools.count()  # Tokens telling the workers a new garden state was written.
+
+    def evaluate(self, garden_state, candidates, timestep, cc_vec, seed=0):
+        """ Simulate one day for every candidate.
+        Args
+            garden_state (GardenState): State of the garden at the start of the day.
+            candidates (list of (float, float)): Prune rate and irrigation amount to evaluate.
+            timestep (int): simulation time step.
+            cc_vec (array): Global canopy cover.
+            seed (int): Seed shared by the rollouts of all candidates.
+        Return
+            List with coverage and diversity tuple per candidate, in the order of candidates.
+        """
+        token = next(self.calls)
+        fd, path = tempfile.mkstemp(suffix='.pkl')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(garden_state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            tasks = [(token, path, candidate, timestep, cc_vec, seed) for candidate in candidates]
+            return self.pool.map(_evaluate_candidate, tasks, chunksize=1)
+        finally:
+            os.remove(path)
+
+    def close(self):
+        """ Stop the worker processes."""
+        self.pool.close()
+        self.pool.join()
@@ -0,0 +1,116 @@
+import numpy as np
+import time
+import simulator.baselines.wrapper_analytic_policy as wrapper_policy
+from simulator.candidate_gardens import CandidateGardens
+from simulator.garden_state import GardenSnapshot
+from simulator.sim_globals import IRR_THRESHOLD, NUM_IRR_ACTIONS
+
+
+class LookaheadPlanner:
+    def __init__(self, rows, cols, sector_rows, sector_cols, prune_window_rows, prune_window_cols, step,
+                 water_threshold, sector_obs_per_day, horizon=3, beam_width=0, seed=0):
+        """ Receding horizon planner choosing the prune rate and irrigation amount of the wrapper policy.
+
+        Note:
+            Every candidate is rolled out for horizon days. After each simulated day, branches whose coverage and
+            diversity are both beaten by another branch are dropped, and of the remaining ones only the best scoring
+            are continued: half of them (successive halving) if beam_width is 0, otherwise beam_width of them, each
+            expanded again with every candidate (beam search). Branches start from copy-on-write snapshots of their
+            parent and the children of a parent are simulated side by side in one CandidateGardens.
+
+        Args
+            rows (int): Amount rows for the grid modeling the garden (N in paper).
+            cols (int): Amount columns for the grid modeling the garden (M in paper).
+            sector_rows (int): Row size of a sector.
+            sector_cols (int): Column size of a sector.
+            prune_window_rows (int): Row size of pruning window.
+            prune_window_cols (int): Column size of pruning window.
+            step (int): Distance between adjacent points in grid.
+            water_threshold (float): Threshold when policy irrigates.
+            sector_obs_per_day (int): Number of sectors observed per days.
+            horizon (int): Amount of days simulated ahead.
+            beam_width (int): Branches kept per day in beam search, 0 for successive halving.
+            seed (int): Seed of the rollouts.
+        """
+        self.rows = rows
+        self.cols = cols
+        self.sector_rows = sector_rows
+        self.sector_cols = sector_cols
+        self.prune_window_rows = prune_window_rows
+        self.prune_window_cols = prune_window_cols
+        self.step = step
+        self.water_threshold = water_threshold
+        self.sector_obs_per_day = sector_obs_per_day
+        self.horizon = horizon
+        self.beam_width = beam_width
+        self.seed = seed
+        self.rollouts = 0  #: int: Amount of garden days simulated by the last plan.
+        self.rollouts_per_second = 0  #: float: Simulated garden days per second of the last plan.
+
+    def plan(self, garden_state, candidates, timestep, w1, w2):
+        """ Choose the candidate whose rollout ends with the highest w1 * diversity + w2 * coverage.
+        Args
+            garden_state (GardenState): State of the garden at the start of the day.
+            candidates (list of (float, float)): Prune rate and irrigation amount to choose from.
+            timestep (int): simulation time step.
+            w1 (float): Weight of diversity.
+            w2 (float): Weight of coverage.
+        Return
+            Chosen (prune rate, irrigation amount) tuple.
+        """
+        start = time.time()
+        np.random.seed([self.seed, timestep])
+        self.rollouts = 0
+        # A branch is (first candidate, candidate, garden, coverage, diversity).
+        branches = self.expand(garden_state, None, candidates, timestep)
+        for day in range(1, self.horizon):
+            survivors = self.select(branches, w1, w2)
+            branches = []
+            for first, candidate, garden, _, _ in survivors:
+                children = candidates if self.beam_width else [candidate]
+                branches.extend(self.expand(GardenSnapshot(garden), first, children,
+                                            timestep + day * self.sector_obs_per_day))
+        self.rollouts_per_second = self.rollouts / (time.time() - start)
+        return max(branches, key=lambda branch: w1 * branch[4] + w2 * branch[3])[0]
+
+    def expand(self, garden_state, first, candidates, timestep):
+        """ Simulate one day from a state for every candidate.
+        Args
+            garden_state (GardenState): State to start from.
+            first (tuple of (float, float)): Candidate chosen for the first day, None if this is the first day.
+            candidates (list of (float, float)): Prune rate and irrigation amount of each child.
+            timestep (int): simulation time step.
+        Return
+            List of child branches.
+        """
+        batch = CandidateGardens(garden_state, candidates, N=self.rows, M=self.cols,
+                                 sector_rows=self.sector_rows, sector_cols=self.sector_cols,
+                                 prune_window_rows=self.prune_window_rows, prune_window_cols=self.prune_window_cols,
+                                 irr_threshold=IRR_THRESHOLD, step=self.step, animate=False, water_seed=self.seed)
+        garden = batch.gardens[0]
+        cc_per_plant = garden.get_cc_per_plant()
+        cc_vec = np.append(self.rows * self.cols * self.step - np.sum(cc_per_plant), cc_per_plant)
+        sectors_center, actions = wrapper_policy.plan_day(garden, cc_vec, self.rows, self.cols, timestep,
+                                                          self.sector_rows, self.sector_cols, self.prune_window_rows,
+                                                          self.prune_window_cols, self.step, self.water_threshold,
+                                                          NUM_IRR_ACTIONS, self.sector_obs_per_day)
+        metrics = batch.perform_timestep(sectors_center, actions)
+        self.rollouts += len(candidates)
+        return [(candidate if first is None else first, candidate, child, cov, div)
+                for candidate, child, cov, div in zip(candidates, batch.gardens, metrics['coverage'],
+                                                      metrics['diversity'])]
+
+    def select(self, branches, w1, w2):
+        """ Drop dominated branches and keep the best scoring ones.
+        Args
+            branches (list of tuples): Branches after a simulated day.
+            w1 (float): Weight of diversity.
+            w2 (float): Weight of coverage.
+        Return
+            List of branches to continue.
+        """
+        survivors = [branch for branch in branches
+                     if not any(other[3] >= branch[3] and other[4] >= branch[4] and
+                                (other[3] > branch[3] or other[4] > branch[4]) for other in branches)]
+        keep = self.beam_width if self.beam_width else max(1, (len(branches) + 1) // 2)
+        return sorted(survivors, key=lambda branch: w1 * branch[4] + w2 * branch[3], reverse=True)[:keep]
@@ -20,10 +20,11 @@ import os
 import multiprocessing as mp
 import time
 from simulator.garden import Garden
+from simulator.candidate_gardens import CandidateGardens
 
 def wrapperPolicy(div_cov_arr, env, row, col, timestep, state, global_cc_vec, sector_rows, sector_cols, prune_window_rows,
            prune_window_cols, step, water_threshold, num_irr_actions, sector_obs_per_day, garden_state, prune_rate, irrigation_amount,
-           vectorized=True, val=False, collect=False):
+           vectorized=True, val=False, collect=False, seed=0):
     """ Perform baseline policy with pruning and irrigation action.
 
     Args
@@ -42,6 +43,7 @@ def wrapperPolicy(div_cov_arr, env, row, col, timestep, state, global_cc_vec, se
         sector_obs_per_day (int): Number of sectors observed per days.
         vectorized (bool): Flag for state shape.
         eval (bool): Flag for evaluation.
+        seed (int): Seed of the sectors and of the water streams of the rollout, see wrapperPolicyBatched.
 
     Return
         List with action [int].
@@ -58,8 +60,8 @@ def wrapperPolicy(div_cov_arr, env, row, col, timestep, state, global_cc_vec, se
   
     # each day process 
 
-    np.random.seed(0)
-    garden_copy = copy_garden(garden_state=garden_state, rows=row, cols=col, sector_row= sector_rows, sector_col= sector_cols, prune_win_rows=prune_window_rows, prune_win_cols=prune_window_cols, step=step, prune_rate=prune_rate)
+    np.random.seed(seed)
+    garden_copy = copy_garden(garden_state=garden_state, rows=row, cols=col, sector_row= sector_rows, sector_col= sector_cols, prune_win_rows=prune_window_rows, prune_win_cols=prune_window_cols, step=step, prune_rate=prune_rate, water_seed=seed)
     garden_copy.set_irrigation_amount(irrigation_amount)
     plant_type_obj = garden_copy.plant_type_obj
     plant_centers = plant_type_obj.plant_centers
@@ -96,7 +98,80 @@ def wrapperPolicy(div_cov_arr, env, row, col, timestep, state, global_cc_vec, se
     return cov, div
 
 
-def copy_garden(garden_state, rows, cols, sector_row, sector_col, prune_win_rows, prune_win_cols, step, prune_rate):
+def wrapperPolicyBatched(env, row, col, timestep, sector_rows, sector_cols, prune_window_rows, prune_window_cols, step,
+           water_threshold, num_irr_actions, sector_obs_per_day, garden_state, candidates, collect=False, seed=0):
+    """ Perform baseline policy with pruning and irrigation action for several prune rates and irrigation amounts at once.
+
+    Note:
+        Same one day lookahead as wrapperPolicy, but the sectors and actions are picked once and all candidates are
+        simulated side by side in CandidateGardens. The sectors are drawn after np.random.seed(seed) and every
+        candidate draws its water from the streams of water_seed=seed, so each candidate gets the same rollout as
+        the CandidateEvaluator gives it with the same seed, and as wrapperPolicy with BATCHED_WATER and
+        OCCUPANCY_INDEX on. Without them wrapperPolicy distributes the water point by point from numpy's global
+        random state. CandidateGardens steps the gardens one after the other, so this is no faster than calling
+        wrapperPolicy per candidate.
+
+    Args
+        timestep (int): simulation time step.
+        sector_rows (int): Row size of a sector.
+        sector_cols (int): Column size of a sector.
+        prune_window_rows (int): Row size of pruning window.
+        prune_window_cols (int): Column size of pruning window.
+        step (int): Distance between adjacent points in grid.
+        water_threshold (float): Threshold when policy irrigates.
+        num_irr_actions (int): Action index of irrigation.
+        sector_obs_per_day (int): Number of sectors observed per days.
+        garden_state (GardenState): State of the garden at the start of the day.
+        candidates (list of (float, float)): Prune rate and irrigation amount to evaluate.
+        seed (int): Seed of the sectors and of the water streams of the rollouts.
+
+    Return
+        Dictionary of metric name to array with the metric of each candidate after the day.
+
+    """
+    np.random.seed(seed)
+    batch = CandidateGardens(garden_state, candidates, N=row, M=col, sector_rows=sector_rows, sector_cols=sector_cols,
+                             prune_window_rows=prune_window_rows, prune_window_cols=prune_window_cols,
+                             irr_threshold=IRR_THRESHOLD, step=step, animate=False, water_seed=seed)
+    if collect:
+        cc_vec = env.env_method('get_global_cc_vec')[0]
+    else:
+        cc_vec = env.get_global_cc_vec()
+    # All candidates start from the same state, so the sectors the policy observes are the same for all of them.
+    sectors_center, actions = plan_day(batch.gardens[0], cc_vec, row, col, timestep, sector_rows, sector_cols,
+                                       prune_window_rows, prune_window_cols, step, water_threshold, num_irr_actions,
+                                       sector_obs_per_day)
+    return batch.perform_timestep(sectors_center, actions)
+
+
+def plan_day(garden, cc_vec, row, col, timestep, sector_rows, sector_cols, prune_window_rows, prune_window_cols, step,
+             water_threshold, num_irr_actions, sector_obs_per_day):
+    """ Pick the sectors of a day and the analytic policy's action for each of them.
+
+    Args
+        garden (Garden): Garden at the start of the day.
+        cc_vec (array): Global canopy cover.
+        timestep (int): simulation time step.
+
+    Return
+        List of sector centers and list of actions.
+    """
+    plant_centers = garden.plant_type_obj.plant_centers
+    non_plant_centers = garden.plant_type_obj.non_plant_centers
+    sectors_center = []
+    actions = []
+    for j in range(sector_obs_per_day):
+        rand_sector = garden_to_sector(garden, plant_centers, non_plant_centers, row, col, step)
+        sectors_center.append(rand_sector[0])
+        action = analytic_policy.policy(timestep, rand_sector[1:], cc_vec, sector_rows, sector_cols, prune_window_rows,
+                    prune_window_cols, step, water_threshold, num_irr_actions,
+                    sector_obs_per_day, vectorized=False)[0]
+        actions.append(action)
+    return sectors_center, actions
+
+
+def copy_garden(garden_state, rows, cols, sector_row, sector_col, prune_win_rows, prune_win_cols, step, prune_rate,
+                water_seed=None):
     garden = Garden(
                garden_state=garden_state,
                 N=rows,
@@ -108,7 +183,8 @@ def copy_garden(garden_state, rows, cols, sector_row, sector_col, prune_win_rows
                 irr_threshold=IRR_THRESHOLD,
                 step=step,
                 prune_rate = prune_rate,
-                animate=False)
+                animate=False,
+                water_seed=water_seed)
     """ Copies the garden from the garden_state
     
     Args:
@@ -121,6 +197,7 @@ def copy_garden(garden_state, rows, cols, sector_row, sector_col, prune_win_rows
             prune_win_cols (int): Column size of pruning window.
             step (int): Distance between adjacent points in grid.
             prunte_rate (float): Prune rate.
+            water_seed (int): Seed of the water streams of the garden, numpy's global random state if None.
     Return:
         A garden created from the garden state.
         """
@@ -0,0 +1,130 @@
+import numpy as np
+from simulator.garden import Garden
+from simulator.water_allocation import allocate_point_water, evaporate, water_rng
+
+
+class CandidateGardens:
+    def __init__(self, garden_state, candidates, **garden_kwargs):
+        """ K copies of a garden, one per candidate prune rate and irrigation amount, stepped through the same day.
+
+        Note:
+            This is a loop over K Garden objects: the actions, light, growth and health of each garden are computed
+            by its own Garden, one garden after the other. Only the water allocation serves the grid points of all
+            gardens in a single pass. For that the grids of the gardens are stacked along a leading axis of length K
+            and every Garden works on a view of its slice. It is not faster than stepping the gardens one after the
+            other, so the wrapper policy only uses it on request, see wrapperPolicyBatched.
+
+            With a water_seed, every garden draws its water allocation and irrigation gains from its own streams, so
+            a candidate gets the same day here as in a Garden of its own with batched_water, whatever the other
+            candidates are.
+
+        Args:
+            garden_state (GardenState): State every garden is initialized from.
+            candidates (list of (float, float)): Prune rate and irrigation amount of each garden.
+            **garden_kwargs: Remaining arguments of Garden, shared by all gardens.
+        """
+        # The water of all gardens is allocated from their occupancy indexes, whatever the OCCUPANCY_INDEX default.
+        if not garden_kwargs.setdefault('occupancy_index', True):
+            raise ValueError("CandidateGardens needs the occupancy index of the gardens")
+        self.candidates = list(candidates)
+
+        #: List of Garden: one per candidate, sharing the stacked grids below.
+        self.gardens = []
+        for prune_rate, irrigation_amount in self.candidates:
+            garden = Garden(garden_state=garden_state, prune_rate=prune_rate, **garden_kwargs)
+            garden.set_irrigation_amount(irrigation_amount)
+            self.gardens.append(garden)
+
+        #: Structured array (K, N, M) of grid points of all gardens.
+        self.grid = np.stack([garden.grid for garden in self.gardens])
+        #: Grid (K, N, M, T) for plant leaf state representation of all gardens.
+        self.leaf_grid = np.stack([garden.leaf_grid for garden in self.gardens])
+        #: Grid (K, N, M, 1) for plant radius representation of all gardens.
+        self.radius_grid = np.stack([garden.radius_grid for garden in self.gardens])
+        for k, garden in enumerate(self.gardens):
+            garden.grid = self.grid[k]
+            garden.leaf_grid = self.leaf_grid[k]
+            garden.radius_grid = self.radius_grid[k]
+
+    def perform_timestep(self, sectors=[], actions=[]):
+        """ Execute the same actions in every garden then update light, water, growth and health of all gardens.
+        Note:
+            Unlike Garden.perform_timestep, nothing is written to disk, since the gardens are what-if copies.
+        Args:
+            sectors (Array of [int,int]): Locations [row, col] where to perform actions.
+            actions (List of int): Actions to perform.
+        Return:
+            Dictionary of metric name to array (K,) with the metric of each garden for this time step.
+        """
+        self.grid['last_watered'] += 1  # add one day to last watered
+        water_use = [garden.perform_timestep_actions(sectors, actions)[0] for garden in self.gardens]
+
+        for garden in self.gardens:
+            garden.distribute_light()
+        self.distribute_water()
+
+        for garden, amount in zip(self.gardens, water_use):
+            garden.grow_plants()
+            garden.performing_timestep = True
+            for sector in sectors:
+                garden.update_plant_health(sector)
+            garden.save_coverage_and_diversity()
+            garden.save_water_use(amount / len(sectors))
+            garden.actions.append(actions)
+            garden.timestep += 1
+            garden.performing_timestep = True
+        return self.get_metrics()
+
+    def distribute_water(self):
+        """ Water allocation for the grid points of all gardens in one pass.
+        Note:
+            Each garden draws its random plant order and evaporation from its own stream in the same order as
+            Garden.distribute_water_batched, so with a water_seed every garden gets the water it would get alone.
+        """
+        point_water, covered, priorities, offsets, noise = [], [], [], [], []
+        demand, lit, water_available = [], [], []
+        points = []
+        num_plants = max(garden.occupancy.num_plants for garden in self.gardens)
+        offset = 0
+        for garden in self.gardens:
+            garden.log_water_required()
+            rng = water_rng(garden.water_seed, garden.timestep)
+            coverage = garden.occupancy.coverage[:garden.occupancy.num_plants]
+            water = garden.grid['water']
+            rows, cols = np.nonzero(np.any(coverage, axis=0))
+            points.append((rows, cols))
+            point_water.append(water[rows, cols].astype(float))
+            # Pad the plant axis so the points of all gardens stack, padded plants cover nothing.
+            padding = ((0, num_plants - len(coverage)), (0, 0))
+            covered.append(np.pad(coverage[:, rows, cols], padding))
+            priorities.append(np.pad(rng.random(coverage.shape)[:, rows, cols], padding))
+            noise.append(rng.standard_normal(water.shape))
+            offsets.append(np.full(len(rows), offset))
+            garden_demand, garden_lit = garden.get_water_demand()
+            demand.append(garden_demand)
+            lit.append(garden_lit)
+            water_available.append(np.tensordot(coverage, water, axes=2))
+            offset += len(coverage)
+
+        point_water = np.concatenate(point_water)
+        absorbed, watered = allocate_point_water(point_water, np.concatenate(covered, axis=1),
+                                                 np.concatenate(priorities, axis=1), np.concatenate(demand),
+                                                 np.concatenate(lit), offsets=np.concatenate(offsets))
+
+        start = 0
+        for garden, (rows, cols), available, garden_noise in zip(self.gardens, points, water_available, noise):
+            garden.grid['water'][rows, cols] = point_water[start:start + len(rows)]
+            start += len(rows)
+            num_garden_plants = len(available)
+            garden.take_up_water(available, absorbed[:num_garden_plants], watered[:num_garden_plants])
+            absorbed, watered = absorbed[num_garden_plants:], watered[num_garden_plants:]
+            evap_rate_dict, evap_rate_std = garden.get_evaporation_rates()
+            evaporate(garden.grid['water'], garden.grid['last_watered'], evap_rate_dict, evap_rate_std, garden_noise)
+
+    def get_metrics(self):
+        """ Get the metrics of the latest time step of every garden.
+        Return:
+            Dictionary of metric name to array (K,) with the metric of each garden.
+        """
+        return {name: np.array([getattr(garden, name)[-1] for garden in self.gardens])
+                for name in ['coverage', 'diversity', 'mme1', 'mme2', 'water_use']}
@@ -0,0 +1,76 @@
+import argparse
+import os
+import tempfile
+import numpy as np
+from simulator.garden import Garden
+from simulator.plant_type import PlantType
+from simulator.plant_table import TABLE_COLUMNS
+from simulator.sim_globals import ROWS, COLS, SECTOR_ROWS, SECTOR_COLS, PRUNE_WINDOW_ROWS, PRUNE_WINDOW_COLS, STEP, \
+    IRR_THRESHOLD, NUM_IRR_ACTIONS
+
+
+def run_garden(stage_engine, seed, days, sectors_per_day):
+    """ Simulate a garden from seeds with random irrigation and pruning.
+    Args:
+        stage_engine (bool): Grow the plants with the stage engine instead of the stage objects.
+        seed (int): Seed of the plants, the water streams and the actions.
+        days (int): Amount of days simulated.
+        sectors_per_day (int): Amount of sectors acted on per day.
+    Return:
+        List with the plant table and the coverage and diversity after each day.
+    """
+    plant_type = PlantType()
+    plants = plant_type.get_plant_seeds(seed, ROWS, COLS, SECTOR_ROWS, SECTOR_COLS)
+    garden = Garden(plants=plants, N=ROWS, M=COLS, sector_rows=SECTOR_ROWS, sector_cols=SECTOR_COLS,
+                    prune_window_rows=PRUNE_WINDOW_ROWS, prune_window_cols=PRUNE_WINDOW_COLS,
+                    irr_threshold=IRR_THRESHOLD, step=STEP, plant_type=plant_type, animate=False, water_seed=seed,
+                    stage_engine=stage_engine)
+    rng = np.random.default_rng(seed)
+    results = []
+    for _ in range(days):
+        sectors = rng.integers([SECTOR_ROWS // 2, SECTOR_COLS // 2], [ROWS - SECTOR_ROWS // 2, COLS - SECTOR_COLS // 2],
+                               (sectors_per_day, 2))
+        actions = rng.integers(0, NUM_IRR_ACTIONS + 3, sectors_per_day)
+        garden.get_water_grid_full()  # perform_timestep saves the water grid of the last observation.
+        garden.perform_timestep(sectors, actions)
+        table = garden.plant_table
+        results.append(({name: getattr(table, name)[:table.num_plants].copy() for name in TABLE_COLUMNS},
+                        garden.coverage[-1], garden.diversity[-1]))
+    return results
+
+
+def compare(seed, days, sectors_per_day):
+    """ Run a garden with the stage engine against the baseline stage objects and report the first day they differ.
+    Both runs use seed for the plant seeds, the water streams (water_seed) and the random actions, so the baseline is
+    the stage object run of the same seed.
+    Args:
+        seed (int): Seed of both runs.
+        days (int): Amount of days simulated.
+        sectors_per_day (int): Amount of sectors acted on per day.
+    Return:
+        True if both runs agree on every day.
+    """
+    engine = run_garden(True, seed, days, sectors_per_day)
+    objects = run_garden(False, seed, days, sectors_per_day)
+    for day, ((engine_table, engine_cov, engine_div), (table, cov, div)) in enumerate(zip(engine, objects)):
+        columns = [name for name in TABLE_COLUMNS if not np.allclose(engine_table[name], table[name])]
+        if columns or not np.isclose(engine_cov, cov) or not np.isclose(engine_div, div):
+            print(f"seed {seed} (baseline: stage objects, seed {seed}): day {day} differs in {columns or ['coverage/diversity']}")
+            return False
+    stages = np.bincount(engine[-1][0]['stage_index'] % 5, minlength=5)
+    print(f"seed {seed} (baseline: stage objects, seed {seed}): {days} days agree, plants per stage at the end {stages.tolist()}")
+    return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check the stage engine against the stage objects of each plant')
+    parser.add_argument('-s', '--seeds', type=int, nargs='+', default=[0, 1, 2],
+                        help='Seeds of the runs, each compared against the stage objects run of the same seed.')
+    parser.add_argument('-d', '--days', type=int, default=80)
+    parser.add_argument('--sectors', type=int, default=20, help='Sectors acted on per day.')
+    args = parser.parse_args()
+
+    # Garden.perform_timestep saves the watered sectors and water grids of each day under the working directory.
+    os.chdir(tempfile.mkdtemp())
+    ok = all([compare(seed, args.days, args.sectors) for seed in args.seeds])
+    print("stage engine matches" if ok else "stage engine differs")
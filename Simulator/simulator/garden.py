@@ -1,21 +1,26 @@
 import numpy as np
 from heapq import nlargest
 from simulator.logger import Logger, Event
-from simulator.garden_state import GardenState
+from simulator.garden_state import GardenSnapshot
+from simulator.occupancy import OccupancyIndex
+from simulator.plant_table import PlantTable
+import simulator.stage_engine as stage_engine
+from simulator.water_allocation import allocate_water, evaporate, irrigate_points, irrigation_stencil, water_rng, \
+    IRRIGATION_STREAM
 #from simulator.visualization import setup_animation, setup_saving
-from simulator.sim_globals import MAX_WATER_LEVEL, IRRIGATION_AMOUNT, PERMANENT_WILTING_POINT, PRUNE_DELAY, PRUNE_THRESHOLD, NUM_IRR_ACTIONS, PRUNE_RATE, ROWS, COLS, SOIL_MOISTURE_SENSOR_ACTIVE, SOIL_DEPTH, AG_REAL
+from simulator.sim_globals import MAX_WATER_LEVEL, IRRIGATION_AMOUNT, PERMANENT_WILTING_POINT, PRUNE_DELAY, PRUNE_THRESHOLD, NUM_IRR_ACTIONS, PRUNE_RATE, ROWS, COLS, SOIL_MOISTURE_SENSOR_ACTIVE, SOIL_DEPTH, AG_REAL, OCCUPANCY_INDEX, STAGE_ENGINE, BATCHED_WATER
 from simulator.soil_moisture import augment_soil_moisture_map, determine_avg_gain, determine_evap_rate, initial_water_value, save_water_grid, save_sectors
 import os
 import pickle
 import multiprocessing as mp
-import copy
 import pickle as pkl
 
 class Garden:
     def __init__(self, plants=[], garden_state=None, N=96, M=54, sector_rows=1, sector_cols=1,
                  prune_window_rows=1, prune_window_cols=1, step=1, evaporation_rate=0.001, prune_rate=PRUNE_RATE,
                  irr_threshold=9, init_water_mean=0.2, init_water_scale=0.04, plant_type = None,
-                 skip_initial_germination=False, animate=False, save=False):
+                 skip_initial_germination=False, animate=False, save=False, occupancy_index=OCCUPANCY_INDEX,
+                 water_seed=None, stage_engine=STAGE_ENGINE, batched_water=BATCHED_WATER):
         """Model for garden.
         Args:
             plants (list of plant objects): Plants objects for Garden.
@@ -36,13 +41,28 @@ class Garden:
             skip_initial_germination (bool): Skip initial germination stage.
             animate (bool): Animate simulator run.  Deprecated!
             save (bool): Save experiment plots.  Deprecated!
+            occupancy_index (bool): Answer per grid point plant queries with the array-backed OccupancyIndex
+                instead of scanning the 'nearby' sets.
+            water_seed (int): Seed for the random draws of the batched water allocation and of the irrigation
+                gains, keyed on (water_seed, timestep) for reproducible runs. Draws from numpy's global random state
+                if None.
+            stage_engine (bool): Grow all plants at once with the array-based stage engine instead of the stage
+                objects of each plant.
+            batched_water (bool): Distribute the water of all grid points at once. Needs the occupancy index, the
+                water is distributed point by point without it.
         """
 
         #: List of dictionaries: one for each plant type, with plant ids as keys, plant objects as values.
         if not garden_state:
             self.plants = [{} for _ in range(len(plant_type.plant_names))]
         else:
-            self.plants = copy.deepcopy(garden_state.plants)
+            self.plants = garden_state.copy_field('plants')
+
+        #: Columnar store of the plant attributes indexed by plant id, the plant objects are views into it.
+        self.plant_table = PlantTable()
+        for plant_type_id, plants_of_type in enumerate(self.plants):
+            for plant in plants_of_type.values():
+                self.plant_table.adopt(plant, plant.id, plant_type_id)
 
         self.N = N
         self.M = M
@@ -57,9 +77,12 @@ class Garden:
             # TODO: Set this list to be constant
             self.plant_types = self.plant_type_obj.plant_names
         else:
-            self.plant_type_obj = copy.deepcopy(garden_state.plant_type)
+            self.plant_type_obj = garden_state.copy_field('plant_type')
             self.plant_types = self.plant_type_obj.plant_names
 
+        #: Array-backed mirror of the 'nearby' sets in grid, None to only use the sets.
+        self.occupancy = OccupancyIndex(N, M, len(self.plant_types)) if occupancy_index else None
+
         """
         Structured array of grid points. Each point contains its water levels (float)
         health (integer), and set of plants that can get water/light from that location.
@@ -71,43 +94,58 @@ class Garden:
             self.grid['health'] = self.compute_plant_health(self.grid['health'].shape)
             self.grid['last_watered'] = np.ones(self.grid['last_watered'].shape)
         else:
-            self.grid = copy.deepcopy(garden_state.grid)
+            self.grid = garden_state.copy_field('grid')
 
         #: Grid for plant growth state representation.
         if not garden_state:
             self.plant_grid = np.zeros((N, M, len(plant_type.plant_names)))
         else:
-            self.plant_grid = copy.deepcopy(garden_state.plant_grid)
+            self.plant_grid = garden_state.copy_field('plant_grid')
 
         #: Grid to hold the plant probabilities of each location, depth is 1 + ... b/c of 'earth'.
         if not garden_state:
             self.plant_prob = np.zeros((N, M, 1 + len(plant_type.plant_names)))
         else:
-            self.plant_prob = copy.deepcopy(garden_state.plant_prob)
+            self.plant_prob = garden_state.copy_field('plant_prob')
 
         #: Grid for plant leaf state representation.
         if not garden_state:
             self.leaf_grid = np.zeros((N, M, len(plant_type.plant_names)))
         else:
-            self.leaf_grid = copy.deepcopy(garden_state.leaf_grid)
+            self.leaf_grid = garden_state.copy_field('leaf_grid')
 
         #: Grid for plant radius representation.
         if not garden_state:
             self.radius_grid = np.zeros((N, M, 1))
         else:
-            self.radius_grid = copy.deepcopy(garden_state.radius_grid)
+            self.radius_grid = garden_state.copy_field('radius_grid')
 
         #: Initializes empty lists in grid.
         if not garden_state:
             for i in range(N):
                 for j in range(M):
                     self.grid[i, j]['nearby'] = set()
+        elif self.occupancy is not None and garden_state.occupancy is not None:
+            self.occupancy = garden_state.occupancy.copy()
+        elif self.occupancy is not None:
+            self.build_occupancy_index()
+        if self.occupancy is not None:
+            # plant_prob starts out without 'earth', so the first sync has to visit every grid point.
+            self.occupancy.mark_all_changed()
 
         self.step = step
 
         self.evaporation_rate = evaporation_rate
+        self.water_seed = water_seed
+        self.stage_engine = stage_engine
+        self.batched_water = batched_water and self.occupancy is not None
+        self.irrigation_rng = None  # Stream of the irrigation gains of the current day, see get_irrigation_rng.
+        self.irrigation_rng_timestep = None
         self.irr_threshold = irr_threshold
 
+        #: Relative water gain of the grid points around an irrigation point.
+        self.irrigation_stencil = irrigation_stencil()
+
         #: Amount of days to wait after simulation start before pruning.
         self.prune_delay = PRUNE_DELAY
 
@@ -127,7 +165,7 @@ class Garden:
         if not garden_state:
             self.timestep = 0
         else:
-            self.timestep = copy.deepcopy(garden_state.timestep)
+            self.timestep = garden_state.copy_field('timestep')
         self.performing_timestep = True
 
         #: Add initial plants to grid.
@@ -139,13 +177,13 @@ class Garden:
                     plant.current_stage().skip_to_end()
                 self.add_plant(plant)
         else:
-            self.plant_locations = copy.deepcopy(garden_state.plant_locations)
+            self.plant_locations = garden_state.copy_field('plant_locations')
 
         #: Growth map for circular plant growth
         if not garden_state:
             self.growth_map = self.compute_growth_map()
         else:
-            self.growth_map = copy.deepcopy(garden_state.growth_map)
+            self.growth_map = garden_state.copy_field('growth_map')
 
         #: Number of plants deep to consider assigning light to.
         self.num_plants_to_assign = 3
@@ -172,6 +210,9 @@ class Garden:
 
         self.prune_coords = dict() # Coordinates to send the FarmBot to prune.
         self.irr_coords = [] # List of coordinates to send the FarmBot to irrigate.
+        # Irrigation amount of each center irrigated by the last irrigation call. With the batched irrigation of
+        # perform_timestep_actions that is every irrigated sector of the day, with perform_timestep_irr only the last.
+        self.irrigation_points = {}
 
         # if save:
         # self.save_step, self.save_final_step, self.get_plots = setup_saving(self)
@@ -192,12 +233,51 @@ class Garden:
                 f"[Warning] A plant already exists in position ({plant.row, plant.col}). The new one was not planted.")
         else:
             plant.id = self.curr_id
+            self.plant_table.adopt(plant, plant.id, self.plant_types.index(plant.type))
             self.plants[self.plant_types.index(plant.type)][plant.id] = plant
             self.plant_locations[plant.row, plant.col] = True
             self.curr_id += 1
-            self.grid[plant.row, plant.col]['nearby'].add((self.plant_types.index(plant.type), plant.id))
+            self.add_nearby((plant.row, plant.col), (self.plant_types.index(plant.type), plant.id))
             self.plant_grid[plant.row, plant.col, self.plant_types.index(plant.type)] = 1
             self.leaf_grid[plant.row, plant.col, self.plant_types.index(plant.type)] += 1
+            if self.occupancy is not None:
+                self.occupancy.add_plant(plant.id, self.plant_types.index(plant.type), plant.height)
+                self.occupancy.add_points(plant.id, [plant.row], [plant.col])
+
+    def add_nearby(self, point, plant_key):
+        """ Add a plant to the 'nearby' set of a grid point.
+        Note:
+            The set is replaced rather than modified, as snapshots of the garden share the sets with it.
+        Args:
+            point (tuple of (int,int)): Location (row, col) of the grid point.
+            plant_key (tuple of (int,int)): Plant type id and plant id.
+        """
+        self.grid['nearby'][point] = self.grid['nearby'][point] | {plant_key}
+
+    def remove_nearby(self, point, plant_key):
+        """ Remove a plant from the 'nearby' set of a grid point, replacing the set like add_nearby.
+        Args:
+            point (tuple of (int,int)): Location (row, col) of the grid point.
+            plant_key (tuple of (int,int)): Plant type id and plant id.
+        """
+        nearby = self.grid['nearby'][point]
+        if plant_key not in nearby:
+            raise KeyError(plant_key)
+        self.grid['nearby'][point] = nearby - {plant_key}
+
+    def build_occupancy_index(self):
+        """ Populate the occupancy index from the plants and the 'nearby' sets of the grid."""
+        points = {}
+        for plant_type_id, plant_type in enumerate(self.plants):
+            for plant in plant_type.values():
+                self.occupancy.add_plant(plant.id, plant_type_id, plant.height)
+                points[plant.id] = ([], [])
+        for (i, j), nearby in np.ndenumerate(self.grid['nearby']):
+            for _, plant_id in nearby:
+                points[plant_id][0].append(i)
+                points[plant_id][1].append(j)
+        for plant_id, (rows, cols) in points.items():
+            self.occupancy.add_points(plant_id, rows, cols)
 
     def get_sector_bounds(self, center):
         """ Get bounds of sector from its center location.
@@ -267,6 +347,24 @@ class Garden:
             self.irrigation_points[center] = irrigation
             self.irr_coords.append(center)
 
+    def perform_timestep_irr_batch(self, centers, irrigation):
+        """ Irrigate at several center coordinates in one pass.
+        Note:
+            Like perform_timestep_irr, irrigation_points is reset on every call, so it holds all the centers of the
+            last call: every irrigated sector of the day when called from perform_timestep_actions, where the per
+            sector calls only kept the last one.
+        Args:
+            centers (Array of [int,int]): Locations [row, col] of sector centers.
+            irrigation (int): irrigation amounts
+        """
+        self.irrigation_points = {}
+        centers = [(center[0], center[1]) for center in centers]
+        if irrigation > 0 and centers:
+            self.irrigate_batch(centers, irrigation)
+            for center in centers:
+                self.irrigation_points[center] = irrigation
+            self.irr_coords.extend(centers)
+
     def perform_timestep_prune(self, center):
         """ Prune plants in given sector if certain amount of days have past.
         Args:
@@ -283,27 +381,8 @@ class Garden:
         Return:
             List of updated plant objects.
         """
-        water_use = 0
-
-        for point in self.enumerate_grid(): #add one day to last watered
-            point['last_watered'] += 1
-
-        self.prune_coords = dict()
-        self.irr_coords = []
-        watered_sectors = []
-        for i, action in enumerate(actions):
-            if action == NUM_IRR_ACTIONS:
-                self.perform_timestep_irr(sectors[i], self.irrigation_amount)
-                water_use += self.irrigation_amount
-                watered_sectors.append(sectors[i])
-            elif action == NUM_IRR_ACTIONS + 1:
-                self.perform_timestep_prune(sectors[i])
-            elif action == NUM_IRR_ACTIONS + 2:
-                self.perform_timestep_irr(sectors[i], self.irrigation_amount)
-                water_use += self.irrigation_amount
-                self.perform_timestep_prune(sectors[i])
-                watered_sectors.append(sectors[i])
-
+        self.grid['last_watered'] += 1  # add one day to last watered
+        water_use, watered_sectors = self.perform_timestep_actions(sectors, actions)
 
         save_sectors(watered_sectors, self.timestep) #saves watered sectors for auto irrigation
 
@@ -346,6 +425,32 @@ class Garden:
         self.performing_timestep = True
         return [plant for plant_type in self.plants for plant in plant_type.values()]
 
+    def perform_timestep_actions(self, sectors, actions):
+        """ Prune and irrigate sectors according to the actions of a time step.
+        Args:
+            sectors (Array of [int,int]): Locations [row, col] where to perform actions.
+            actions (List of int): Actions to perform.
+        Return:
+            Amount of water used and list of the irrigated sectors.
+        """
+        water_use = 0
+        self.prune_coords = dict()
+        self.irr_coords = []
+        watered_sectors = []
+        # Pruning does not depend on water levels, so all irrigation of the time step is applied in one pass.
+        for i, action in enumerate(actions):
+            if action == NUM_IRR_ACTIONS:
+                water_use += self.irrigation_amount
+                watered_sectors.append(sectors[i])
+            elif action == NUM_IRR_ACTIONS + 1:
+                self.perform_timestep_prune(sectors[i])
+            elif action == NUM_IRR_ACTIONS + 2:
+                water_use += self.irrigation_amount
+                self.perform_timestep_prune(sectors[i])
+                watered_sectors.append(sectors[i])
+        self.perform_timestep_irr_batch(watered_sectors, self.irrigation_amount)
+        return water_use, watered_sectors
+
     def reset_water(self, water_amt):
         """ Resets all water resource levels to the same amount
         Args:
@@ -359,53 +464,52 @@ class Garden:
             location (Array of [int,int]): Location [row, col] where to perform actions.
             amount (float) amount of water for location.
         """
+        self.irrigate_batch([location], amount)
+
+    def irrigate_batch(self, locations, amount):
+        """ Updates water levels in grid in response to irrigation at several locations in one pass.
+        Note:
+            Water is added with the precomputed irrigation stencil: concentric disks from radius 8 down to 4, doubling
+            the gain on every smaller disk. The gain of each location is sampled from a Gaussian, in location order.
+        Args:
+            locations (Array of [int,int]): Locations [row, col] where to perform actions.
+            amount (float) amount of water for each location.
+        """
+        #Sample the Gaussian to for gain for center points that are directly watered
+        mu, sigma = self.get_irrigation_gain(amount), 0.0054 # mean and standard deviation(from experiments in May TASE) for Gaussian
+        s = np.maximum(0, self.get_irrigation_rng().normal(mu, sigma, len(locations))) #max gain
+
+        # TODO: add distribution kernel for capillary action and spread of water jet
+        irrigate_points(self.grid['water'], self.grid['last_watered'], locations, s, self.irrigation_stencil,
+                        self.irr_threshold)
+
+    def get_irrigation_rng(self):
+        """ Get the random stream of the irrigation gains, drawn from in order by all irrigations of a day.
+        Return:
+            Stream selected by water_seed for the current time step, numpy's global random state if None.
+        """
+        if self.irrigation_rng is None or self.irrigation_rng_timestep != self.timestep:
+            self.irrigation_rng = water_rng(self.water_seed, self.timestep, IRRIGATION_STREAM)
+            self.irrigation_rng_timestep = self.timestep
+        return self.irrigation_rng
+
+    def get_irrigation_gain(self, amount):
+        """ Mean water gain of the grid points directly watered by an irrigation.
+        Args:
+            amount (float) amount of water for location.
+        Return:
+            Gain (float) of the center points.
+        """
         # window_grid_size = (self.irr_threshold + self.irr_threshold + 1) * (
         #             self.irr_threshold + self.irr_threshold + 1) / 10000  # in square meters
         window_grid_size = np.pi * ((self.irr_threshold)**2) / 10000  # in square meters
-        gain = 1/32
 
         if any(SOIL_MOISTURE_SENSOR_ACTIVE):
             if self.timestep == 0:
-                center_points_gain = 0.046 #from experiments in May TASE
-            else:
-                center_points_gain = determine_avg_gain(self.timestep+1) #determines the gain
-        else:
-            k = 1.175 #scaling factor to account for water loss from drainage and etc., determined experimentally
-            center_points_gain = (amount / (window_grid_size * SOIL_DEPTH)) * k #.2 m of soil depth
-
-        #Sample the Gaussian to for gain for center points that are directly watered
-        mu, sigma = center_points_gain, 0.0054 # mean and standard deviation(from experiments in May TASE) for Gaussian
-        s = max(0, np.random.normal(mu, sigma, 1)) #max gain
-
-        # Start from outer radius
-        for radius in range(4,9)[::-1]:
-            # For each bounding box, check if the cubes are within the radius 
-            #       + add water from outer to center
-            lower_x = max(0, location[0] - radius)
-            upper_x = min(self.grid.shape[0], location[0] + radius + 1)
-            lower_y = max(0, location[1] - radius)
-            upper_y = min(self.grid.shape[1], location[1] + radius + 1)
-            for y in range(lower_y, upper_y):
-                for x in range(lower_x, upper_x):
-                    pt = [x, y]
-                    if np.sqrt((location[0] - pt[0])**2 + (location[1] - pt[1])**2) <= radius:
-                        self.grid[x, y]['water'] += gain * s
-                        self.grid[x, y]['last_watered'] = 0 
-            gain *= 2
-
-        # TODO: add distribution kernel for capillary action and spread of water jet
-        # 0.001m^3/(0.11m * 0.11m * 0.35m) ~ 0,236 %
-        # self.grid[lower_x:upper_x, lower_y:upper_y]['water'] += amount / (
-        #             window_grid_size * 0.35)  # 0.0121m^2 * 0.35m depth
-        lower_x = max(0, location[0] - self.irr_threshold)
-        upper_x = min(self.grid.shape[0], location[0] + self.irr_threshold + 1)
-        lower_y = max(0, location[1] - self.irr_threshold)
-        upper_y = min(self.grid.shape[1], location[1] + self.irr_threshold + 1)
-        
-        np.minimum(
-            self.grid[lower_x:upper_x, lower_y:upper_y]['water'],
-            MAX_WATER_LEVEL,
-            out=self.grid[lower_x:upper_x, lower_y:upper_y]['water'])
+                return 0.046 #from experiments in May TASE
+            return determine_avg_gain(self.timestep+1) #determines the gain
+        k = 1.175 #scaling factor to account for water loss from drainage and etc., determined experimentally
+        return (amount / (window_grid_size * SOIL_DEPTH)) * k #.2 m of soil depth
 
     def get_water_amounts(self, step=5):
         """ Get accumulated water amount for certain window sizes in grid.
@@ -447,12 +551,36 @@ class Garden:
                 for j in range(len(self.grid[i])):
                     yield (self.grid[i, j], (i, j)) if coords else self.grid[i, j]
 
+    def grid_window(self, x_low=None, y_low=None, x_high=None, y_high=None):
+        """ Slices of the grid points enumerate_grid visits for the given boundary.
+        Args:
+            x_low (int): Horizontal low coordinate.
+            y_low (int): Vertical low coordinate.
+            x_high (int): Horizontal high coordinate.
+            y_high (int): Vertical high coordinate.
+        Return:
+            Tuple of slices for the window, for the entire grid if a boundary point is missing or zero.
+        """
+        if x_low and y_low and x_high and y_high:
+            return np.s_[x_low:x_high + 1, y_low:y_high + 1]
+        return np.s_[:, :]
+
     def distribute_light(self):
         """ Light allocation.
         Note:
             For each plant, the number of grid points visible overhead determines the amount of light it receives,
             while occluded points receive light in an exponentially decaying fashion.
         """
+        if self.occupancy is not None:
+            sunlight = np.zeros(self.occupancy.num_plants)
+            for i, layer in enumerate(self.occupancy.layers(self.num_plants_to_assign)):
+                sunlight += np.bincount(layer[layer >= 0], minlength=len(sunlight)) * (self.light_decay ** i) * (self.step ** 2)
+            num_plants = len(sunlight)
+            table = self.plant_table
+            table.amount_sunlight[:num_plants] += sunlight
+            if np.any(table.amount_sunlight[:num_plants] > table.num_grid_points[:num_plants]):
+                raise Exception("Plant received more sunlight points than total grid points!")
+            return
         for point in self.enumerate_grid():
             if point['nearby']:
                 for i, (plant_type_id, plant_id) in enumerate(nlargest(self.num_plants_to_assign, point['nearby'],
@@ -464,10 +592,10 @@ class Garden:
         Note:
             The plant uses water from its neighboring grid points to fulfill its growth potential.
         """
-        # Log desired water levels of each plant before distributing
-        for plant_type in self.plants:
-            for plant in plant_type.values():
-                self.logger.log(Event.WATER_REQUIRED, plant.id, plant.desired_water_amt())
+        self.log_water_required()
+        if self.batched_water:
+            self.distribute_water_batched()
+            return
         test_plant = None
         for point in self.enumerate_grid():
             if point['nearby']:
@@ -516,13 +644,105 @@ class Garden:
 
             point['water'] = max(0, point['water'] - s)
 
+    def distribute_water_batched(self):
+        """ Water allocation for all grid points at once, using the occupancy index.
+        Note:
+            Same model as distribute_water, but the random plant order per grid point and the evaporation are drawn
+            for the whole grid in one call each, from the stream selected by water_seed.
+        """
+        rng = water_rng(self.water_seed, self.timestep)
+        coverage = self.occupancy.coverage[:self.occupancy.num_plants]
+        demand, lit = self.get_water_demand()
+        water = self.grid['water']
+        water_available = np.tensordot(coverage, water, axes=2)
+        absorbed, watered = allocate_water(water, coverage, demand, lit, rng.random(coverage.shape))
+        self.take_up_water(water_available, absorbed, watered)
+
+        evap_rate_dict, evap_rate_std = self.get_evaporation_rates()
+        evaporate(water, self.grid['last_watered'], evap_rate_dict, evap_rate_std, rng.standard_normal(water.shape))
+
+    def log_water_required(self):
+        """ Log desired water levels of each plant before distributing."""
+        for plant_type in self.plants:
+            for plant in plant_type.values():
+                self.logger.log(Event.WATER_REQUIRED, plant.id, plant.desired_water_amt())
+
+    def get_water_demand(self):
+        """ Get the water each plant wants from the grid points it covers, indexed by plant id.
+        Return:
+            Array of water demand per grid point and boolean array of plants that received light.
+        """
+        demand = np.zeros(self.occupancy.num_plants)
+        lit = np.zeros(self.occupancy.num_plants, dtype=bool)
+        for plant_type in self.plants:
+            for plant in plant_type.values():
+                demand[plant.id] = plant.desired_water_amt() / plant.num_grid_points
+                lit[plant.id] = plant.amount_sunlight > 0
+        return demand, lit
+
+    def take_up_water(self, water_available, absorbed, watered):
+        """ Credit the result of the water allocation to the plants.
+        Args:
+            water_available (array of float): Water of the grid points covered by each plant, indexed by plant id.
+            absorbed (array of float): Water absorbed by each plant, indexed by plant id.
+            watered (array of bool): Plants that got to absorb water, indexed by plant id.
+        """
+        num_plants = len(water_available)
+        table = self.plant_table
+        table.water_available[:num_plants] += water_available
+        table.water_amt[:num_plants] += absorbed
+        table.watered_day[:num_plants][watered] = self.timestep
+
+    def get_evaporation_rates(self):
+        """ Get the evaporation rates per grid point by days since the point was watered.
+        Return:
+            Dictionaries of mean and standard deviation of the evaporation rate keyed by days since watered.
+        """
+        evap_rate_std = {0:0.0048, 1:0.0001}
+        if any(SOIL_MOISTURE_SENSOR_ACTIVE) and self.timestep > 0:
+            return determine_evap_rate(self.timestep+1), evap_rate_std
+        return {0:0.042, 1:0.01}, evap_rate_std
+
     def grow_plants(self):
         """ Compute growth for each plant and update plant coverage."""
+        if self.stage_engine:
+            self.grow_plants_batched()
+            return
         for plant_type in self.plants:
             for plant in plant_type.values():
                 self.grow_plant(plant)
                 self.update_plant_coverage(plant)
 
+    def grow_plants_batched(self):
+        """ Compute growth for all plants at once with the stage engine, then update plant coverage.
+        Note:
+            Same as grow_plant for each plant, on the columns of the plant table.
+        """
+        plants = [plant for plant_type in self.plants for plant in plant_type.values()]
+        if not plants:
+            return
+        slots = np.array([plant.id for plant in plants])
+        table = self.plant_table
+        upward, outward, new_color = stage_engine.amount_to_grow(table, slots)
+
+        table.height[slots] += upward
+        if self.occupancy is not None:
+            for plant_id in slots[upward != 0]:
+                self.occupancy.set_height(plant_id, table.height[plant_id])
+        grown = slots[outward != 0]
+        table.radius[grown] = np.minimum(table.radius[grown] + outward[outward != 0], table.max_radius[grown])
+        self.radius_grid[table.row[slots], table.col[slots], 0] = table.radius[slots]
+
+        for plant_id, water_amt, radius, height in zip(slots.tolist(), table.water_amt[slots].tolist(),
+                                                       table.radius[slots].tolist(), table.height[slots].tolist()):
+            self.logger.log(Event.WATER_ABSORBED, plant_id, water_amt)
+            self.logger.log(Event.RADIUS_UPDATED, plant_id, radius)
+            self.logger.log(Event.HEIGHT_UPDATED, plant_id, height)
+
+        stage_engine.reset(table, slots, new_color)
+        for plant in plants:
+            self.update_plant_coverage(plant)
+
     def grow_plant(self, plant):
         """ Compute plants growth vertically and horizontally and update size.
         Note:
@@ -552,6 +772,10 @@ class Garden:
             center (Array of [int,int]): Location [row, col] of sector center.
         """
         x_low, y_low, x_high, y_high = self.get_sector_bounds_no_pad(center)
+        if self.occupancy is not None:
+            window = self.grid_window(x_low, y_low, x_high, y_high)
+            self.grid['health'][window] = self.get_tallest_plant_health()[self.occupancy.tallest()[window]]
+            return
         for point in self.enumerate_grid(coords=True, x_low=x_low, y_low=y_low, x_high=x_high, y_high=y_high):
             if point[0]['nearby']:
                 # Compares plants at spatial coordinate and retrieves plant type id and plant id tuple of tallest one.
@@ -584,6 +808,8 @@ class Garden:
         """
         if upward:
             plant.height += upward
+            if self.occupancy is not None:
+                self.occupancy.set_height(plant.id, plant.height)
         if outward:
             plant.radius = min(plant.radius + outward, plant.max_radius)
         self.radius_grid[plant.row, plant.col, 0] = plant.radius
@@ -600,17 +826,20 @@ class Garden:
         next_growth_index_plus_1 = np.searchsorted(distances, plant.radius, side='right')
         coords_updated = []
         directions = []
+        rows, cols = [], []
+        plant_row, plant_col = plant.row, plant.col
         # Add grid point to “nearby” if it's within plants radius.
         if next_growth_index_plus_1 > plant.growth_index:
             for i in range(plant.growth_index + 1, next_growth_index_plus_1):
                 points = self.growth_map[i][1]
                 for p in points:
-                    point = p[0] + plant.row, p[1] + plant.col
+                    point = p[0] + plant_row, p[1] + plant_col
                     if 0 <= point[0] < self.grid.shape[0] and 0 <= point[1] < self.grid.shape[1]:
                         if record_coords_updated:
                             coords_updated.append(point)
-                        plant.num_grid_points += 1
-                        self.grid[point]['nearby'].add((self.plant_types.index(plant.type), plant.id))
+                        self.add_nearby(point, (self.plant_types.index(plant.type), plant.id))
+                        rows.append(point[0])
+                        cols.append(point[1])
 
                         self.leaf_grid[point[0], point[1], self.plant_types.index(plant.type)] += 1
         # Remove grid point from “nearby” when it's not within plants radius anymore.
@@ -618,22 +847,32 @@ class Garden:
             for i in range(next_growth_index_plus_1, plant.growth_index + 1):
                 points = self.growth_map[i][1]
                 for p in points:
-                    point = p[0] + plant.row, p[1] + plant.col
+                    point = p[0] + plant_row, p[1] + plant_col
                     if 0 <= point[0] < self.grid.shape[0] and 0 <= point[1] < self.grid.shape[1]:
                         if record_coords_updated:
                             coords_updated.append(point)
                             dir_tup = [False, False]
                             # If the point is completely vertical w.r.t a plant, we want to prune on both axes.
-                            if point[0] != plant.row:
+                            if point[0] != plant_row:
                                 dir_tup[0] = True
-                            if point[1] != plant.col:
+                            if point[1] != plant_col:
                                 dir_tup[1] = True
                             directions.append(tuple(dir_tup))
-                        plant.num_grid_points -= 1
-                        self.grid[point]['nearby'].remove((self.plant_types.index(plant.type), plant.id))
+                        self.remove_nearby(point, (self.plant_types.index(plant.type), plant.id))
+                        rows.append(point[0])
+                        cols.append(point[1])
                         self.leaf_grid[point[0], point[1], self.plant_types.index(plant.type)] -= 1
                         if self.leaf_grid[point[0], point[1], self.plant_types.index(plant.type)] < 0:
                             raise Exception("Cannot have negative leaf cover")
+        if next_growth_index_plus_1 > plant.growth_index:
+            plant.num_grid_points += len(rows)
+        else:
+            plant.num_grid_points -= len(rows)
+        if self.occupancy is not None and rows:
+            if next_growth_index_plus_1 > plant.growth_index:
+                self.occupancy.add_points(plant.id, rows, cols)
+            else:
+                self.occupancy.remove_points(plant.id, rows, cols)
         plant.growth_index = next_growth_index_plus_1 - 1
         return coords_updated, directions
 
@@ -644,7 +883,12 @@ class Garden:
 
         for i in range(len(self.plant_types)):
             while prob[i] > self.prune_threshold / len(self.plant_types):
-                coords_updated = self.prune_plant_type(None, i)
+                coords_updated, _ = self.prune_plant_type(None, i)
+                if self.occupancy is not None:
+                    # The occupancy index already recounted the grid points the pruning uncovered.
+                    cc_per_plant_type = self.occupancy.cc_per_type.astype(float)
+                    prob = cc_per_plant_type / np.sum(cc_per_plant_type)
+                    continue
                 for coord in coords_updated:
                     point = self.grid[coord]
                     if point['nearby']:
@@ -658,7 +902,14 @@ class Garden:
         Return
             Array of with number of grid points of highest canopy coverage per plant type.
         """
-        if self.performing_timestep:
+        if self.performing_timestep and self.occupancy is not None:
+            # The index keeps the counts current, plant_prob only needs the points whose tallest plant changed.
+            rows, cols = self.occupancy.pop_changed_points()
+            self.plant_prob[rows, cols] = 0
+            # Depth 0 is 'earth', so uncovered points (type -1) land there.
+            self.plant_prob[rows, cols, self.occupancy.tallest_types(rows, cols) + 1] = 1
+            self.cc_per_plant_type = self.occupancy.cc_per_type.astype(float)
+        elif self.performing_timestep:
             self.cc_per_plant_type = np.zeros(len(self.plant_types))
             self.plant_prob = np.zeros((self.N, self.M, 1 + len(self.plant_types)))
             for point in self.enumerate_grid(coords=True):
@@ -678,6 +929,8 @@ class Garden:
         Return:
             Grid shaped array (M,N) with health state of plants.
         """
+        if self.occupancy is not None:
+            return self.get_tallest_plant_health()[self.occupancy.tallest()]
         plant_health_grid = np.zeros(grid_shape)
         for point in self.enumerate_grid(coords=True):
             coord = point[1]
@@ -708,6 +961,48 @@ class Garden:
 
         return plant_health_grid
 
+    def get_tallest_plant_health(self):
+        """ Compute the health state each plant gives a grid point it is the tallest plant of.
+        Return:
+            Array indexed by plant id with health states, the last entry is 0 for points without plants.
+        """
+        health = np.zeros(self.occupancy.num_plants + 1)
+        for plant_type in self.plants:
+            for plant in plant_type.values():
+                stage = plant.stages[plant.stage_index]
+                if plant.stage_index == 0:  # germinating
+                    health[plant.id] = 2
+                elif plant.stage_index in [1, 2]:  # growing, waiting
+                    if stage.overwatered:
+                        health[plant.id] = 3  # overwatered
+                    elif stage.underwatered:
+                        health[plant.id] = 1  # underwatered
+                    else:
+                        health[plant.id] = 2  # normal
+        return health
+
+    def get_non_occluded_plants(self, center):
+        """ Get the plants that are the tallest plant of at least one grid point in the prune window.
+        Args:
+            center (Array of [int,int]): Location [row, col] of sector center
+        Return:
+            Set of plant objects.
+        """
+        x_low, y_low, x_high, y_high = self.get_prune_bounds(center)
+        non_occluded_plants = set()
+        if self.occupancy is not None:
+            tallest = self.occupancy.tallest()[self.grid_window(x_low, y_low, x_high, y_high)]
+            for plant_id in np.unique(tallest[tallest >= 0]):
+                non_occluded_plants.add(self.plants[self.occupancy.type_ids[plant_id]][plant_id])
+            return non_occluded_plants
+        for point in self.enumerate_grid(x_low=x_low, y_low=y_low, x_high=x_high, y_high=y_high):
+            if point['nearby']:
+                tallest = max(point['nearby'], key=lambda x: self.plants[x[0]][x[1]].height)
+                tallest_type = tallest[0]
+                tallest_plant_id = tallest[1]
+                non_occluded_plants.add(self.plants[tallest_type][tallest_plant_id])
+        return non_occluded_plants
+
     def prune_plant_type(self, center, plant_type_id):
         """ Prune plant by type in sector or garden which is largest, update plant size and coverage.
         Args
@@ -738,14 +1033,7 @@ class Garden:
             Float, radius of plant.
         """
         greatest_radius = 0
-        x_low, y_low, x_high, y_high = self.get_prune_bounds(center)
-        non_occluded_plants = set()
-        for point in self.enumerate_grid(x_low=x_low, y_low=y_low, x_high=x_high, y_high=y_high):
-            if point['nearby']:
-                tallest = max(point['nearby'], key=lambda x: self.plants[x[0]][x[1]].height)
-                tallest_type = tallest[0]
-                tallest_plant_id = tallest[1]
-                non_occluded_plants.add(self.plants[tallest_type][tallest_plant_id])
+        non_occluded_plants = self.get_non_occluded_plants(center)
         for plant in non_occluded_plants:
             if plant.radius > greatest_radius:
                 greatest_radius = plant.radius
@@ -757,14 +1045,7 @@ class Garden:
         Args:
             center (Array of [int,int]): Location [row, col] of sector center
         """
-        x_low, y_low, x_high, y_high = self.get_prune_bounds(center)
-        non_occluded_plants = set()
-        for point in self.enumerate_grid(x_low=x_low, y_low=y_low, x_high=x_high, y_high=y_high):
-            if point['nearby']:
-                tallest = max(point['nearby'], key=lambda x: self.plants[x[0]][x[1]].height)
-                tallest_type = tallest[0]
-                tallest_plant_id = tallest[1]
-                non_occluded_plants.add(self.plants[tallest_type][tallest_plant_id])
+        non_occluded_plants = self.get_non_occluded_plants(center)
         for plant in non_occluded_plants:
             # For auto pruning
             if AG_REAL:
@@ -995,11 +1276,9 @@ class Garden:
        """ Returns a copy of all simulator arrays needed to restart the simulation for the current moment.
        
        Return
-           Stacked array of deep copies of plants, water, health, plant probabilities, leaf and plant types.
+           Copy-on-write snapshot of plants, water, health, plant probabilities, leaf and plant types.
        """
-       return GardenState(self.plants, self.grid, self.plant_grid, self.plant_prob, self.leaf_grid,
-                          self.plant_type_obj, self.plant_locations, self.growth_map,
-                          self.radius_grid, self.timestep)
+       return GardenSnapshot(self)
 
     def show_animation(self):
         """ Helper function for animation."""
@@ -1,4 +1,5 @@
 import copy
+import numpy as np
 
 class GardenState:
     """State of a garden.
@@ -25,4 +26,118 @@ class GardenState:
         self.growth_map = copy.deepcopy(growth_map)
         self.radius_grid = copy.deepcopy(radius_grid)
         self.timestep = copy.deepcopy(timestep) 
-        self.existing_data = copy.deepcopy(existing_data)
\ No newline at end of file
+        self.existing_data = copy.deepcopy(existing_data)
+        self.occupancy = None  #: OccupancyIndex of the garden, rebuilt from the 'nearby' sets if None.
+
+    def copy_field(self, name):
+        """ Get a private copy of a state field for a garden initialized from this state.
+        Args:
+            name (str): Name of the field.
+        Return:
+            Deep copy of the field.
+        """
+        return copy.deepcopy(getattr(self, name))
+
+
+class GardenSnapshot(GardenState):
+    def __init__(self, garden):
+        """Copy-on-write snapshot of a running garden.
+
+        Note:
+            Captures the grids and the plant table as flat NumPy copies, and the remaining plant and stage attributes
+            as records, instead of deep copying the object graph. The 'nearby' sets in grid are shared with the garden, which is safe since
+            the garden replaces a set instead of mutating it, and the growth map is shared as it never changes.
+
+        Args:
+            garden (Garden): Garden to capture.
+        """
+        self.plants = snapshot_plants(garden.plants)
+        self.plant_table = garden.plant_table.copy()
+        self.grid = garden.grid.copy()
+        self.plant_grid = garden.plant_grid.copy()
+        self.plant_prob = garden.plant_prob.copy()
+        self.leaf_grid = garden.leaf_grid.copy()
+        self.plant_type = copy_plant_type(garden.plant_type_obj)
+        self.plant_locations = dict(garden.plant_locations)
+        self.growth_map = garden.growth_map
+        self.radius_grid = garden.radius_grid.copy()
+        self.timestep = garden.timestep
+        self.existing_data = False
+        self.occupancy = None if garden.occupancy is None else garden.occupancy.copy()
+
+    def copy_field(self, name):
+        """ Get a private copy of a state field for a garden initialized from this snapshot.
+        Args:
+            name (str): Name of the field.
+        Return:
+            Copy of the field which the garden can modify without changing the snapshot.
+        """
+        value = getattr(self, name)
+        if name == 'plants':
+            return restore_plants(value, self.plant_table.copy())
+        elif name == 'plant_type':
+            return copy_plant_type(value)
+        elif name == 'plant_locations':
+            return dict(value)
+        elif isinstance(value, np.ndarray):
+            return value.copy()
+        return value
+
+
+def copy_plant_type(plant_type):
+    """ Copy a PlantType, sharing the read-only model parameters.
+    Args:
+        plant_type (PlantType): PlantType object to copy.
+    Return:
+        PlantType object with its own lists of plant and non plant centers.
+    """
+    plant_type = copy.copy(plant_type)
+    plant_type.plant_centers = list(plant_type.plant_centers)
+    plant_type.non_plant_centers = list(plant_type.non_plant_centers)
+    return plant_type
+
+
+def snapshot_plants(plants):
+    """ Capture the attributes of plants which are not kept in their plant table.
+    Args:
+        plants (list of dictionaries): one for each plant type, with plant ids as keys, plant objects as values.
+    Return:
+        List of dictionaries: one for each plant type, with plant ids as keys and (class, attributes, stages) records
+        as values, where stages lists the (class, attributes) record of each plant stage.
+    """
+    table = []
+    for plant_type in plants:
+        records = {}
+        for plant_id, plant in plant_type.items():
+            attributes = {key: value for key, value in vars(plant).items() if key not in ('stages', 'table')}
+            stages = [(type(stage), {key: value for key, value in vars(stage).items() if key != 'plant'})
+                      for stage in plant.stages]
+            records[plant_id] = (type(plant), attributes, stages)
+        table.append(records)
+    return table
+
+
+def restore_plants(table, plant_table):
+    """ Create plant objects from their records.
+    Args:
+        table (list of dictionaries): Plant records from snapshot_plants.
+        plant_table (PlantTable): Plant table the plant objects become views of.
+    Return:
+        List of dictionaries: one for each plant type, with plant ids as keys, plant objects as values.
+    """
+    plants = []
+    for records in table:
+        plant_type = {}
+        for plant_id, (plant_class, attributes, stages) in records.items():
+            plant = plant_class.__new__(plant_class)
+            plant.__dict__.update(attributes)
+            plant.table = plant_table
+            plant.stages = []
+            for stage_class, stage_attributes in stages:
+                stage = stage_class.__new__(stage_class)
+                stage.__dict__.update(stage_attributes)
+                stage.plant = plant
+                plant.stages.append(stage)
+            plant_type[plant_id] = plant
+        plants.append(plant_type)
+    return plants
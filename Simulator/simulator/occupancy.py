@@ -0,0 +1,240 @@
+import copy
+import numpy as np
+
+
+class OccupancyIndex:
+    def __init__(self, N, M, num_types, capacity=16):
+        """ Array-backed index of the plants covering each grid point.
+
+        Note:
+            Mirrors the 'nearby' sets of the garden grid with one boolean coverage mask per plant id, so per grid
+            point queries such as "tallest plant" or "k tallest plants" are NumPy reductions over the plant axis
+            instead of Python loops over sets. Ties in height are broken in favor of the lower plant id.
+
+            The tallest plant of each grid point and the canopy cover per plant type are kept up to date
+            incrementally: every coverage or height update only revisits the grid points whose plant membership
+            or ordering it changes.
+
+        Args:
+            N (int): Amount rows for the grid modeling the garden.
+            M (int): Amount columns for the grid modeling the garden.
+            num_types (int): Amount of plant types.
+            capacity (int): Initial amount of plant slots, grown on demand.
+        """
+        self.N = N
+        self.M = M
+        self.num_plants = 0  #: int: Amount of plant slots in use (largest plant id + 1).
+        self.coverage = np.zeros((capacity, N, M), dtype=bool)  #: Coverage mask of the grid per plant id.
+        self.type_ids = np.full(capacity, -1, dtype=int)  #: Plant type id per plant id, -1 for unused slots.
+        self.heights = np.zeros(capacity)  #: Plant height per plant id.
+        #: Number of grid points per plant type in which the plant type is the tallest plant.
+        self.cc_per_type = np.zeros(num_types, dtype=int)
+        self._tallest = np.full((N, M), -1, dtype=int)  # Tallest plant id per grid point, -1 without plants.
+        self._changed = []  # Flat indices of grid points whose tallest plant changed since last pop_changed_points.
+        self._layers = None  # Cached (k, N, M) plant ids sorted by height, -1 where less than k plants cover a point.
+        self._stale = np.zeros((N, M), dtype=bool)  # Grid points whose cached layers are out of date.
+
+    def copy(self):
+        """ Get an independent copy of the index.
+        Return:
+            OccupancyIndex with copies of the coverage and plant arrays.
+        """
+        index = copy.copy(self)
+        index.coverage = self.coverage.copy()
+        index.type_ids = self.type_ids.copy()
+        index.heights = self.heights.copy()
+        index.cc_per_type = self.cc_per_type.copy()
+        index._tallest = self._tallest.copy()
+        index._changed = list(self._changed)
+        if self._layers is not None:
+            index._layers = self._layers.copy()
+        index._stale = self._stale.copy()
+        return index
+
+    def _reserve(self, plant_id):
+        """ Grow the plant slot arrays so that plant_id fits.
+        Args:
+            plant_id (int): Id of plant.
+        """
+        capacity = len(self.type_ids)
+        if plant_id < capacity:
+            return
+        new_capacity = max(2 * capacity, plant_id + 1)
+        coverage = np.zeros((new_capacity, self.N, self.M), dtype=bool)
+        coverage[:capacity] = self.coverage
+        self.coverage = coverage
+        self.type_ids = np.concatenate((self.type_ids, np.full(new_capacity - capacity, -1, dtype=int)))
+        self.heights = np.concatenate((self.heights, np.zeros(new_capacity - capacity)))
+
+    def _beats(self, plant_id, other_ids):
+        """ Check whether a plant is ranked above other plants.
+        Args:
+            plant_id (int): Id of plant.
+            other_ids (array of int): Ids of other plants, -1 for none.
+        Return:
+            Boolean array, True where plant_id is taller, or as tall and with a lower id.
+        """
+        height = self.heights[plant_id]
+        other_heights = self.heights[other_ids]
+        return (other_ids < 0) | (height > other_heights) | ((height == other_heights) & (plant_id < other_ids))
+
+    def _rank_tallest(self, rows, cols):
+        """ Find the tallest plant of grid points from scratch.
+        Args:
+            rows (array of int): Row coordinates of grid points.
+            cols (array of int): Column coordinates of grid points.
+        Return:
+            Array of plant ids, -1 where no plant covers a point.
+        """
+        heights = np.where(self.coverage[:self.num_plants, rows, cols], self.heights[:self.num_plants, None], -np.inf)
+        if not len(heights):
+            return np.full(len(rows), -1, dtype=int)
+        ids = np.argmax(heights, axis=0)
+        return np.where(heights[ids, np.arange(len(ids))] > -np.inf, ids, -1)
+
+    def _set_tallest(self, rows, cols, tallest):
+        """ Store the tallest plant of grid points and update the canopy cover per plant type.
+        Args:
+            rows (array of int): Row coordinates of grid points.
+            cols (array of int): Column coordinates of grid points.
+            tallest (array of int): New tallest plant ids, -1 for none.
+        """
+        previous = self._tallest[rows, cols]
+        changed = previous != tallest
+        if not np.any(changed):
+            return
+        rows, cols, previous, tallest = rows[changed], cols[changed], previous[changed], tallest[changed]
+        num_types = len(self.cc_per_type)
+        self.cc_per_type -= np.bincount(self.type_ids[previous[previous >= 0]], minlength=num_types)
+        self.cc_per_type += np.bincount(self.type_ids[tallest[tallest >= 0]], minlength=num_types)
+        self._tallest[rows, cols] = tallest
+        self._changed.append(rows * self.M + cols)
+
+    def add_plant(self, plant_id, plant_type_id, height=0):
+        """ Register a plant without any coverage.
+        Args:
+            plant_id (int): Id of plant.
+            plant_type_id (int): Id of plant type.
+            height (float): Current height of plant.
+        """
+        self._reserve(plant_id)
+        self.type_ids[plant_id] = plant_type_id
+        self.heights[plant_id] = height
+        self.num_plants = max(self.num_plants, plant_id + 1)
+
+    def add_points(self, plant_id, rows, cols):
+        """ Mark grid points as covered by a plant.
+        Args:
+            plant_id (int): Id of plant.
+            rows (array of int): Row coordinates of grid points.
+            cols (array of int): Column coordinates of grid points.
+        """
+        rows, cols = np.asarray(rows, dtype=int), np.asarray(cols, dtype=int)
+        self.coverage[plant_id, rows, cols] = True
+        beats = self._beats(plant_id, self._tallest[rows, cols])
+        self._set_tallest(rows[beats], cols[beats], np.full(np.count_nonzero(beats), plant_id))
+        self._stale[rows, cols] = True
+
+    def remove_points(self, plant_id, rows, cols):
+        """ Mark grid points as no longer covered by a plant.
+        Args:
+            plant_id (int): Id of plant.
+            rows (array of int): Row coordinates of grid points.
+            cols (array of int): Column coordinates of grid points.
+        """
+        rows, cols = np.asarray(rows, dtype=int), np.asarray(cols, dtype=int)
+        self.coverage[plant_id, rows, cols] = False
+        self._stale[rows, cols] = True
+        was_tallest = self._tallest[rows, cols] == plant_id
+        rows, cols = rows[was_tallest], cols[was_tallest]
+        self._set_tallest(rows, cols, self._rank_tallest(rows, cols))
+
+    def set_height(self, plant_id, height):
+        """ Update height of a plant, which may change the plant ordering of the points it covers.
+        Args:
+            plant_id (int): Id of plant.
+            height (float): New height of plant.
+        """
+        previous = self.heights[plant_id]
+        if previous == height:
+            return
+        self.heights[plant_id] = height
+        self._stale |= self.coverage[plant_id]
+        if height > previous:
+            rows, cols = np.nonzero(self.coverage[plant_id])
+            beats = self._beats(plant_id, self._tallest[rows, cols])
+            self._set_tallest(rows[beats], cols[beats], np.full(np.count_nonzero(beats), plant_id))
+        else:
+            rows, cols = np.nonzero(self._tallest == plant_id)
+            self._set_tallest(rows, cols, self._rank_tallest(rows, cols))
+
+    def pop_changed_points(self):
+        """ Get the grid points whose tallest plant changed since the last call.
+        Return:
+            Row and column coordinate arrays of the grid points.
+        """
+        if not self._changed:
+            return np.array([], dtype=int), np.array([], dtype=int)
+        points = np.unique(np.concatenate(self._changed))
+        self._changed = []
+        return points // self.M, points % self.M
+
+    def mark_all_changed(self):
+        """ Flag every grid point as changed, e.g. when the consumer of pop_changed_points starts from scratch."""
+        self._changed = [np.arange(self.N * self.M)]
+
+    def layers(self, k):
+        """ Get the k tallest plants covering each grid point.
+        Note:
+            The layers are cached and only the grid points whose coverage or plant heights changed since the last
+            call are ranked again, in place.
+        Args:
+            k (int): Amount of plant layers.
+        Return:
+            Array (k, N, M) of plant ids sorted from tallest to shortest, -1 where less plants cover a point.
+        """
+        if self._layers is None or len(self._layers) < k:
+            self._layers = np.empty((k, self.N, self.M), dtype=int)
+            self._stale[:] = True
+        rows, cols = np.nonzero(self._stale)
+        if len(rows):
+            self._layers[:, rows, cols] = self._rank_layers(rows, cols, len(self._layers))
+            self._stale[rows, cols] = False
+        return self._layers[:k]
+
+    def _rank_layers(self, rows, cols, k):
+        """ Find the k tallest plants of grid points from scratch.
+        Args:
+            rows (array of int): Row coordinates of grid points.
+            cols (array of int): Column coordinates of grid points.
+            k (int): Amount of plant layers.
+        Return:
+            Array (k, len(rows)) of plant ids sorted from tallest to shortest, -1 where less plants cover a point.
+        """
+        layers = np.full((k, len(rows)), -1, dtype=int)
+        masked = np.where(self.coverage[:self.num_plants, rows, cols], self.heights[:self.num_plants, None], -np.inf)
+        points = np.arange(len(rows))
+        for i in range(min(k, self.num_plants)):
+            ids = np.argmax(masked, axis=0)
+            present = masked[ids, points] > -np.inf
+            layers[i][present] = ids[present]
+            masked[ids, points] = -np.inf
+        return layers
+
+    def tallest(self):
+        """ Get the tallest plant covering each grid point.
+        Return:
+            Array (N, M) of plant ids, -1 where no plant covers a point.
+        """
+        return self._tallest
+
+    def tallest_types(self, rows=None, cols=None):
+        """ Get the plant type of the tallest plant covering grid points.
+        Args:
+            rows (array of int): Row coordinates of grid points, entire grid if None.
+            cols (array of int): Column coordinates of grid points, entire grid if None.
+        Return:
+            Array of plant type ids, -1 where no plant covers a point.
+        """
+        tallest = self._tallest if rows is None else self._tallest[rows, cols]
+        return np.where(tallest >= 0, self.type_ids[tallest], -1)
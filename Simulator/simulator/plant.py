@@ -1,8 +1,34 @@
 from simulator.plant_stage import GerminationStage, GrowthStage, WaitingStage, WiltingStage, DeathStage
 from simulator.plant_presets import PLANT_TYPES, generate_growth_time
+from simulator.plant_table import PlantColumn, PlantTable
 
 
 class Plant:
+    # Attributes stored in the plant table, see PlantTable.
+    row = PlantColumn()
+    col = PlantColumn()
+    radius = PlantColumn()
+    height = PlantColumn()
+    type_id = PlantColumn()
+    stage_index = PlantColumn()
+    water_amt = PlantColumn()
+    water_available = PlantColumn()
+    watered_day = PlantColumn()
+    amount_sunlight = PlantColumn()
+    num_grid_points = PlantColumn()
+    growth_index = PlantColumn()
+    companionship_factor = PlantColumn()
+    pruned = PlantColumn()
+    c1 = PlantColumn()
+    c2 = PlantColumn()
+    k1 = PlantColumn()
+    k2 = PlantColumn()
+    max_radius = PlantColumn()
+    color = PlantColumn()
+    original_color = PlantColumn()
+    stopping_color = PlantColumn()
+    color_step = PlantColumn()
+
     def __init__(self, row, col, c1=0.1, c2=1, k1=0.3, k2=0.7, growth_time=25, color=(0, 1, 0), plant_type='basil',
                  germination_time=3, start_height=1, start_radius=1, max_radius=1000, height_scale=0.1,
                  radius_scale=0.1, stopping_color=(1, 0, 1), color_step=(10/255, 0/255, 0/255),
@@ -31,6 +57,9 @@ class Plant:
         #: Plant id.
         self.id = None
 
+        #: Plant table holding the tabled attributes and slot of this plant in it, until a garden adopts the plant.
+        self.table, self.slot = PlantTable.nursery_slot()
+
         self.row = row
         self.col = col
 
@@ -213,6 +242,11 @@ class Plant:
         self.amount_sunlight = 0
         self.water_amt = 0
         self.watered_day = 1
+        # The stages share their stress columns, clear the stress the plant had in its previous life cycle.
+        growth = self.stages[1]
+        growth.overwatered = False
+        growth.underwatered = False
+        growth.stress_time = 0
         self.stage_index = -1
         self.switch_stage(0)
 
@@ -1,8 +1,13 @@
 import numpy as np
+from simulator.plant_table import StageColumn
 from simulator.sim_globals import OVERWATERED_THRESHOLD, UNDERWATERD_THRESHOLD
 
 
 class PlantStage:
+    # Attributes stored in the plant table of the plant, see PlantTable.
+    duration = StageColumn()
+    current_time = StageColumn()
+
     def __init__(self, plant, duration_mean, duration_scale, index):
         """ Base class for modeling plant stages in bio standard life cycle trajectory.
 
@@ -13,8 +18,8 @@ class PlantStage:
             index (int): stage index.
         """
         self.plant = plant
-        self.duration = max(0, round(np.random.normal(duration_mean, duration_scale)))
         self.index = index
+        self.duration = max(0, round(np.random.normal(duration_mean, duration_scale)))
 
     def start_stage(self):
         """ Reset time count for current stage."""
@@ -66,6 +71,9 @@ class PlantStage:
 
 
 class GerminationStage(PlantStage):
+    start_height = StageColumn()
+    start_radius = StageColumn()
+
     def __init__(self, plant, duration, start_height, start_radius, height_scale, radius_scale):
         """ Model of germination stage in bio standard life cycle trajectory.
 
@@ -100,6 +108,10 @@ class GerminationStage(PlantStage):
 
 
 class GrowthStage(PlantStage):
+    overwatered = StageColumn()
+    underwatered = StageColumn()
+    stress_time = StageColumn()
+
     def __init__(self, plant, duration):
         """ Model of growth stage in bio standard life cycle trajectory.
 
@@ -145,7 +157,6 @@ class GrowthStage(PlantStage):
                 return 0, 0
 
         elif self.underwatered:
-            print("Plant underwatered!")
             if self.plant.water_amt < self.underwatered_threshold * self.desired_water_amt():
                 self.stress_time += 1
                 self.new_color = self.plant.get_new_color()
@@ -198,6 +209,10 @@ class GrowthStage(PlantStage):
 
 
 class WaitingStage(PlantStage):
+    overwatered = StageColumn()
+    underwatered = StageColumn()
+    stress_time = StageColumn()
+
     def __init__(self, plant, duration_mean, duration_scale):
         """ Model of waiting stage in bio standard life cycle trajectory.
 
@@ -231,7 +246,6 @@ class WaitingStage(PlantStage):
         """
 
         if self.overwatered:
-            print("Plant overwatered!")
             if self.plant.water_available > self.overwatered_threshold * self.desired_water_amt():
                 self.stress_time += 1
                 self.new_color = self.plant.get_new_color()
@@ -244,7 +258,6 @@ class WaitingStage(PlantStage):
                 return 0, 0
 
         elif self.underwatered:
-            print("Plant underwatered!")
             if self.plant.water_amt < self.underwatered_threshold * self.desired_water_amt():
                 self.stress_time += 1
                 self.new_color = self.plant.get_new_color()
@@ -296,6 +309,10 @@ class WaitingStage(PlantStage):
 
 
 class WiltingStage(PlantStage):
+    max_final_radius = StageColumn()
+    final_radius = StageColumn()
+    wilting_factor = StageColumn()
+
     def __init__(self, plant, duration_mean, duration_scale, final_radius):
         """ Model of wilting stage in bio standard life cycle trajectory.
 
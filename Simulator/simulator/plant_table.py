@@ -0,0 +1,185 @@
+import copy
+import numpy as np
+
+#: Amount of stages in the life cycle of a plant, see plant_stage.py.
+NUM_STAGES = 5
+
+#: Attributes of a plant kept in the columns of the plant table, with their dtype or (dtype, width) for tuples.
+PLANT_COLUMNS = {
+    'row': int,
+    'col': int,
+    'radius': float,
+    'height': float,
+    'type_id': int,
+    'stage_index': int,
+    'water_amt': float,
+    'water_available': float,
+    'watered_day': int,
+    'amount_sunlight': float,
+    'num_grid_points': int,
+    'growth_index': int,
+    'companionship_factor': float,
+    'pruned': bool,
+    'c1': float,
+    'c2': float,
+    'k1': float,
+    'k2': float,
+    'max_radius': float,
+    'color': (float, 3),
+    'original_color': (float, 3),
+    'stopping_color': (float, 3),
+    'color_step': (float, 3),
+}
+
+#: Attributes of the stages of a plant kept in the columns of the plant table. The state of the current stage
+#: (time, stress) shares one column across stages, since a plant passes through each stage at most once per life
+#: cycle, and Plant.start_over clears the stress when it starts a new one.
+STAGE_COLUMNS = {
+    'duration': (int, NUM_STAGES),
+    'current_time': int,
+    'overwatered': bool,
+    'underwatered': bool,
+    'stress_time': int,
+    'start_height': float,
+    'start_radius': float,
+    'max_final_radius': float,
+    'final_radius': float,
+    'wilting_factor': float,
+}
+
+#: All columns of the plant table.
+TABLE_COLUMNS = {**PLANT_COLUMNS, **STAGE_COLUMNS}
+
+#: Amount of plant slots of a nursery table, see PlantTable.nursery_slot.
+NURSERY_CAPACITY = 64
+
+
+def _empty_column(dtype, capacity):
+    """ Get a zeroed column.
+    Args:
+        dtype (type or tuple of (type, int)): dtype of column, or dtype and width of tuple valued column.
+        capacity (int): Amount of plant slots.
+    Return:
+        Array (capacity,) or (capacity, width).
+    """
+    if isinstance(dtype, tuple):
+        dtype, width = dtype
+        return np.zeros((capacity, width), dtype=dtype)
+    return np.zeros(capacity, dtype=dtype)
+
+
+class PlantTable:
+    _nursery = None  # Table handing out the slots of new plants.
+
+    def __init__(self, capacity=16):
+        """ Columnar store of plant attributes, one contiguous array per attribute indexed by plant slot.
+
+        Note:
+            Plant objects are views into a table: reading or writing plant.radius reads or writes
+            table.radius[plant.slot], so code can keep using the objects while garden wide steps work on the columns.
+
+        Args:
+            capacity (int): Initial amount of plant slots, grown on demand.
+        """
+        self.num_plants = 0  #: int: Amount of slots in use (largest slot + 1).
+        for name, dtype in TABLE_COLUMNS.items():
+            setattr(self, name, _empty_column(dtype, capacity))
+
+    @classmethod
+    def nursery_slot(cls):
+        """ Get a zeroed slot for a new plant, until a garden adopts the plant.
+        Note:
+            New plants take consecutive slots of a shared nursery table instead of allocating a table each. Slots are
+            never handed out twice, and a nursery table is freed once all of its plants were adopted.
+        Return:
+            PlantTable and slot.
+        """
+        table = cls._nursery
+        if table is None or table.num_plants == len(table.radius):
+            table = cls._nursery = PlantTable(NURSERY_CAPACITY)
+        slot = table.num_plants
+        table.num_plants += 1
+        return table, slot
+
+    def copy(self):
+        """ Get an independent copy of the table.
+        Return:
+            PlantTable with copies of the columns.
+        """
+        table = copy.copy(self)
+        for name in TABLE_COLUMNS:
+            setattr(table, name, getattr(self, name).copy())
+        return table
+
+    def _reserve(self, slot):
+        """ Grow the columns so that slot fits.
+        Args:
+            slot (int): Slot of plant.
+        """
+        capacity = len(self.radius)
+        if slot < capacity:
+            return
+        new_capacity = max(2 * capacity, slot + 1)
+        for name, dtype in TABLE_COLUMNS.items():
+            setattr(self, name, np.concatenate((getattr(self, name), _empty_column(dtype, new_capacity - capacity))))
+
+    def adopt(self, plant, slot, type_id=None):
+        """ Move a plant's attributes into a slot of this table and make the plant a view of it.
+        Args:
+            plant (Plant): Plant object, a view of its current table.
+            slot (int): Slot for the plant, its plant id in a garden.
+            type_id (int): Id of plant type, unchanged if None.
+        """
+        self._reserve(slot)
+        for name in TABLE_COLUMNS:
+            getattr(self, name)[slot] = getattr(plant.table, name)[plant.slot]
+        if type_id is not None:
+            self.type_id[slot] = type_id
+        self.num_plants = max(self.num_plants, slot + 1)
+        plant.table = self
+        plant.slot = slot
+
+
+class PlantColumn:
+    """ Descriptor exposing a column of the plant table as an attribute of the plant objects."""
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, plant, owner=None):
+        if plant is None:
+            return self
+        column = getattr(plant.table, self.name)
+        if column.ndim > 1:
+            return tuple(column[plant.slot].tolist())
+        return column.item(plant.slot)
+
+    def __set__(self, plant, value):
+        getattr(plant.table, self.name)[plant.slot] = value
+
+
+class StageColumn:
+    """ Descriptor exposing a column of the plant table as an attribute of the stage objects of a plant.
+
+    Note:
+        Columns with one entry per stage, like duration, are indexed by the stage index.
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def _index(self, stage):
+        column = getattr(stage.plant.table, self.name)
+        if column.ndim > 1:
+            return column, (stage.plant.slot, stage.index)
+        return column, stage.plant.slot
+
+    def __get__(self, stage, owner=None):
+        if stage is None:
+            return self
+        column, index = self._index(stage)
+        return column[index].item()
+
+    def __set__(self, stage, value):
+        column, index = self._index(stage)
+        column[index] = value
@@ -30,6 +30,20 @@ PRUNE_WINDOW_COLS = 5
 
 STEP = 1
 
+# Use the array-backed occupancy index (simulator/occupancy.py) for per grid point plant queries instead of the
+# 'nearby' sets. The sets are still maintained either way. Off by default, so existing runs keep the set-based path.
+OCCUPANCY_INDEX = False
+
+# Grow and step the life cycle stages of all plants at once with the array-based stage engine
+# (simulator/stage_engine.py) instead of the per plant stage objects. Off by default, so existing runs keep the stage
+# objects, check_stage_engine.py compares both.
+STAGE_ENGINE = False
+
+# Distribute the water of all grid points at once (Garden.distribute_water_batched) instead of point by point. Needs
+# the occupancy index, the point by point path runs without it. The batched path draws from its own random streams,
+# so seeded runs differ from the point by point path. Off by default, so existing seeded runs reproduce.
+BATCHED_WATER = False
+
 # Not used for simulator standalone - for physical garden transfer
 AG_REAL = False 
 SOIL_MOISTURE_SENSOR_POSITIONS = [(96, 72), (35, 111), (0, 0), (0, 0), (21, 138), (0, 0)]
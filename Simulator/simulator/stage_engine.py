@@ -0,0 +1,166 @@
+import numpy as np
+from simulator.plant_table import NUM_STAGES
+from simulator.sim_globals import OVERWATERED_THRESHOLD, UNDERWATERD_THRESHOLD
+
+# Stage indices, see plant_stage.py.
+GERMINATION, GROWTH, WAITING, WILTING, DEATH = range(NUM_STAGES)
+
+#: Days of continuous over- or underwatering after which a growing or waiting plant dies.
+STRESS_TIME_THRESHOLD = 5
+#: Radius factor per day of over- or underwatering, wilting to 80% of the radius before the plant dies.
+STRESS_WILTING_FACTOR = 0.8 ** (1 / STRESS_TIME_THRESHOLD)
+
+
+def current_stages(table, slots):
+    """ Get the stage index of plants.
+    Args:
+        table (PlantTable): Plant table.
+        slots (array of int): Slots of plants.
+    Return:
+        Array of stage indices, with -1 (stages[-1] of a plant past its life cycle) mapped to DEATH.
+    """
+    return table.stage_index[slots] % NUM_STAGES
+
+
+def desired_water_amt(table, slots):
+    """ Plants' desired water amount in their current stage and environment, see PlantStage.desired_water_amt.
+    Args:
+        table (PlantTable): Plant table.
+        slots (array of int): Slots of plants.
+    Return:
+        Array of max desired water amounts.
+    """
+    stage = current_stages(table, slots)
+    desired = table.c2[slots] * table.amount_sunlight[slots] ** 0.5
+    wilting = stage == WILTING
+    wilting_slots = slots[wilting]
+    desired[wilting] *= 1 - table.current_time[wilting_slots] / table.duration[wilting_slots, WILTING]
+    desired[stage == DEATH] = 0
+    return desired
+
+
+def get_new_color(table, slots):
+    """ Get color of plants one color step towards their stopping color, see Plant.get_new_color.
+    Args:
+        table (PlantTable): Plant table.
+        slots (array of int): Slots of plants.
+    Return:
+        Array (len(slots), 3) of RGB colors.
+    """
+    color, color_step, stopping_color = table.color[slots], table.color_step[slots], table.stopping_color[slots]
+    stepped = color + color_step
+    new_color = np.where(color_step > 0, np.minimum(stepped, stopping_color),
+                         np.where(color_step < 0, np.maximum(stepped, stopping_color), color))
+    new_color[:, 2] = stepped[:, 2]
+    return new_color
+
+
+def amount_to_grow(table, slots):
+    """ Compute stage and environment dependent growth of plants, all stages at once.
+
+    Note:
+        Same as calling Plant.amount_to_grow of every plant: updates the over- and underwatered flags and stress
+        times of growing and waiting plants, and gets the color they take on when stepping their stage.
+
+    Args:
+        table (PlantTable): Plant table.
+        slots (array of int): Slots of plants.
+    Return:
+        Arrays of upward/vertical and outward/radial growth, and array (len(slots), 3) of new colors for step.
+    """
+    stage = current_stages(table, slots)
+    radius = table.radius[slots]
+    upward = np.zeros(len(slots))
+    outward = np.zeros(len(slots))
+    new_color = table.color[slots]
+
+    # Germinating plants get their first visible size on the last day of germination.
+    sprouting = (stage == GERMINATION) & (table.current_time[slots] == table.duration[slots, GERMINATION] - 1)
+    upward[sprouting] = table.start_height[slots[sprouting]]
+    outward[sprouting] = table.start_radius[slots[sprouting]]
+
+    # Growing and waiting plants are stressed as long as they are over- or underwatered, checking overwatering
+    # first for plants that are not stressed yet.
+    stressable = (stage == GROWTH) | (stage == WAITING)
+    desired = desired_water_amt(table, slots)
+    too_wet = table.water_available[slots] > OVERWATERED_THRESHOLD * desired
+    too_dry = table.water_amt[slots] < UNDERWATERD_THRESHOLD * desired
+    overwatered = table.overwatered[slots]
+    underwatered = table.underwatered[slots]
+    was_stressed = stressable & (overwatered | underwatered)
+    overwatered = np.where(stressable & ~underwatered, too_wet, overwatered)
+    underwatered = np.where(stressable & ~table.overwatered[slots], too_dry & (underwatered | ~too_wet), underwatered)
+    stressed = stressable & (overwatered | underwatered)
+    recovered = was_stressed & ~stressed
+    healthy = stressable & ~was_stressed & ~stressed
+
+    stress_time = table.stress_time[slots]
+    stress_time[stressed] += 1
+    stress_time[recovered] = 0
+    outward[stressed] = (STRESS_WILTING_FACTOR - 1) * radius[stressed]
+    new_color[stressed | recovered] = get_new_color(table, slots[stressed | recovered])
+    new_color[healthy] = table.original_color[slots[healthy]]
+
+    # Healthy growing plants split their growth between height and radius depending on unoccupied space.
+    growing = healthy & (stage == GROWTH)
+    growing_slots = slots[growing]
+    G = table.c1[growing_slots] * table.water_amt[growing_slots] * table.companionship_factor[growing_slots] * \
+        (1 - (radius[growing] / table.max_radius[growing_slots]))
+    unocc_ratio = table.amount_sunlight[growing_slots] / table.num_grid_points[growing_slots]
+    unocc_ratio = np.minimum(np.maximum(table.k1[growing_slots], unocc_ratio), table.k2[growing_slots])
+    upward[growing], outward[growing] = (1 - unocc_ratio) * G, unocc_ratio * G
+
+    # Wilting plants shrink by their wilting factor.
+    wilting = stage == WILTING
+    outward[wilting] = (table.wilting_factor[slots[wilting]] - 1) * radius[wilting]
+
+    table.overwatered[slots] = overwatered
+    table.underwatered[slots] = underwatered
+    table.stress_time[slots] = stress_time
+    return upward, outward, new_color
+
+
+def reset(table, slots, new_color):
+    """ Reset the resources of a time step of plants and step their stages, all stages at once.
+
+    Note:
+        Same as calling Plant.reset of every plant, after amount_to_grow and the size update.
+
+    Args:
+        table (PlantTable): Plant table.
+        slots (array of int): Slots of plants.
+        new_color (array): Colors from amount_to_grow.
+    """
+    table.amount_sunlight[slots] = 0
+    table.water_amt[slots] = 0
+    table.watered_day[slots] = 1
+    table.pruned[slots] = False
+    table.water_available[slots] = 0
+
+    stage = current_stages(table, slots)
+    current_time = table.current_time[slots] + (stage != DEATH)
+    duration = table.duration[slots, stage]
+    next_stage = np.where((stage != DEATH) & (current_time >= duration), stage + 1, stage)
+
+    # Growing and waiting plants take on the color of the day and die after too long stress.
+    stressable = (stage == GROWTH) | (stage == WAITING)
+    color = table.color[slots]
+    color[stressable] = new_color[stressable]
+    dying = stressable & (table.overwatered[slots] | table.underwatered[slots]) & \
+        (table.stress_time[slots] >= STRESS_TIME_THRESHOLD)
+    next_stage[dying] = DEATH
+    wilting = stage == WILTING
+    color[wilting] = get_new_color(table, slots[wilting])
+    table.color[slots] = color
+
+    # Switch stage, the stress of a growing plant carries over to waiting since the stages share their columns.
+    switching = next_stage != table.stage_index[slots]
+    current_time[switching] = 0
+    table.current_time[slots] = current_time
+    table.stage_index[slots] = next_stage
+    start_wilting = slots[switching & (next_stage == WILTING)]
+    radius = table.radius[start_wilting]
+    eps = np.where(radius == 0, 1e-10, 0)
+    table.final_radius[start_wilting] = np.minimum(radius / 2, table.max_final_radius[start_wilting])
+    table.wilting_factor[start_wilting] = (table.final_radius[start_wilting] / (radius + eps)) ** \
+        (1 / table.duration[start_wilting, WILTING])
@@ -0,0 +1,172 @@
+import numpy as np
+from simulator.sim_globals import PERMANENT_WILTING_POINT, MAX_WATER_LEVEL
+
+#: Scaling factor for the plant uptake, the fraction of absorbed water that is removed from the grid point.
+UPTAKE_SCALE = 1 / 15
+
+#: Streams of the random draws of a day, so the irrigation gains do not reuse the draws of the water allocation.
+ALLOCATION_STREAM = 0
+IRRIGATION_STREAM = 1
+
+
+def water_rng(seed=None, timestep=0, stream=ALLOCATION_STREAM):
+    """ Get the random stream for one day of water allocation or irrigation.
+
+    Args
+        seed (int): Seed of the reproducible stream, None to draw from numpy's global random state.
+        timestep (int): Time step of simulation, combined with the seed so every day gets its own stream.
+        stream (int): ALLOCATION_STREAM or IRRIGATION_STREAM.
+
+    Return
+        Object providing random(size), standard_normal(size) and normal(loc, scale, size).
+    """
+    if seed is None:
+        return np.random
+    return np.random.default_rng([seed, timestep, stream])
+
+
+def allocate_water(water, coverage, demand, lit, priorities, floor=PERMANENT_WILTING_POINT):
+    """ Distribute the water of every grid point to the plants covering it.
+
+    Note:
+        Equivalent to visiting the plants of each grid point in random order and letting every plant with light
+        take min(water, demand) until the water drops to the floor, but done for all grid points at once: plants are
+        ranked per grid point by their priorities and the k-th ranked plants of all points are served together.
+
+    Args
+        water (array of float): Grid (N, M) of water levels, updated in place.
+        coverage (array of bool): Coverage masks (P, N, M) of the plants.
+        demand (array of float): Water (P,) a plant wants from each grid point it covers.
+        lit (array of bool): Plants (P,) that received light and therefore absorb water.
+        priorities (array of float): Random keys (P, N, M) defining the order plants are visited in per point.
+        floor (float): Water level below which no more water is absorbed.
+
+    Return
+        Absorbed water per plant (P,) and mask (P,) of plants that got to absorb at any grid point.
+    """
+    rows, cols = np.nonzero(np.any(coverage, axis=0))
+    point_water = water[rows, cols].astype(float)
+    absorbed, watered = allocate_point_water(point_water, coverage[:, rows, cols], priorities[:, rows, cols], demand,
+                                             lit, floor=floor)
+    water[rows, cols] = point_water
+    return absorbed, watered
+
+
+def allocate_point_water(point_water, covered, priorities, demand, lit, offsets=0, floor=PERMANENT_WILTING_POINT):
+    """ Distribute the water of a list of grid points to the plants covering them.
+
+    Note:
+        Points may come from several gardens: the plants of a point are numbered within its garden, and offsets
+        maps them to the rows of demand and lit, which hold the plants of all gardens back to back.
+
+    Args
+        point_water (array of float): Water levels (C,) of the grid points, updated in place.
+        covered (array of bool): Coverage (P, C) of the grid points per plant of their garden.
+        priorities (array of float): Random keys (P, C) defining the order plants are visited in per point.
+        demand (array of float): Water a plant wants from each grid point it covers, for the plants of all gardens.
+        lit (array of bool): Plants that received light and therefore absorb water, for the plants of all gardens.
+        offsets (array of int): Index (C,) of the first plant of the garden of each grid point in demand and lit.
+        floor (float): Water level below which no more water is absorbed.
+
+    Return
+        Absorbed water per plant and mask of plants that got to absorb at any grid point, like demand.
+    """
+    num_plants = len(demand)
+    absorbed = np.zeros(num_plants)
+    watered = np.zeros(num_plants, dtype=bool)
+    if not len(point_water):
+        return absorbed, watered
+
+    order = np.argsort(np.where(covered, priorities, np.inf), axis=0)
+    counts = np.sum(covered, axis=0)
+    offsets = np.broadcast_to(offsets, counts.shape)
+    for rank in range(np.max(counts)):
+        active = (counts > rank) & (point_water > floor)
+        plant_ids = order[rank][active] + offsets[active]
+        take = np.where(lit[plant_ids], np.minimum(point_water[active], demand[plant_ids]), 0)
+        point_water[active] -= take * UPTAKE_SCALE
+        absorbed += np.bincount(plant_ids, weights=take, minlength=num_plants)
+        watered[plant_ids[lit[plant_ids]]] = True
+    return absorbed, watered
+
+
+def evaporate(water, last_watered, evap_rate_dict, evap_rate_std, noise):
+    """ Remove the evaporated water from every grid point.
+
+    Args
+        water (array of float): Grid (N, M) of water levels, updated in place.
+        last_watered (array of int): Grid (N, M) of days since each point was watered.
+        evap_rate_dict (dict of [int, float]): Mean evaporation rate by days since watered.
+        evap_rate_std (dict of [int, float]): Standard deviation of evaporation rate by days since watered.
+        noise (array of float): Standard normal samples (N, M).
+    """
+    idx = np.minimum(last_watered, len(evap_rate_dict) - 1)
+    rates = np.array([evap_rate_dict[i] for i in range(len(evap_rate_dict))])[idx]
+    stds = np.array([evap_rate_std[i] for i in range(len(evap_rate_dict))])[idx]
+    evaporated = np.maximum(0, rates + stds * noise)
+    water[...] = np.maximum(0, water - evaporated)
+
+
+def irrigation_stencil(inner_radius=4, outer_radius=8, outer_gain=1/32):
+    """ Precompute the relative water gain of the grid points around an irrigation point.
+
+    Note:
+        Irrigation adds water on concentric disks from outer_radius down to inner_radius, doubling the gain on every
+        smaller disk, so a point gets the summed gains of all disks it lies in.
+
+    Args
+        inner_radius (int): Radius of the innermost disk.
+        outer_radius (int): Radius of the outermost disk.
+        outer_gain (float): Gain of the outermost disk, relative to the sampled gain of the irrigation.
+
+    Return
+        Row offsets, column offsets and relative gains of the points within outer_radius of the irrigation point.
+    """
+    offsets = np.arange(-outer_radius, outer_radius + 1)
+    rows, cols = np.meshgrid(offsets, offsets, indexing='ij')
+    dist = np.sqrt(rows ** 2 + cols ** 2)
+    gains = np.zeros(dist.shape)
+    gain = outer_gain
+    for radius in range(inner_radius, outer_radius + 1)[::-1]:
+        gains[dist <= radius] += gain
+        gain *= 2
+    inside = dist <= outer_radius
+    return rows[inside], cols[inside], gains[inside]
+
+
+def irrigate_points(water, last_watered, centers, gains, stencil, clip_radius, max_water_level=MAX_WATER_LEVEL):
+    """ Add the water of several irrigation points to the grid in a single scatter-add.
+
+    Note:
+        Since irrigation only adds water, clipping the union of all windows once gives the same levels as clipping
+        the window of each irrigation point right after it was applied, as long as the stencil lies within the
+        window. A stencil reaching past clip_radius is applied one irrigation point at a time instead.
+
+    Args
+        water (array of float): Grid (N, M) of water levels, updated in place.
+        last_watered (array of int): Grid (N, M) of days since each point was watered, reset where water is added.
+        centers (Array of [int,int]): Locations [row, col] of the irrigation points.
+        gains (array of float): Sampled gain (K,) of each irrigation point.
+        stencil (tuple of arrays): Row offsets, column offsets and relative gains from irrigation_stencil.
+        clip_radius (int): Half size of the square window around each point that is clipped to max_water_level.
+        max_water_level (float): Maximal water level of a grid point.
+    """
+    N, M = water.shape
+    centers = np.reshape(centers, (-1, 2)).astype(int)
+    d_rows, d_cols, rel_gains = stencil
+    if len(centers) > 1 and max(np.max(np.abs(d_rows)), np.max(np.abs(d_cols))) > clip_radius:
+        for center, gain in zip(centers, np.reshape(gains, -1)):
+            irrigate_points(water, last_watered, center, gain, stencil, clip_radius, max_water_level)
+        return
+    rows = centers[:, :1] + d_rows
+    cols = centers[:, 1:] + d_cols
+    inside = (rows >= 0) & (rows < N) & (cols >= 0) & (cols < M)
+    points = rows[inside] * M + cols[inside]
+    amounts = (np.reshape(gains, (-1, 1)) * rel_gains)[inside]
+    water += np.bincount(points, weights=amounts, minlength=N * M).reshape(N, M)
+    last_watered.flat[points] = 0
+
+    window = np.zeros((N, M), dtype=bool)
+    for row, col in centers:
+        window[max(0, row - clip_radius):row + clip_radius + 1, max(0, col - clip_radius):col + clip_radius + 1] = True
+    np.minimum(water, max_water_level, out=water, where=window)
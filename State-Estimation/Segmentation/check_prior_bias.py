@@ -0,0 +1,107 @@
+import argparse
+import numpy as np
+from utils.constants import LABEL_ENC
+from segmentation.location_segmentation import augment_model_prediction_by_priors, bias_by_rad, points_in_circle
+
+'''
+How to run this script, from State-Estimation like track.py, so that utils and segmentation import:
+python3 -m Segmentation.check_prior_bias [-s SEEDS]
+
+'''
+
+
+def augment_per_pixel(scores, priors_left, priors_right, points=points_in_circle):
+    """ Per pixel version of augment_model_prediction_by_priors, as it was before the bounding box slices.
+        Args
+            scores height x width x # classes array of softmax outputs
+            priors_left, priors_right plant type to list of {'circle': ((x, y), radius)} priors
+            points function of (radius, x0, y0) giving the (x, y) pixels of a circle
+    """
+    bias = 5
+    growth_rate = 1.3
+    for priors in [priors_left, priors_right]:
+        for plant_type in priors.keys():
+            for center in priors[plant_type]:
+                center = center['circle']
+                for y, x in points(center[1], center[0][0], center[0][1]):
+                    if x < 0 or x >= scores.shape[0] or y < 0 or y >= scores.shape[1]:
+                        continue
+                    bias_temp = bias * bias_by_rad(center[0], x, y, center[1] * growth_rate)
+                    scores[x][y][LABEL_ENC[plant_type]] = min(scores[x][y][LABEL_ENC[plant_type]] * bias_temp, 1)
+                    scores[x][y][0] = min(scores[x][y][0] * bias_temp, 0.99)
+    return scores
+
+def all_points_in_circle(radius, x0=0, y0=0):
+    """ Returns every integer point within a circle, without the arange
+        of points_in_circle, which repeats a pixel for float circles starting
+        between -1 and 0.
+    """
+    for x in range(int(np.floor(x0 - radius)), int(np.floor(x0 + radius)) + 1):
+        for y in range(int(np.floor(y0 - radius)), int(np.floor(y0 + radius)) + 1):
+            if (x - x0)**2 + (y - y0)**2 <= radius**2:
+                yield x, y
+
+def reference_points(radius, x0=0, y0=0):
+    """ Returns the points of points_in_circle, or of all_points_in_circle
+        for the circles points_in_circle gets wrong.
+    """
+    if -1 < x0 - radius - 1 < 0 or -1 < y0 - radius - 1 < 0:
+        return all_points_in_circle(radius, x0, y0)
+    return points_in_circle(radius, x0, y0)
+
+def random_priors(rng, shape, num_circles, near_edge=False):
+    """ Outputs left and right priors of random circles, half of them with
+        float centers and radii.
+        Args
+            rng numpy random Generator
+            shape shape of the scores
+            num_circles circles per side
+            near_edge centers within a pixel of the top left corner
+    """
+    plant_types = [plant_type for plant_type in LABEL_ENC if plant_type != "other"]
+    sides = []
+    for _ in range(2):
+        priors = {}
+        for i in range(num_circles):
+            if near_edge:
+                x, y = rng.uniform(-1, 1, 2)
+                radius = rng.uniform(0, 2)
+            else:
+                x, y = rng.integers(-20, shape[1] + 20), rng.integers(-20, shape[0] + 20)
+                radius = int(rng.integers(0, 40))
+                if i % 2:
+                    x, y, radius = x + rng.random(), y + rng.random(), radius + rng.random()
+            circle = ((x, y), radius)
+            priors.setdefault(plant_types[rng.integers(len(plant_types))], []).append({'circle': circle})
+        sides.append(priors)
+    return sides
+
+def check(seed, shape=(240, 400), num_circles=20):
+    """ Compares the bounding box version with the per pixel version on random
+        scores and priors, bit for bit. Circles that points_in_circle gets
+        wrong are compared with all of their pixels instead.
+        Args
+            seed seed of the scores and priors
+            shape height and width of the scores
+            num_circles circles per side
+    """
+    rng = np.random.default_rng(seed)
+    scores = rng.random(shape + (len(LABEL_ENC),))
+    priors_left, priors_right = random_priors(rng, shape, num_circles)
+    ok = np.array_equal(augment_model_prediction_by_priors(scores.copy(), priors_left, priors_right),
+                        augment_per_pixel(scores.copy(), priors_left, priors_right, reference_points))
+    # Circles within a pixel of the corner, where points_in_circle repeats pixels.
+    priors_left, priors_right = random_priors(rng, shape, num_circles, near_edge=True)
+    ok_edge = np.array_equal(augment_model_prediction_by_priors(scores.copy(), priors_left, priors_right),
+                             augment_per_pixel(scores.copy(), priors_left, priors_right, all_points_in_circle))
+    print("seed {}: {}, near the corner: {}".format(seed, "same" if ok else "DIFFERENT",
+                                                    "same" if ok_edge else "DIFFERENT"))
+    return ok and ok_edge
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the prior bias of the scores against the per pixel version")
+    parser.add_argument("-s", "--seeds", type=int, nargs="+", default=[0, 1, 2])
+    args = parser.parse_args()
+    ok = all([check(seed) for seed in args.seeds])
+    print("prior bias matches" if ok else "prior bias differs")
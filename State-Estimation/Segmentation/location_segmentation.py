@@ -11,6 +11,7 @@ from tqdm import tqdm_notebook, tnrange
 from utils.constants import *
 from utils.eval_utils import *
 from utils.full_auto_utils import *
+from utils.tiled_inference import generate_full_scores
 import copy
 from math import *
 from sklearn.metrics import confusion_matrix
@@ -19,53 +20,15 @@ from datetime import date
 import pickle as pkl
 
 
-def generate_full_scores_arr(test_image, model):
-    """ Outputs a label matrix of predicted plant type given a model and overhead
-        image.
+def generate_full_scores_arr(test_image, model, blend=False):
+    """ Outputs the softmax scores of every plant type for every pixel given a
+        model and overhead image.
         args
-            test_id name of the overhead image
             test_image RGB overhead image
             model Semantic segmentation model used for prediction
+            blend average the softmaxes of overlapping tiles
     """
-    scores = np.full((test_image.shape[0], test_image.shape[1], N_CLASSES), 0.)
-    for i in np.arange(0, test_image.shape[0] - IM_HEIGHT, 512):
-        for j in np.arange(0, test_image.shape[1] - IM_WIDTH, 512):
-            temp = np.zeros((1, IM_HEIGHT, IM_WIDTH, 3))
-            temp[0] = test_image[i:i+IM_HEIGHT, j:j+IM_WIDTH]
-            softmaxes = model.predict(temp)[0]
-            for x in np.arange(softmaxes.shape[0]):
-                for y in np.arange(softmaxes.shape[1]):
-
-                    scores[i+x][j+y] = softmaxes[x][y]
-
-        if j<test_image.shape[1] - IM_WIDTH:
-            j = test_image.shape[1] - IM_WIDTH
-            temp = np.zeros((1, IM_HEIGHT, IM_WIDTH, 3))
-            temp[0] = test_image[i:i+IM_HEIGHT, j:j+IM_WIDTH]
-            softmaxes = model.predict(temp)[0]
-            for x in np.arange(softmaxes.shape[0]):
-                for y in np.arange(softmaxes.shape[1]):
-                    scores[i+x][j+y] = softmaxes[x][y]
-
-        if i<test_image.shape[0] - IM_HEIGHT:
-            i = test_image.shape[0] - IM_HEIGHT
-            for j in np.arange(0, test_image.shape[1] - IM_WIDTH+1, 512):
-                temp = np.zeros((1, IM_HEIGHT, IM_WIDTH, 3))
-                temp[0] = test_image[i:i+IM_HEIGHT, j:j+IM_WIDTH]
-                softmaxes = model.predict(temp)[0]
-                for x in np.arange(softmaxes.shape[0]):
-                    for y in np.arange(softmaxes.shape[1]):
-                        scores[i+x][j+y] = softmaxes[x][y]
-
-            if j<test_image.shape[1] - IM_WIDTH:
-                j = test_image.shape[1] - IM_WIDTH
-                temp = np.zeros((1, IM_HEIGHT, IM_WIDTH, 3))
-                temp[0] = test_image[i:i+IM_HEIGHT, j:j+IM_WIDTH]
-                softmaxes = model.predict(temp)[0]
-                for x in np.arange(softmaxes.shape[0]):
-                    for y in np.arange(softmaxes.shape[1]):
-                        scores[i+x][j+y] = softmaxes[x][y]
-    return scores
+    return generate_full_scores(test_image, model, blend=blend)
 
 def bias_by_rad(center, x, y, rad):
     """ Outputs a scaler multiplier based off of distance of x, y from plant center
@@ -82,33 +45,62 @@ def bias_by_rad(center, x, y, rad):
         return 0.2
     return ((rad - dist) / rad)
 
+def scalar_power(base, exponent):
+    """ Outputs base ** exponent elementwise, rounded like ** on the NumPy scalars
+        of the per pixel loops: integer bases go through the power ufunc, float
+        ones through the C library pow like float_power, whose last bit can differ
+        from the vectorized power.
+        Args
+            base array of bases
+            exponent exponent
+    """
+    if np.issubdtype(base.dtype, np.integer):
+        return base ** exponent
+    return np.float_power(base, exponent)
+
+def bias_in_circle(circle, growth_rate, shape):
+    """ Outputs the bounding box of a prior circle clipped to the image, the
+        pixels of the box within the circle and their bias_by_rad multipliers.
+        Args
+            circle ((x, y), radius) of a prior plant
+            growth_rate expected growth of the plant radius since the prior
+            shape shape of the image
+    """
+    (x0, y0), radius = circle[0], circle[1]
+    # Pixels within radius of the center along each axis, x along the columns and y along the rows of the image.
+    # The box and the pixel ranges come from the same clipped bounds, so they agree for float circles too.
+    x_lo, x_hi = np.clip([int(np.floor(x0 - radius)), int(np.floor(x0 + radius)) + 1], 0, shape[1])
+    y_lo, y_hi = np.clip([int(np.floor(y0 - radius)), int(np.floor(y0 + radius)) + 1], 0, shape[0])
+    x_, y_ = np.arange(x_lo, x_hi), np.arange(y_lo, y_hi)
+    box = np.s_[y_lo:y_hi, x_lo:x_hi]
+    inside = (x_ - x0)**2 + (y_[:, np.newaxis] - y0)**2 <= radius**2
+
+    rad = radius * growth_rate
+    dist = scalar_power(scalar_power(x0 - x_, 2) + scalar_power(y0 - y_[:, np.newaxis], 2), 0.5)
+    if rad == 0:
+        return box, inside, np.full(inside.shape, 0.2)
+    return box, inside, np.where(rad - dist == 0, 0.2, (rad - dist) / rad)
+
 # Scores height x width x # classes array of softmax outputs for each score.
 # Priors a dictionary keyed by plant types containing previous centers
 def augment_model_prediction_by_priors(scores, priors_left, priors_right):
     """ Takes a prediction matrix of size NxMxplant_types and augments the confidence_map
         based off prior center locations
+        The bias of each prior circle is applied to its bounding box at once. Since
+        the scores are capped after each multiplication, overlapping circles are
+        applied one after the other, in the order of the priors.
     """
     bias = 5
     growth_rate = 1.3
-    s = []
-    for plant_type in priors_left.keys():
-        for center in priors_left[plant_type]:
-            center = center['circle']
-            for y, x in points_in_circle(center[1], center[0][0], center[0][1]):
-                if x < 0 or x >= scores.shape[0] or y < 0 or y >= scores.shape[1]:
-                    continue
-                bias_temp = bias * bias_by_rad(center[0], x, y, center[1] * growth_rate)
-                scores[x][y][LABEL_ENC[plant_type]] = min(scores[x][y][LABEL_ENC[plant_type]] * bias_temp, 1)
-                scores[x][y][0] = min(scores[x][y][0] * bias_temp, 0.99)
-    for plant_type in priors_right.keys():
-        for center in priors_right[plant_type]:
-            center = center['circle']
-            for y, x in points_in_circle(center[1], center[0][0], center[0][1]):
-                if x < 0 or x >= scores.shape[0] or y < 0 or y >= scores.shape[1]:
-                    continue
-                bias_temp = bias * bias_by_rad(center[0], x, y, center[1] * growth_rate)
-                scores[x][y][LABEL_ENC[plant_type]] = min(scores[x][y][LABEL_ENC[plant_type]] * bias_temp, 1)
-                scores[x][y][0] = min(scores[x][y][0] * bias_temp, 0.99)
+    for priors in [priors_left, priors_right]:
+        for plant_type in priors.keys():
+            label = LABEL_ENC[plant_type]
+            for center in priors[plant_type]:
+                box, inside, bias_temp = bias_in_circle(center['circle'], growth_rate, scores.shape)
+                window = scores[box]
+                bias_temp = bias * bias_temp
+                np.minimum(window[..., label] * bias_temp, 1, out=window[..., label], where=inside)
+                np.minimum(window[..., 0] * bias_temp, 0.99, out=window[..., 0], where=inside)
     return scores
 
 def scores_to_labels(scores):
@@ -132,23 +124,14 @@ def points_in_circle(radius, x0=0, y0=0):
     for x, y in zip(x_[x], y_[y]):
         yield x, y
 
-def loc_bias_with_shift(model, name, path):
-    """ Outputs an image mask of plant types by color using the given model and
-    Location based center tracking algorithm.
-    args
-        model Semantic segmenation model used for predictions
-        name name of overhead image
-        path folder location of images
+def predict_shifted_scores(test_image, model):
+    """ Outputs the softmax scores of an overhead image and of the image shifted
+        by 256 pixels, shifted back to the original position. These do not
+        depend on the priors, so they can be computed ahead of them.
+        args
+            test_image RGB overhead image
+            model Semantic segmenation model used for predictions
     """
-
-    image_name = './{}/{}.jpg'.format(path, name)
-
-    priors_left = get_recent_priors(path=PRIOR_PATH, side='l')
-    priors_right = get_recent_priors(path=PRIOR_PATH, side='r')
-
-    print(image_name)
-    test_image = cv2.cvtColor(cv2.imread(image_name), cv2.COLOR_BGR2RGB)
-
     shifted_image = np.zeros((test_image.shape[0] + 256, test_image.shape[1] + 256, 3))
     shifted_image[256:, 256:, :] = test_image
 
@@ -157,28 +140,48 @@ def loc_bias_with_shift(model, name, path):
     scores_shifted = generate_full_scores_arr(shifted_image, model)
 
     scores_shifted = scores_shifted[256:, 256:] #shift the array back to the original position
+    return scores, scores_shifted
 
+def labels_from_scores(scores, scores_shifted, priors_left, priors_right):
+    """ Outputs the label map and its scores combining the predictions of the
+        image and the shifted image biased by the priors, the higher label wins.
+        args
+            scores softmax scores of the image
+            scores_shifted softmax scores of the shifted image
+            priors_left priors of the left half of the garden
+            priors_right priors of the right half of the garden
+    """
     scores = augment_model_prediction_by_priors(scores, priors_left, priors_right)
     scores_shifted = augment_model_prediction_by_priors(scores_shifted, priors_left, priors_right)
 
-
-    label = np.full((test_image.shape[0], test_image.shape[1]), 0)
-    prescor = np.full((test_image.shape[0], test_image.shape[1]), 0.)
-
     label_map1 = np.argmax(scores, axis=-1)
     label_map2 = np.argmax(scores_shifted, axis=-1)
 
     prescor1 = np.amax(scores, axis=-1)
     prescor2 = np.amax(scores_shifted, axis=-1)
 
-    for i in np.arange(test_image.shape[0]):
-        for j in np.arange(test_image.shape[1]):
-            if label_map1[i][j] >= label_map2[i][j]:
-                label[i][j] = label_map1[i][j]
-                prescor[i][j] = prescor1[i][j]
-            elif label_map1[i][j] < label_map2[i][j]:
-                label[i][j] = label_map2[i][j]
-                prescor[i][j] = prescor2[i][j]
+    first = label_map1 >= label_map2
+    return np.where(first, label_map1, label_map2), np.where(first, prescor1, prescor2)
+
+def loc_bias_with_shift(model, name, path):
+    """ Outputs an image mask of plant types by color using the given model and
+    Location based center tracking algorithm.
+    args
+        model Semantic segmenation model used for predictions
+        name name of overhead image
+        path folder location of images
+    """
+
+    image_name = './{}/{}.jpg'.format(path, name)
+
+    priors_left = get_recent_priors(path=PRIOR_PATH, side='l')
+    priors_right = get_recent_priors(path=PRIOR_PATH, side='r')
+
+    print(image_name)
+    test_image = cv2.cvtColor(cv2.imread(image_name), cv2.COLOR_BGR2RGB)
+
+    scores, scores_shifted = predict_shifted_scores(test_image, model)
+    label, _ = labels_from_scores(scores, scores_shifted, priors_left, priors_right)
 
     show_test_truth_prediction(labels_to_colors(label), PROCESSED_IMAGES + name + ".png")
     #combine the two images together using major vote / confidence metric
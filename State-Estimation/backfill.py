@@ -0,0 +1,166 @@
+import os
+import csv
+import time
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from utils.crop_img_ind import *
+from center_tracking.full_auto_circles import *
+from center_tracking.linearity import *
+from utils.centers_test import *
+from utils.stage_cache import StageCache, file_digest
+from utils.mask_codec import labels_to_colors
+from segmentation.run import model_unet
+from segmentation.location_segmentation import predict_shifted_scores, labels_from_scores, show_test_truth_prediction
+from track import CROP_CORNERS
+
+'''
+How to run this script:
+python3 backfill.py <folder of snc-<>.jpg images> <side> [--priors <priors file of the day before the first image>]
+
+Reprocesses a season of overhead images, the first image of each day in order,
+without the working directory pickles of track.py. Each day goes through
+crop -> segmentation -> circle fitting -> keypoints. The circles of a day are the
+priors of the next, so only the stages that do not depend on them overlap across
+days: cropping and model inference of the next days run ahead in one thread and
+the keypoints of a day are found in another, while the main thread biases the
+segmentation by the priors and fits the circles.
+'''
+
+
+class StageTimer:
+    def __init__(self):
+        '''Records how long each stage of each image took, from any thread.'''
+        self.start = time.perf_counter()
+        self.rows = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def time(self, image, stage):
+        '''Times the stage of image run in the with block.'''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self.lock:
+                self.rows.append((image, stage, threading.current_thread().name,
+                                  start - self.start, end - start))
+
+    def write(self, path):
+        '''Writes the timings as csv, one row per image and stage, and prints the total per stage.'''
+        with self.lock:
+            rows = sorted(self.rows, key=lambda row: row[3])
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["image", "stage", "thread", "start", "seconds"])
+            writer.writerows(rows)
+        totals = {}
+        for row in rows:
+            totals[row[1]] = totals.get(row[1], 0) + row[4]
+        for stage, seconds in totals.items():
+            print("{:<16}{:10.1f}s".format(stage, seconds))
+        print("{:<16}{:10.1f}s".format("wall", time.perf_counter() - self.start))
+
+
+def priors_path(date, side):
+    '''Path of the priors save_priors writes for date.'''
+    return PRIOR_PATH + ('left/' if side == 'l' else 'right/') + "priors" + date + ".p"
+
+
+def recent_priors_path(side):
+    '''Path of the priors get_recent_priors reads for side when given no path.'''
+    folder = PRIOR_PATH + ('left/' if side == 'l' else 'right/')
+    return folder + daily_files(folder, False)[-2]
+
+
+def side_priors(prior_path, side):
+    '''Priors of the plants on side of a priors file, see get_recent_priors.'''
+    return get_recent_priors(prior_path)[0 if side == 'l' else 1]
+
+
+def crop_and_score(image_dir, f, cache, timer):
+    '''Crops an overhead image and predicts the softmax scores of the crop, the
+    stages of a day that do not depend on the priors.'''
+    with timer.time(f, "crop"):
+        path = os.path.join(image_dir, f)
+        crop = lambda: correct_image(cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB), *CROP_CORNERS)
+        _, new_im = cache.run("cropped", crop, file_digest(path), CROP_CORNERS)
+        imsave(CROPPED_LOC + f, new_im)
+    with timer.time(f, "inference"):
+        # Segment the saved crop like track.py, so the masks match its jpeg compression.
+        test_image = cv2.cvtColor(cv2.imread(CROPPED_LOC + f), cv2.COLOR_BGR2RGB)
+        return new_im, predict_shifted_scores(test_image, model_unet)
+
+
+def find_leaf_centers(f, new_im, prior_path, mask_path, side, cache, timer):
+    '''Finds the leaf centers of a day from its circles, see track.py.'''
+    with timer.time(f, "keypoints"):
+        prior = get_recent_priors(prior_path)
+        _, leaf_centers = cache.run("leaf_centers", lambda: get_max_leaf_centers(prior, mask_path, side == 'r'),
+                                    file_digest(mask_path), prior, side == 'r', LEAF_SEARCH_SCALE)
+        save_keyPoint(new_im, PRUNE_POINTS + "/" + f[4:10] + "_all.png", leaf_centers)
+    return leaf_centers
+
+
+def backfill(image_dir, side, first_priors=None, lookahead=1, processes=LABEL_PROCESSES, report=None):
+    '''Runs the state estimation pipeline on the first image of each day in image_dir.
+    image_dir: folder of snc-<>.jpg overhead images
+    side: 'l' or 'r', the half of the garden to track
+    first_priors: priors of the day before the first image, the most recent priors if None
+    lookahead: number of days cropped and segmented ahead of the circle fitting
+    processes: worker processes fitting the circles, see label_circles_BFS
+    report: csv file of the timings of the stages
+    Returns the leaf centers of each image.
+    '''
+    files = [f for f in daily_files(image_dir) if f.startswith(IMAGE_NAME_PREFIX) and f.endswith(".jpg")]
+    cache = StageCache()
+    timer = StageTimer()
+    prior_path = first_priors or recent_priors_path(side)
+    # Only side is backfilled, the priors of the other half stay the same for all days.
+    other_side = 'r' if side == 'l' else 'l'
+    other_priors = side_priors(recent_priors_path(other_side), other_side)
+    leaf_centers = {}
+    with ThreadPoolExecutor(1, thread_name_prefix="segmentation") as segmentation, \
+         ThreadPoolExecutor(1, thread_name_prefix="keypoints") as keypoints:
+        ahead = deque()
+        submitted = 0
+        for f in files:
+            # The scores of a full image are large, only keep a few days ahead.
+            while submitted < len(files) and len(ahead) <= lookahead:
+                ahead.append(segmentation.submit(crop_and_score, image_dir, files[submitted], cache, timer))
+                submitted += 1
+            new_im, (scores, scores_shifted) = ahead.popleft().result()
+
+            with timer.time(f, "segmentation"):
+                # The priors of both halves bias the scores, like loc_bias_with_shift, the
+                # priors of side are the circles of the previous backfilled day.
+                priors = {side: side_priors(prior_path, side), other_side: other_priors}
+                label, _ = labels_from_scores(scores, scores_shifted, priors['l'], priors['r'])
+                del scores, scores_shifted
+                mask_path = PROCESSED_IMAGES + f[:-4] + ".png"
+                show_test_truth_prediction(labels_to_colors(label), mask_path)
+
+            with timer.time(f, "circles"):
+                label_circles_BFS(mask_path, True, side, prior_path=prior_path, processes=processes, cache=cache)
+            date = mask_path[mask_path.find("-2")+1:mask_path.find("-2")+7]
+            prior_path = priors_path(date, side)
+
+            leaf_centers[f] = keypoints.submit(find_leaf_centers, f, new_im, prior_path, mask_path, side, cache, timer)
+    leaf_centers = {f: future.result() for f, future in leaf_centers.items()}
+    timer.write(report or os.path.join(os.path.dirname(PRUNE_POINTS), "backfill_report.csv"))
+    return leaf_centers
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reprocess a season of overhead images")
+    parser.add_argument("image_dir", help="folder of snc-<>.jpg overhead images")
+    parser.add_argument("side", choices=["l", "r"], help="half of the garden to track")
+    parser.add_argument("--priors", default=None, help="priors of the day before the first image")
+    parser.add_argument("--lookahead", type=int, default=1, help="days segmented ahead of the circle fitting")
+    parser.add_argument("--processes", type=int, default=LABEL_PROCESSES, help="processes fitting circles")
+    parser.add_argument("--report", default=None, help="csv file of the stage timings")
+    args = parser.parse_args()
+    backfill(args.image_dir, args.side, args.priors, args.lookahead, args.processes, args.report)
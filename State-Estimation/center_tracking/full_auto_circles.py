@@ -1,6 +1,8 @@
 from matplotlib.pyplot import show
 import os
 import sys
+import multiprocessing as mp
+from multiprocessing import shared_memory
 sys.path.append("..")
 from utils.plant_to_circle import *
 from utils.geometry_utils import *
@@ -9,8 +11,18 @@ from utils.center_constants import *
 from utils.full_auto_utils import *
 import numpy as np
 from utils.constants import *
+from utils.stage_cache import file_digest
+from utils.circle_fitter import END_RATIO
 from tqdm import tqdm
 
+# Min radius a fit circle grows to before the plant can end.
+MIN_RADIUS = 50
+# Version of the circle fit, part of the cache key of the circles next to its parameters.
+# Bump it when the fit changes in a way the parameters do not capture.
+CIRCLE_FIT_VERSION = 2
+# Side of the mask read_mask keeps for each side of the garden.
+MASK_SIDES = {'l': 'left', 'r': 'right'}
+
 
 
 
@@ -19,56 +31,119 @@ from tqdm import tqdm
 ############################
 
 
-def label_circles_BFS(path, show_res=False, side=None, sim_circle_path=None, day=None, prior_path=None):
+def label_plant_type(fitter, plant_type, old_circles, max_radii=None):
+    '''Fits the circles of the plants of one type, smallest prior first, leaving out
+    the circles of the plants of the type already fit.
+    fitter: CircleFitter of the mask
+    plant_type: type of the plants
+    old_circles: priors of the plants
+    max_radii: simulated radii of the plants, in the order of their prior radius, or None
+    to use the radius models
+    '''
+    new_circles = []
+    # Get radius models
+    rad_models = (get_model_coeff("min", plant_type),
+                  get_model_coeff("max", plant_type))
+    for idx, circle in enumerate(sorted(old_circles, key=lambda p: p["circle"][1])):
+        # circle = {"circle":circle, "days_post_germ": 10}
+        new_c = {}
+        center = circle["circle"][0]
+        center = (round(center[0]), round(center[1]))
+        prev_rad = circle["circle"][1]
+        day = circle["days_post_germ"]+1
+        if max_radii is not None:
+            max_rad = max(55, max_radii[idx][0]*.9)
+        else:
+            _, max_rad = get_radius_range(day, prev_rad, rad_models)
+        min_rad = MIN_RADIUS
+        try:
+            c, max_p = fitter.fit(center, max_rad, min_rad, plant_type, taken_circles=new_circles)
+            r = abs(distance(c, max_p))
+        except ZeroDivisionError:
+            # traceback.print_exc()
+            #TODO ADD WILTING LOGIC
+            if day > 10:
+                # prev_rad = radial_wilt(prev_rad)
+                "pass"
+            r, c, max_p = abs(prev_rad), center, (center[0]+prev_rad, center[1])
+            # print("Zero div at: " + str(c))
+        if day > r and day < 20:
+            r = 0
+        if r <= prev_rad*.9 and prev_rad > 55:
+            r = prev_rad*.9
+        if r*.7 > prev_rad  and prev_rad > 55:
+            r = prev_rad*1.1
+        if distance(center, c) > 50:
+            direction_vec = [c[i] - center[i] for i in range(2)]
+            direction_vec = direction_vec / np.linalg.norm(direction_vec)
+            # Solve for moving the original point 50 units in the direction of the new vector.
+            # As long as the vector is normalized the answer is 5*root2, and independent of the vectors
+            # pretty neat!
+            scale_factor = 5*sqrt(2)
+            c = [c[i] + scale_factor*direction_vec[i] for i in range(2)]
+        new_c["circle"], new_c["days_post_germ"] = (c, r, max_p), day
+        # computed_type = COLORS_TO_TYPES[find_color(c, get_img(path)[1])[0]]
+        new_circles.append(new_c)
+    return new_circles
+
+# Per worker process: the mask shared by the parent and the fitter reading it.
+_worker_state = {}
+
+def _init_worker(shm_name, shape, dtype):
+    '''Attaches a new worker process to the mask in shared memory.'''
+    _worker_state["shm"] = shared_memory.SharedMemory(name=shm_name)
+    img_arr = np.ndarray(shape, dtype=dtype, buffer=_worker_state["shm"].buf)
+    _worker_state["fitter"] = CircleFitter(img_arr)
+
+def _label_plant_type(task):
+    '''Pool task fitting the circles of one plant type.'''
+    return label_plant_type(_worker_state["fitter"], *task)
+
+def fit_circles(img_arr, tasks, processes=1):
+    '''Fits the circles of the plants of a mask, a list of circles per task.
+    Plant types are independent of each other, with processes > 1 they are fit in a
+    pool of worker processes sharing the mask.
+    img_arr: RGB mask, see read_mask
+    tasks: arguments of label_plant_type after the fitter, one tuple per plant type
+    processes: number of worker processes
+    '''
+    if processes > 1 and len(tasks) > 1:
+        shm = shared_memory.SharedMemory(create=True, size=img_arr.nbytes)
+        try:
+            np.ndarray(img_arr.shape, dtype=img_arr.dtype, buffer=shm.buf)[:] = img_arr
+            with mp.Pool(min(processes, len(tasks)), initializer=_init_worker,
+                         initargs=(shm.name, img_arr.shape, img_arr.dtype)) as pool:
+                return list(tqdm(pool.imap(_label_plant_type, tasks), total=len(tasks)))
+        finally:
+            shm.close()
+            shm.unlink()
+    fitter = CircleFitter(img_arr)
+    return [label_plant_type(fitter, *task) for task in tqdm(tasks)]
+
+def label_circles_BFS(path, show_res=False, side=None, sim_circle_path=None, day=None, prior_path=None, processes=1, cache=None):
+    '''Fits circles to the plants of a mask, starting from their priors, see fit_circles.
+    With a StageCache, the circles are keyed by the contents of the mask and the priors
+    and only fit if the cache misses.
+    side: 'l' or 'r', the half of the garden whose priors are used, of prior_path if given,
+    and the half of the mask the circles are fit to, see MASK_SIDES
+    '''
     print("BFS Fit for: "+path)
-    priors = get_recent_priors(prior_path)[1] if prior_path else get_recent_priors(path=PRIOR_PATH, side=side)
-    new_circles = {plant_type: [] for plant_type in priors.keys()}
+    priors = get_recent_priors(prior_path)[0 if side == 'l' else 1] if prior_path else get_recent_priors(path=PRIOR_PATH, side=side)
     print(sim_circle_path)
     use_sim = sim_circle_path != None and day != None
     if use_sim:
         max_radius_dict = query_sim_radius_range(sim_circle_path, day)
+    tasks = [(plant_type, priors[plant_type], max_radius_dict[plant_type.replace("-","_")] if use_sim and priors[plant_type] else None)
+             for plant_type in priors.keys()]
     # Iterate over each plant type
-    for plant_type in tqdm(priors.keys()):
-        old_circles = priors[plant_type]
-        # Get radius models
-        rad_models = (get_model_coeff("min", plant_type),
-                      get_model_coeff("max", plant_type))
-        for idx, circle in enumerate(sorted(old_circles, key=lambda p: p["circle"][1])):
-            # circle = {"circle":circle, "days_post_germ": 10}
-            new_c = {}
-            center = circle["circle"][0]
-            center = (round(center[0]), round(center[1]))
-            prev_rad = circle["circle"][1]
-            day = circle["days_post_germ"]+1
-            min_rad, max_rad = 50, max(55, max_radius_dict[plant_type.replace("-","_")][idx][0]*.9) if use_sim else get_radius_range(day, prev_rad, rad_models)
-            try:
-                c, max_p = bfs_circle(path, center, max_rad, min_rad, plant_type, side=side, taken_circles=new_circles[plant_type])
-                r = abs(distance(c, max_p))
-            except ZeroDivisionError:
-                # traceback.print_exc()
-                #TODO ADD WILTING LOGIC
-                if day > 10:
-                    # prev_rad = radial_wilt(prev_rad)
-                    "pass"
-                r, c, max_p = abs(prev_rad), center, (center[0]+prev_rad, center[1])
-                # print("Zero div at: " + str(c))
-            if day > r and day < 20:
-                r = 0
-            if r <= prev_rad*.9 and prev_rad > 55:
-                r = prev_rad*.9
-            if r*.7 > prev_rad  and prev_rad > 55:
-                r = prev_rad*1.1
-            if distance(center, c) > 50:
-                direction_vec = [c[i] - center[i] for i in range(2)]
-                direction_vec = direction_vec / np.linalg.norm(direction_vec)
-                # Solve for moving the original point 50 units in the direction of the new vector.
-                # As long as the vector is normalized the answer is 5*root2, and independent of the vectors
-                # pretty neat!
-                scale_factor = 5*sqrt(2)
-                c = [c[i] + scale_factor*direction_vec[i] for i in range(2)]
-            new_c["circle"], new_c["days_post_germ"] = (c, r, max_p), day
-            # computed_type = COLORS_TO_TYPES[find_color(c, get_img(path)[1])[0]]
-            new_circles[plant_type].append(new_c)
+    fit = lambda: fit_circles(read_mask(path, MASK_SIDES.get(side)), tasks, processes)
+    if cache is None:
+        results = fit()
+    else:
+        _, results = cache.run("circles", fit, file_digest(path), side, tasks,
+                               file_digest(MIN_RADIUS_MODELS_PATH), file_digest(MAX_RADIUS_MODELS_PATH),
+                               CIRCLE_FIT_VERSION, COLOR_TOLERANCE, END_RATIO, MIN_RADIUS)
+    new_circles = {task[0]: circles for task, circles in zip(tasks, results)}
 
     date = path[path.find("-2")+1:path.find("-2")+7]
     save_priors(new_circles, date, side)
@@ -103,10 +178,11 @@ def label_circles_contours(path, show_res=False):
 ######### Public ###########
 ############################
 
-def process_image(path: str, save_circles: bool = False, crop: bool = False, side: str = None, sim_circle_path="", prior_path="") -> dict:
+def process_image(path: str, save_circles: bool = False, crop: bool = False, side: str = None, sim_circle_path="", prior_path="", cache=None) -> dict:
     '''
     @param path: string representing path of the uncropped image
     @param save_circles: optionally saves circles to center_constants.py/CIRCLE_PATH
+    @param cache: optional StageCache reusing the circles of an unchanged mask and priors
     @return dictionary of circles formatted like:
         {
             "arugula": [
@@ -129,7 +205,8 @@ def process_image(path: str, save_circles: bool = False, crop: bool = False, sid
     print("Labeling circles: "+ mask_path)
     print(os.getcwd())
     day = pickle.load(open("./timestep.p", "rb"))
-    return label_circles_BFS(mask_path, True, side, day=day, sim_circle_path=real_circles_paths[-1], prior_path=priors_paths[-1])
+    return label_circles_BFS(mask_path, True, side, day=day, sim_circle_path=real_circles_paths[-1], prior_path=priors_paths[-1],
+                             processes=LABEL_PROCESSES, cache=cache)
 
 # if __name__ == "__main__":
 #     print("=" * 20)
@@ -17,6 +17,9 @@ python3 linearity.py {PRIOR_PATH} {MASK_PATH}
 
 '''
 
+# The extrema of a plant are searched within this multiple of its prior radius.
+LEAF_SEARCH_SCALE = 1.2
+
 def get_plant_type(center, img_arr):
     center = (round(center[0]), round(center[1]))
     rgb_center, first_color_pixel = find_color(center, img_arr)
@@ -36,12 +39,22 @@ def get_nearby_contours(contours, center, inverted, radius):
     return list(filter(lambda cnt: distance(center, np.average(cnt[0], axis=0)) < radius, contours))
 
 
-def get_edge_points(center, img, img_arr, radius):
-    plant_type = get_plant_type(center, img_arr)
+def get_type_contours(plant_type, img):
     binary_mask = prepare_binary_mask(plant_type, img)
     gray_scaled_mask = cv2.cvtColor(binary_mask, cv2.COLOR_BGR2GRAY)
     inverted = cv2.bitwise_not(binary_mask)
     contours, hierarchy = cv2.findContours(gray_scaled_mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    return contours, inverted
+
+def get_edge_points(center, img, img_arr, radius, type_contours=None):
+    '''Contours of the plant type at center near it. type_contours caches the contours
+    of each plant type across the plants of one mask.'''
+    plant_type = get_plant_type(center, img_arr)
+    if type_contours is None:
+        type_contours = {}
+    if plant_type not in type_contours:
+        type_contours[plant_type] = get_type_contours(plant_type, img)
+    contours, inverted = type_contours[plant_type]
     contours = get_nearby_contours(contours, center, inverted, radius)
     return contours
 
@@ -98,9 +111,9 @@ def prune_extrema(extrema, radius, center):
     return new_extrema
 
 
-def get_extrema(center, path, radius=100):
-    img, img_arr = get_img(path)
-    edges = get_edge_points(center, img, img_arr, radius)
+def get_extrema(center, path, radius=100, img=None, type_contours=None):
+    img, img_arr = get_img(path) if img is None else (img, np.asarray(img))
+    edges = get_edge_points(center, img, img_arr, radius, type_contours)
     max_extrema = find_max_extrema(center, img, img_arr, edges, radius)
     extrema = [max_extrema]
     for _ in range(50):
@@ -118,8 +131,12 @@ def get_max_leaf_centers(prior, mask_path, only_right=False):
         :mask_path: Path of the mask being used to
     Returns
         :extreme_pts: The leaf centers according to the algorithm
+
+    The mask is read and the contours of each plant type are found once for all plants.
     '''
     extreme_pts = []
+    img, _ = get_img(mask_path)
+    type_contours = {}
     for key in tqdm(prior[1]):
         if not key or key == 'arugula' or key == 'sorrel':
             continue
@@ -127,7 +144,7 @@ def get_max_leaf_centers(prior, mask_path, only_right=False):
             center, r = p["circle"][0:2]
             if only_right and center[0] < 1630: #Value to be tuned to dictate each half of garden
                 continue
-            extrema = get_extrema(center, mask_path, 1.2*r)
+            extrema = get_extrema(center, mask_path, LEAF_SEARCH_SCALE*r, img, type_contours)
             extreme_pts.append((center, get_leaf_center(max(extrema, key=lambda p: distance(center, p)), center)))
     return extreme_pts
 
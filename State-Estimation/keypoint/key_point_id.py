@@ -19,6 +19,7 @@ import numpy.linalg as la
 
 ## Clustering Imports
 import scipy.cluster.hierarchy as hcluster
+from scipy.ndimage import maximum_filter
 from sklearn.neighbors import NearestCentroid
 from sklearn.decomposition import PCA
 import cv2
@@ -38,6 +39,7 @@ from utils.constants import *
 shrink = 2
 
 MODEL_PATH = './models/leaf_keypoints.pth'
+KEYPOINT_BATCH_SIZE = 16
 
 def naive_centroid(arr):
         """ Find the centroid for a set of points
@@ -116,6 +118,43 @@ def eval_image(img_arr, model, transf = transf, device = 0):
         y_hat,_ = model(transf(img_arr).unsqueeze(0).cpu())
     return y_hat[0,0].cpu().detach().numpy(), y_hat
 
+def eval_images(img_arrs, model, transf = transf, batch_size = KEYPOINT_BATCH_SIZE, device = 0):
+    '''Apply the model on images in batches
+    Params
+        :list img_arrs: images to apply model on, of one size after transf
+        :CountEstimate model: model to apply
+        :TorchVision Transform transf: transform to use for images,
+                                leave this as default for most uses
+        :int batch_size: number of images per forward pass
+
+    Return
+        :numpy arr: heatmap outputs, one per image
+        :numpy arr: leaf counts, the sum of each heatmap
+
+    The model is put in eval mode, so batch norm uses its running statistics
+    and the heatmap of an image does not depend on the rest of its batch.
+    The heatmaps and counts differ from eval_image, which leaves the model in
+    train mode and normalizes each image by its own statistics.
+
+    Sample usage:
+    >>> eval_images([test_im1, test_im2], model)
+    heatmaps, counts
+    '''
+    model.eval()
+    heatmaps, counts = [], []
+    with torch.inference_mode():
+        for start in range(0, len(img_arrs), batch_size):
+            batch = torch.stack([transf(Image.fromarray(img_arr)) for img_arr in img_arrs[start:start + batch_size]])
+            if next(model.parameters()).is_cuda:
+                y_hat,_ = model(batch.cuda(device))
+            else:
+                y_hat,_ = model(batch.cpu())
+            heatmaps.append(y_hat[:,0].cpu().numpy())
+            counts.append(y_hat.flatten(1).sum(1).cpu().numpy())
+    if not heatmaps:
+        return np.empty((0,0,0)), np.empty(0)
+    return np.concatenate(heatmaps), np.concatenate(counts)
+
 
 # Adapted From: https://stackoverflow.com/a/44874588
 def create_circular_mask(h, w, center=None, radius=None, area_scale =4):
@@ -217,6 +256,47 @@ def recursive_cluster(heatmap, leaves_remaining, masked, pts = np.empty((0,2)),
         return pts
     return recursive_cluster(norm_map,leaves_remaining-len(clusterpts), masked, pts)
 
+def find_keypoints(heatmap, leaves, masked, thres = 0.3, radius = 7, flip_coords = False):
+    '''Find the keypoints of the heatmap as its peaks, by non-max suppression
+    Params
+        :numpy arr heatmap: heatmap output from the model
+        :int leaves: number of leaves the model counted
+        :numpy arr masked: the masked plant image from the segmentation mask
+        :double thres: normalized heat above which every peak is a keypoint
+        :int radius: distance within which a peak suppresses weaker ones
+        :bool flip_coords: whether to swap x/y for the black point checking
+
+    Return
+        :numpy arr: array of keypoints from the heatmap, cv2 style, strongest first
+
+    Peaks on black points of masked are dropped. All peaks above thres are
+    keypoints, if they are fewer than leaves the strongest weaker peaks make up
+    the difference, like the lowered thresholds of recursive_cluster.
+
+    Sample usage:
+    >>> find_keypoints(heatmap, 5, masked)
+    array of points
+    '''
+    if leaves <= 0 or np.max(heatmap) == np.min(heatmap):
+        return np.empty((0,2))
+    norm_map = (heatmap-np.min(heatmap))/(np.max(heatmap)-np.min(heatmap))
+    footprint = create_circular_mask(2*radius+1, 2*radius+1, center = (radius,radius), radius = radius, area_scale=1)
+    peaks = (norm_map == maximum_filter(norm_map, footprint=footprint, mode='constant')) & (norm_map > 0)
+    rows, cols = np.nonzero(peaks)
+    order = np.argsort(-norm_map[rows, cols], kind='stable')
+    rows, cols = rows[order], cols[order]
+    # Flat peaks are maxima at several points, keep the first of each.
+    keep = np.ones(len(rows), dtype=bool)
+    for i in range(len(rows)):
+        if keep[i]:
+            keep[i+1:] &= (rows[i+1:] - rows[i])**2 + (cols[i+1:] - cols[i])**2 > radius**2
+    rows, cols = rows[keep], cols[keep]
+    check = masked[rows, cols] if not flip_coords else masked[cols, rows]
+    on_plant = np.any(check.reshape(len(rows), -1) != 0, axis=1)
+    rows, cols = rows[on_plant], cols[on_plant]
+    found = max(np.count_nonzero(norm_map[rows, cols] > thres), min(leaves, len(rows)))
+    return np.stack((rows[:found], cols[:found]), axis=1).astype(float)
+
 def point_to_overhead(point, mask_center, input_size, scale = 4*1/0.75, orig_offset = (0,0)):
     '''Converts a point to the overhead space
     Params
@@ -306,32 +386,32 @@ def get_keypoints(mask_path, overhead_path, priors_path, model_path, date = "000
         vals[plant[3]][f'{date}_{cut_idx}'] = [shrink_im(plant[0], tuple(size//shrink), tuple(size)), 1.5* plant[2] //shrink, plant[1], 
                                     shrink_im(plant[4], tuple(size//shrink), tuple(size),which="L"), plant[5], plant[6]]
     leaf_centers  = []
-    for pt in list(vals.keys()):    
-        for rc in list(vals[pt].keys()):
-            plant = vals[pt][rc]
-            t = eval_image(plant[0],model)
-            center = np.array(plant[0].shape)
-            plant_mask  = create_circular_mask(*plant[0].shape[:2], center = center//2, radius = plant[1])
-            t_arr = mask_im(np.asarray(t[0]), plant_mask)
-            pts = recursive_cluster(t_arr, round(t[1].sum().item()), plant[0])
-            pts = remove_keypoints(pts,plant[3],inner_thres=plant[1]*0.01)
-            if save_raw:
-                mask = np.copy(plant[0])
-                for x,y in pts:
-                    x,y = int(x), int(y)
-                    mask = cv2.rectangle(mask,(x-1,y-1),(x+1,y+1), (255,255,255),-1)
-            im_size = np.array(plant[0].shape[:2])
-            converted_pts = np.array([point_to_overhead(pt, plant[2], plant[0].shape[:2],
-                                    scale=min(im_size/(im_size//shrink))*plant[4], orig_offset = plant[5]) for pt in pts]).astype(int)
-            leaf_centers.append({
-                                    'plant_type':pt, 
-                                    'mask_center': tuple(np.array(plant[2]).astype(int)), 
-                                    'leaves': converted_pts, 
-                                    'original':pts, 
-                                    'id_name':rc, 
-                                    'radius':plant[1]*shrink,
-                                    'localized_im': mask if save_raw else None
-                                })
+    keys = [(pt, rc) for pt in vals for rc in vals[pt]]
+    heatmaps, leaf_counts = eval_images([vals[pt][rc][0] for pt, rc in keys], model)
+    for (pt, rc), heatmap, leaf_count in zip(keys, heatmaps, leaf_counts):
+        plant = vals[pt][rc]
+        center = np.array(plant[0].shape)
+        plant_mask  = create_circular_mask(*plant[0].shape[:2], center = center//2, radius = plant[1])
+        t_arr = mask_im(heatmap, plant_mask)
+        pts = find_keypoints(t_arr, round(float(leaf_count)), plant[0])
+        pts = remove_keypoints(pts,plant[3],inner_thres=plant[1]*0.01)
+        if save_raw:
+            mask = np.copy(plant[0])
+            for x,y in pts:
+                x,y = int(x), int(y)
+                mask = cv2.rectangle(mask,(x-1,y-1),(x+1,y+1), (255,255,255),-1)
+        im_size = np.array(plant[0].shape[:2])
+        converted_pts = np.array([point_to_overhead(pt, plant[2], plant[0].shape[:2],
+                                scale=min(im_size/(im_size//shrink))*plant[4], orig_offset = plant[5]) for pt in pts]).astype(int)
+        leaf_centers.append({
+                                'plant_type':pt, 
+                                'mask_center': tuple(np.array(plant[2]).astype(int)), 
+                                'leaves': converted_pts, 
+                                'original':pts, 
+                                'id_name':rc, 
+                                'radius':plant[1]*shrink,
+                                'localized_im': mask if save_raw else None
+                            })
     return leaf_centers
 
 def generate_image(leaf_centers, overhead_path, raw_img = False):
@@ -6,6 +6,7 @@ from center_tracking.linearity import *
 from utils.centers_test import *
 from datetime import date
 from segmentation.run import *
+from utils.stage_cache import StageCache, file_digest
 
 '''
 How to run this script:
@@ -13,6 +14,10 @@ python3 track.py "snc-<>.jpg"
 
 '''
 
+# Corners of the garden bed in the overhead image, see correct_image.
+CROP_CORNERS = ((350.74890171959316, 596.1321074432035), (3998.9477218526417, 609.436990084097), (4006.9306514371774, 2371.0034517384215), (318.81718338144833, 2325.7668507593826))
+#PRIOR TO 8/12: (93.53225806451621, 535.8709677419356), (3765.064516129032, 433.2903225806449), (3769.3387096774195, 2241.274193548387), (144.82258064516134, 2241.274193548387))
+
 def process_targets(leaf_centers, type_dic, plants_to_prune):
     '''
     Filter leaf centers by the plants we want to prune.
@@ -41,16 +46,18 @@ if __name__ == "__main__":
     out/circles/<yy><mm><dd>_circles.p          --> dictionary for plant centers/radius
     out/plants_to_prune.p                       --> list of plants to prune from sim
     sim_prune/                                  --> past plants to prune [ADD CODE IN GARDEN.PY]
+    out/cache/<stage>/<key>.p                   --> cached stage outputs, keyed by their inputs
     '''
 
     print("------------------------------CENTER TRACKING-----------------------------------")
     f = sys.argv[1]
     side = sys.argv[2]
     cwd = os.getcwd()
+    # Stages whose inputs did not change since an earlier run are loaded from the cache.
+    cache = StageCache()
 
-    img = cv2.cvtColor(cv2.imread(f), cv2.COLOR_BGR2RGB)
-    new_im = correct_image(img, (350.74890171959316, 596.1321074432035), (3998.9477218526417, 609.436990084097), (4006.9306514371774, 2371.0034517384215), (318.81718338144833, 2325.7668507593826))
-    #PRIOR TO 8/12: (93.53225806451621, 535.8709677419356), (3765.064516129032, 433.2903225806449), (3769.3387096774195, 2241.274193548387), (144.82258064516134, 2241.274193548387))
+    crop = lambda: correct_image(cv2.cvtColor(cv2.imread(f), cv2.COLOR_BGR2RGB), *CROP_CORNERS)
+    _, new_im = cache.run("cropped", crop, file_digest(f), CROP_CORNERS)
     imsave('./out/cropped/' + f, new_im)
 
     # d_0 = date(2021, 7, 5)
@@ -61,7 +68,7 @@ if __name__ == "__main__":
     print("------------------------------Segmentation-----------------------------------------")
     # get_img_seg_mask(f[:-4])
 
-    circles_dic, type_dic = process_image("cropped/" + f, True, True, side)
+    circles_dic, type_dic = process_image("cropped/" + f, True, True, side, cache=cache)
     pkl.dump(type_dic, open("current_type_dic_"+side+".p", "wb"))
     pkl.dump(circles_dic, open("current_dic_"+side+".p", "wb"))
 
@@ -79,12 +86,12 @@ if __name__ == "__main__":
         folder = 'left/'
     prior = get_recent_priors(cwd + "/out/priors/" + folder + "priors" + f[4:10] + ".p")
     mask_path = str(cwd + "/out/post_process/" + f[:-4] + ".png")
-    mask, _ = get_img(mask_path)
 
     # # This gets the actual overhead image
     # # real_path = "input/new_garden/snc-21052608141500.jpg"
 
-    leaf_centers = get_max_leaf_centers(prior, mask_path, True)
+    _, leaf_centers = cache.run("leaf_centers", lambda: get_max_leaf_centers(prior, mask_path, True),
+                                file_digest(mask_path), prior, True, LEAF_SEARCH_SCALE)
 
     print("LEAF CENTERS: (center, target)")
     print(leaf_centers)
@@ -5,6 +5,8 @@ MAX_RADIUS_MODELS_PATH = "./models/growth_models/max_log_models.p"
 MIN_RADIUS_MODELS_PATH = "./models/growth_models/min_log_models.p"
 COLOR_TOLERANCE = 50
 IMAGE_NAME_PREFIX = "snc"
+# Worker processes fitting the circles of different plant types in parallel, see label_circles_BFS
+LABEL_PROCESSES = 8
 COLORS = [
     (0, 0, 0),
     (255, 174, 1),
@@ -0,0 +1,117 @@
+import cv2
+import numpy as np
+from utils.center_constants import *
+from utils.geometry_utils import *
+from utils.centers_test import get_img, find_color, calculate_color_range
+
+#: Share of plant pixels in the last ring of a growing disk under which the plant ended.
+END_RATIO = .1
+
+
+def pixels_by_distance(center, shape, reach):
+    '''Returns the x and y coordinates and squared distances of the pixels of the image
+    within reach of center (measured along the axes), in the order a BFS popping the
+    closest pixel first visits them: by squared distance, then x, then y.
+    center: (x, y) pixel
+    shape: shape of the image
+    reach: half size of the searched box
+    '''
+    xs = np.arange(max(center[0] - reach, 0), min(center[0] + reach + 1, shape[1]))
+    ys = np.arange(max(center[1] - reach, 0), min(center[1] + reach + 1, shape[0]))
+    xs, ys = np.meshgrid(xs, ys)
+    xs, ys = xs.ravel(), ys.ravel()
+    sq = (xs - center[0]) ** 2 + (ys - center[1]) ** 2
+    # Pixels further than reach along an axis come after the axis pixels at reach.
+    keep = sq <= reach ** 2
+    xs, ys, sq = xs[keep], ys[keep], sq[keep]
+    order = np.lexsort((ys, xs, sq))
+    return xs[order], ys[order], sq[order]
+
+
+def grow_plant_region(center, plant_mask, max_radius, min_radius, end_ratio=END_RATIO):
+    '''Finds the plant pixels around center by growing a disk until the share of plant
+    pixels in it drops under end_ratio or it gets wider than max_radius, but not before
+    it is min_radius wide. Returns the x and y coordinates of the plant pixels in the disk.
+    center: (x, y) pixel, the prior center
+    plant_mask: boolean image of the pixels of the plant's color
+    max_radius: max search distance
+    min_radius: min radius for searching
+    end_ratio: share of plant pixels under which the plant ended
+    '''
+    reach = int(np.ceil(max(max_radius, min_radius))) + 1
+    xs, ys, sq = pixels_by_distance(center, plant_mask.shape, reach)
+    is_plant = plant_mask[ys, xs]
+    # The share is counted like the BFS window, which starts with one extra entry.
+    share = np.cumsum(is_plant) / np.arange(2, len(xs) + 2)
+    dist = np.sqrt(sq)
+    ended = ((share < end_ratio) | (dist > max_radius)) & ~(dist < min_radius)
+    stop = np.argmax(ended) if ended.any() else len(xs) - 1
+    is_plant[stop + 1:] = False
+    return xs[is_plant], ys[is_plant]
+
+
+def read_mask(path, side=None):
+    '''Reads a segmentation mask and blacks out the other half if side is given.
+    path: relative path of the mask
+    side: 'left' or 'right' to only keep that half of the mask
+    '''
+    img, _ = get_img(path)
+    x, y, z = img.shape
+    if side == 'right':
+        cv2.rectangle(img, (0, 0), (y // 2, x), (0,0,0), -1)
+    if side == 'left':
+        cv2.rectangle(img, (y // 2, 0), (y, x), (0,0,0), -1)
+    return np.asarray(img)
+
+
+class CircleFitter:
+    def __init__(self, img_arr):
+        '''Fits circles to the plants of a segmentation mask. The pixels of each plant
+        color are found once, for all circles fit to the mask.
+        img_arr: RGB mask, see read_mask
+        '''
+        self.img_arr = img_arr
+        self.plant_masks = {}
+
+    def plant_mask(self, color):
+        '''Returns the boolean image of the pixels within COLOR_TOLERANCE of color that
+        are not black, the plant pixels of convert_to_plant_colorspace.
+        '''
+        color = tuple(color)
+        if color not in self.plant_masks:
+            lower_bound, upper_bound = calculate_color_range(color, COLOR_TOLERANCE)
+            in_range = np.all((self.img_arr >= lower_bound) & (self.img_arr <= upper_bound), axis=-1)
+            self.plant_masks[color] = in_range & np.any(self.img_arr > 100, axis=-1)
+        return self.plant_masks[color]
+
+    def fit(self, old_center, max_radius=100, min_radius=40, plant_type=None, taken_circles=tuple()):
+        '''Finds the circle of the plant at old_center, same as bfs_circle.
+        Returns the center and the plant pixel furthest from it (capped at max_radius).
+        old_center: prior center
+        max_radius: max search distance
+        min_radius: min radius for searching
+        plant_type: type of the plant, the color closest to old_center if None
+        taken_circles: circles of plants already fit, whose pixels are left out
+        '''
+        color = TYPES_TO_COLORS[plant_type] if plant_type != None else find_color(old_center, self.img_arr)[0]
+        reach = int(np.ceil(max(max_radius, min_radius))) + 1
+        top, left = max(old_center[1] - reach, 0), max(old_center[0] - reach, 0)
+        plant_mask = self.plant_mask(color)[top:old_center[1] + reach + 1, left:old_center[0] + reach + 1]
+        if len(taken_circles):
+            taken = np.zeros(plant_mask.shape, dtype=np.uint8)
+            for circ_dict in taken_circles:
+                circ = circ_dict["circle"]
+                if int(round(circ[1])) >= 0:
+                    cv2.circle(taken, (int(circ[0][0]) - left, int(circ[0][1]) - top), int(round(circ[1])), 1, -1)
+            plant_mask = plant_mask & (taken == 0)
+
+        xs, ys = grow_plant_region((old_center[0] - left, old_center[1] - top), plant_mask, max_radius, min_radius)
+        if not len(xs):
+            raise ZeroDivisionError("no plant pixels around " + str(old_center))
+        xs, ys = xs + left, ys + top
+        center = (int(xs.sum()) / len(xs), int(ys.sum()) / len(ys))
+        center = ((center[0] + old_center[0]) / 2, (center[1] + old_center[1]) / 2)
+        # float_power rounds like ** on python floats, which sq_distance uses.
+        extreme = np.argmax(np.float_power(xs - center[0], 2) + np.float_power(ys - center[1], 2))
+        extreme_pt = (int(xs[extreme]), int(ys[extreme]))
+        return center, min(extreme_pt, (center[0]+max_radius, center[1]), key=lambda p: sq_distance(center, p))
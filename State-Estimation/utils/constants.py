@@ -7,6 +7,13 @@ MODEL_PATH = './models'
 IM_WIDTH = 512
 IM_HEIGHT = 512
 
+# Tiled inference on full overhead images, see utils/tiled_inference.py
+TILE_STRIDE = 512
+TILE_BATCH_SIZE = 8
+
+# Per channel tolerance when matching mask pixels to plant type colors, see utils/mask_codec.py
+MASK_COLOR_TOLERANCE = 5
+
 N_CLASSES = 9
 BATCH_SIZE = 32
 N_EPOCHS = 125
@@ -107,6 +114,7 @@ CROPPED_LOC = './out/cropped/'
 FIGURES_LOC = './out/figures/'
 PRIORS = './out/priors/'
 PRUNE_POINTS = './out/prune_points'
+CACHE_LOC = './out/cache/'
 
 GARDEN_DATE_YEAR = 2021
 GARDEN_DATE_MONTH = 7
@@ -9,6 +9,8 @@ from skimage.transform import resize
 from skimage.io import imread, imshow, concatenate_images,imsave
 from tqdm import tqdm_notebook, tnrange
 from utils.constants import *
+from utils.tiled_inference import generate_label_and_score_maps
+from utils.mask_codec import colors_to_labels, labels_to_colors, confidence_map, correct_density_map, sensitive_map
 from statistics import *
 import copy
 from math import *
@@ -75,50 +77,16 @@ def plot_loss_curve(results, title):
   print("plot_loss_curve saved")
 
 
-def generate_full_label_map(test_id, test_image, model):
-    base_map = np.full((test_image.shape[0], test_image.shape[1]), 0)
-    prescor = np.full((test_image.shape[0], test_image.shape[1]), 0.)
-    for i in np.arange(0, test_image.shape[0] - IM_HEIGHT, 512):
-        for j in np.arange(0, test_image.shape[1] - IM_WIDTH, 512):
-            temp = np.zeros((1, IM_HEIGHT, IM_WIDTH, 3))
-            temp[0] = test_image[i:i+IM_HEIGHT, j:j+IM_WIDTH]
-            prediction = np.argmax(model.predict(temp)[0], axis=-1)
-            scor = np.amax(model.predict(temp)[0], axis=-1)
-            for x in np.arange(prediction.shape[0]):
-                for y in np.arange(prediction.shape[1]):
-                    base_map[i+x][j+y] = prediction[x][y]
-                    prescor[i+x][j+y] = scor[x][y]
-        if j<test_image.shape[1] - IM_WIDTH:
-            j = test_image.shape[1] - IM_WIDTH
-            temp = np.zeros((1, IM_HEIGHT, IM_WIDTH, 3))
-            temp[0] = test_image[i:i+IM_HEIGHT, j:j+IM_WIDTH]
-            prediction = np.argmax(model.predict(temp)[0], axis=-1)
-            scor = np.amax(model.predict(temp)[0], axis=-1)
-            for x in np.arange(prediction.shape[0]):
-                for y in np.arange(prediction.shape[1]):
-                    base_map[i+x][j+y] = prediction[x][y]
-                    prescor[i+x][j+y] = scor[x][y]
-        if i<test_image.shape[0] - IM_HEIGHT:
-            i = test_image.shape[0] - IM_HEIGHT
-            for j in np.arange(0, test_image.shape[1] - IM_WIDTH+1, 512):
-                temp = np.zeros((1, IM_HEIGHT, IM_WIDTH, 3))
-                temp[0] = test_image[i:i+IM_HEIGHT, j:j+IM_WIDTH]
-                prediction = np.argmax(model.predict(temp)[0], axis=-1)
-                scor = np.amax(model.predict(temp)[0], axis=-1)
-                for x in np.arange(prediction.shape[0]):
-                    for y in np.arange(prediction.shape[1]):
-                        base_map[i+x][j+y] = prediction[x][y]
-                        prescor[i+x][j+y] = scor[x][y]
-            if j<test_image.shape[1] - IM_WIDTH:
-                j = test_image.shape[1] - IM_WIDTH
-                temp = np.zeros((1, IM_HEIGHT, IM_WIDTH, 3))
-                temp[0] = test_image[i:i+IM_HEIGHT, j:j+IM_WIDTH]
-                prediction = np.argmax(model.predict(temp)[0], axis=-1)
-                scor = np.amax(model.predict(temp)[0], axis=-1)
-                for x in np.arange(prediction.shape[0]):
-                    for y in np.arange(prediction.shape[1]):
-                        base_map[i+x][j+y] = prediction[x][y]
-                        prescor[i+x][j+y] = scor[x][y]
+def generate_full_label_map(test_id, test_image, model, blend=False):
+    """ Outputs a label matrix of predicted plant type and the matrix of its
+        scores given a model and overhead image.
+        args
+            test_id name of the overhead image
+            test_image RGB overhead image
+            model Semantic segmentation model used for prediction
+            blend average the softmaxes of overlapping tiles
+    """
+    base_map, prescor = generate_label_and_score_maps(test_image, model, blend=blend)
     print('base_map shape', base_map.shape)
     # print('saved to', './prediction_matrix/{}.npy'.format(test_id))
     # np.save('./prediction_matrix/{}.npy'.format(test_id), base_map)
@@ -137,33 +105,6 @@ def generate_full_label_map(test_id, test_image, model):
 
 
 
-def colors_to_labels(original_mask):
-    ground_truth_label_map = np.full((original_mask.shape[0],original_mask.shape[1]), 0)
-    count = 0
-    plant_types = TYPES
-    pixel_locations = {}
-    for typep in plant_types:
-        color = TYPES_TO_COLORS[typep]
-        indices = np.where(np.all(np.abs(original_mask - np.full(original_mask.shape, color)) <= 5, axis=-1))
-        pixel_locations[typep] = zip(indices[0], indices[1])
-
-    for typep in pixel_locations:
-        type_indices = pixel_locations[typep]
-        for type_index in type_indices:
-            # ground_truth_label_map[type_index[0], type_index[1]] = BINARY_ENCODINGS[typep].index(1)
-            ground_truth_label_map[type_index[0], type_index[1]] = LABEL_ENC[typep]
-        count += 1
-
-    return ground_truth_label_map
-
-def labels_to_colors(label_map):
-    predicted_mask = np.full((label_map.shape[0], label_map.shape[1], 3), 0)
-    for j in range(len(COLORS)):
-        pred_indices = np.argwhere(label_map == j)
-        for pred_index in pred_indices:
-            predicted_mask[pred_index[0], pred_index[1], :] = COLORS[j]
-    return predicted_mask
-
 def iou_score(target, prediction, label):
     target_tf = (np.array(target) == label)
     pred_tf = (np.array(prediction) == label)
@@ -272,36 +213,6 @@ def condidence_interval(scor, indices):
         total += scor[x][y]
     return total / len(scor)
 
-def confidence_map(label_map,scor):
-  dmap = np.full((label_map.shape[0], label_map.shape[1], 3), 0)
-  for x in np.arange(label_map.shape[0]):
-    for y in np.arange(label_map.shape[1]):
-        dmap[x,y,:] = (255, int(255*scor[x,y]), int(255*scor[x,y]))
-  return dmap
-
-def correct_density_map(truth_label_map,label_map,scor):
-  dmap = np.full((label_map.shape[0], label_map.shape[1], 3), 0)
-  for x in np.arange(truth_label_map.shape[0]):
-    for y in np.arange(truth_label_map.shape[1]):
-      if truth_label_map[x][y] != label_map[x][y]:
-        # dmap[x,y,:] = (int(100*scor[x,y]), int(100*scor[x,y]), 255)
-        dmap[x,y,:] = (0, 0, 0)
-      else:
-        dmap[x,y,:] = (int(255*scor[x,y]), int(255*scor[x,y]), 255)
-  return dmap
-
-def sensitive_map(truth_label_map,label_map,scor):
-  dmap = np.full((label_map.shape[0], label_map.shape[1], 3), 0)
-  for x in np.arange(truth_label_map.shape[0]):
-    for y in np.arange(truth_label_map.shape[1]):
-      if truth_label_map[x][y] == label_map[x][y]:
-        # dmap[x,y,:] = (int(100*scor[x,y]), int(100*scor[x,y]), 255)
-        dmap[x,y,:] = (0, 0, 0)
-      else:
-        dmap[x,y,:] = (255, min(int(255*scor[x,y]) * 3, 255), min(int(255*scor[x,y]) * 3, 255))
-  return dmap
-
-
 def output_prediction_images(id_, model, path):
 
     date1 = date(GARDEN_DATE_YEAR, GARDEN_DATE_MONTH, GARDEN_DATE_DAY)
@@ -359,7 +270,90 @@ def calc_multiplier(day):
 def calc_max_contour(day):
     return day * 250
 
+def contour_distance_map(cntr, rect):
+    """ Outputs the distance of every pixel of the bounding box of a contour to the
+        nearest pixel of its outline, and which pixels of the box it encloses.
+        args
+            cntr contour from cv2.findContours
+            rect (x, y, w, h) bounding box of the contour
+    """
+    x, y, w, h = rect
+    outline = np.full((h, w), 255, dtype=np.uint8)
+    cv2.drawContours(outline, [cntr], -1, 0, 1, offset=(-x, -y))
+    enclosed = np.zeros((h, w), dtype=np.uint8)
+    cv2.drawContours(enclosed, [cntr], -1, 1, -1, offset=(-x, -y))
+    return cv2.distanceTransform(outline, cv2.DIST_L2, cv2.DIST_MASK_PRECISE), enclosed.astype(bool)
+
+def near_contour(cntr, rect, dist_map, enclosed, rows, cols, max_dist):
+    """ Outputs whether pixels are inside a contour or at most max_dist outside of it,
+        cv2.pointPolygonTest(cntr, pixel, True) >= -max_dist.
+        The outline runs through pixels at most a diagonal step apart, so the distance
+        map overestimates the distance to the contour by less than a pixel. Only the
+        pixels in that band are tested with cv2.pointPolygonTest.
+        args
+            cntr contour from cv2.findContours
+            rect (x, y, w, h) bounding box of the contour
+            dist_map, enclosed see contour_distance_map
+            rows, cols pixels, relative to the bounding box
+            max_dist distance outside of the contour still counted as near
+    """
+    dist = dist_map[rows, cols]
+    near = enclosed[rows, cols] | (dist <= max_dist)
+    for i in np.flatnonzero(~near & (dist <= max_dist + 1)):
+        near[i] = cv2.pointPolygonTest(cntr, (int(rect[0] + cols[i]), int(rect[1] + rows[i])), True) >= -max_dist
+    return near
+
+def force_majority_type(img, label_map, confidence, box, cntr, rect, cntr_maps, day, types_to_colors, small_contour):
+    """ Recolors the pixels of the plant types of a box near its contour to the most
+        common type of the box, unless the type is common or confident enough.
+        args
+            img RGB mask, recolored in place
+            label_map type index + 1 of every pixel of img (0 for none), kept up to date
+            confidence confidence image of the mask
+            box (x, y, w, h) box of the pixels
+            cntr contour of the box
+            rect (x, y, w, h) bounding box of the contour
+            cntr_maps (dist_map, enclosed) of the contour, see contour_distance_map
+            day days since planting
+            types_to_colors colors of the plant types
+            small_contour keep types by the confidence rather than its square, for contours
+                smaller than 400 pixels
+    """
+    x, y, w, h = box
+    types = list(types_to_colors)
+    labels = label_map[y:y+h, x:x+w]
+    colors = np.bincount(labels.ravel(), minlength=len(types) + 1)[1:]
+    force = int(np.argmax(colors))
+    val = int(colors[force]) + 0.0
+    for t, type in enumerate(types):
+        if colors[t] == 0:
+            continue
+        # Pixels recolored to force so far count towards force.
+        rows, cols = np.nonzero(labels == t + 1)
+        count = len(rows)
+        if count > calc_max_contour(day): #4000 sparse, 6000 mid, 7500 dense
+            continue
+        # Summed in pixel order like a running total, to round the same.
+        count1 = np.cumsum(confidence[y + rows, x + cols, 1] * 1.0 / 255)[-1]
+        c_mul = (count * 1. / count1)
+        if small_contour:
+            if int(colors[t]) / val > calc_multiplier(day) * c_mul: #0.6/0.7 small; 0.3 mid; 0.1 dense
+                continue
+        elif not (types[force] == 'arugula' and type == 'turnip') and \
+                int(colors[t]) / val > calc_multiplier(day) * c_mul ** 2:
+            continue
+        near = near_contour(cntr, rect, *cntr_maps, rows + y - rect[1], cols + x - rect[0], 2 + val ** .25)
+        img[y + rows[near], x + cols[near]] = types_to_colors[types[force]]
+        labels[rows[near], cols[near]] = force + 1
+
 def confidence_cleanup(image_name, day):
+    """ Recolors plant types making up little of a contour, with low confidence, to the
+        contour's main type. Large contours are cleaned up per quadrant first, then small
+        ones as a whole.
+        args
+            image_name name of the mask in model_out/
+            day days since planting
+    """
 
     TYPES_TO_COLORS = {
         "arugula": [61, 123, 0], #check
@@ -382,104 +376,30 @@ def confidence_cleanup(image_name, day):
 
     thresh = cv2.threshold(gray,5,255,cv2.THRESH_BINARY)[1]
 
-    result = img.copy()
-
     contours = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     contours = contours[0] if len(contours) == 2 else contours[1]
-    count = 0
-    count1 = 0
+
+    # The type colors are further apart than the tolerance, so each pixel has at most one type.
+    label_map = colors_to_labels(img, TYPES_TO_COLORS, {type: t + 1 for t, type in enumerate(TYPES_TO_COLORS)})
 
     for cntr in contours:
-        x,y,w,h = cv2.boundingRect(cntr)
+        rect = x,y,w,h = cv2.boundingRect(cntr)
         a = [[x, y, int(w/2), int(h/2)], [x, y + int(h/2), int(w/2), int(h/2)], [x + int(w/2), y, int(w/2), int(h/2)], [x + int(w/2), y + int(h/2), int(w/2), int(h/2)]]
         if (h < 400 and w < 400) or (h > 800 and w > 800):
             continue
-        for x, y, w, h in a:
-            small = img[y:y+h,x:x+w :]
-            small_c = confidence[y:y+h,x:x+w :]
-            t = w * h
-            colors = {}
-            for type, color in TYPES_TO_COLORS.items():
-                indices = np.where(np.all(np.abs(small - np.full(small.shape, color)) <= 5, axis=-1))
-                colors[type] = len(indices[0])
-            force = max(colors, key=colors.get)
-            val = colors[force] + 0.0
-
-            for type, color in TYPES_TO_COLORS.items():
-                if color == [0,0,0] or colors[type] == 0:
-                    continue
-
-                indices = np.where(np.all(np.abs(small - np.full(small.shape, color)) <= 5, axis=-1))
-                pixel_locations = zip(indices[0], indices[1])
-                pixel_locations_0 = zip(indices[0], indices[1])
-
-                if (len(indices[0]) > calc_max_contour(day)): #4000 sparse, 6000 mid, 7500 dense
-                    continue
-
-                count = 0
-                count1 = 0
-                for loc in pixel_locations_0:
-                    conf = small_c[loc[0]][loc[1]][1] * 1.0 / 255
-                    count1 += conf
-                    count+=1
-                c_mul = (count * 1. / count1)
-                if (force == 'arugula' and type == 'turnip'):
-                    c_mul = c_mul * 2
-                elif (colors[type] / val > calc_multiplier(day) * c_mul ** 2): #0.6/0.7 small; 0.3 mid; 0.1 dense
-                    continue
-                for loc in pixel_locations:
-                    if (cv2.pointPolygonTest(cntr,(x + loc[1], y + loc[0]), True) >= -2 - val ** .25):
-                        small[loc[0]][loc[1]] = TYPES_TO_COLORS[force]
-                        img[y + loc[0],x + loc[1], :] = TYPES_TO_COLORS[force]
-
+        cntr_maps = contour_distance_map(cntr, rect)
+        for box in a:
+            force_majority_type(img, label_map, confidence, box, cntr, rect, cntr_maps, day, TYPES_TO_COLORS, False)
 
     for cntr in contours:
-
-        x,y,w,h = cv2.boundingRect(cntr)
-        cv2.drawContours(result, contours, -1, (0, 255, 0), 1)
-        cv2.rectangle(result, (x, y), (x+w, y+h), (0, 0, 255), 1)
+        rect = x,y,w,h = cv2.boundingRect(cntr)
         if w > 400 or h > 400:
             continue
 
         if (w * h < 50):
             continue
-        small = img[y:y+h,x:x+w :]
-        small_c = confidence[y:y+h,x:x+w :]
-        t = w * h
-
-        colors = {}
-        for type, color in TYPES_TO_COLORS.items():
-            indices = np.where(np.all(np.abs(small - np.full(small.shape, color)) <= 5, axis=-1))
-            colors[type] = len(indices[0])
-        force = max(colors, key=colors.get)
-        val = colors[force] + 0.0
-
-        for type, color in TYPES_TO_COLORS.items():
-            if color == [0,0,0] or (colors[type] == 0):
-                continue
-
-            indices = np.where(np.all(np.abs(small - np.full(small.shape, color)) <= 5, axis=-1))
-            pixel_locations = zip(indices[0], indices[1])
-            pixel_locations_0 = zip(indices[0], indices[1])
-
-            if (len(indices[0]) > calc_max_contour(day)): #4000 sparse, 7500 mid, 7500 dense
-                continue
-
-            count = 0
-            count1 = 0
-            for loc in pixel_locations_0:
-                conf = small_c[loc[0]][loc[1]][1] * 1.0 / 255
-                count1 += conf
-                count+=1
-            c_mul = (count * 1. / count1)
-
-
-            if (colors[type] / val > calc_multiplier(day) * c_mul or colors[type] == 0): #0.6/0.7 small; 0.3 mid; 0.1 dense
-                continue
-            for loc in pixel_locations:
-                if (cv2.pointPolygonTest(cntr,(x + loc[1], y + loc[0]), True) >= -2 - val ** .25):
-                    small[loc[0]][loc[1]] = TYPES_TO_COLORS[force]
-                    img[y + loc[0],x + loc[1], :] = TYPES_TO_COLORS[force]
+        cntr_maps = contour_distance_map(cntr, rect)
+        force_majority_type(img, label_map, confidence, rect, cntr, rect, cntr_maps, day, TYPES_TO_COLORS, True)
 
     imsave('post_process/' + image_name + '.png', img)
 
@@ -5,6 +5,7 @@ from utils.geometry_utils import *
 # from centers_test import *
 from utils.constants import *
 from utils.center_constants import *
+import heapq
 import numpy as np
 import pickle as pkl
 import os
@@ -0,0 +1,116 @@
+import numpy as np
+from functools import lru_cache
+from utils.constants import TYPES_TO_COLORS, LABEL_ENC, COLORS, MASK_COLOR_TOLERANCE
+
+
+def pack_rgb(image):
+    """ Outputs the RGB pixels of an 8 bit image as integer keys r << 16 | g << 8 | b.
+        Args
+            image height x width x 3 RGB image
+    """
+    image = np.asarray(image)
+    return (image[..., 0].astype(np.int32) << 16) | (image[..., 1].astype(np.int32) << 8) | image[..., 2]
+
+
+def near_color(color, tolerance=MASK_COLOR_TOLERANCE):
+    """ Outputs a 256 x 3 lookup table, True where a channel value is within
+        tolerance of that channel of color.
+        Args
+            color RGB color
+            tolerance maximum difference per channel
+    """
+    return np.abs(np.arange(256)[:, np.newaxis] - np.asarray(color)) <= tolerance
+
+
+@lru_cache(maxsize=4)
+def label_lut(palette, tolerance=MASK_COLOR_TOLERANCE):
+    """ Outputs a lookup table from packed RGB keys to labels, 0 for colors
+        matching no entry of the palette. Later entries win where the
+        tolerances of two colors overlap.
+        Args
+            palette tuple of (label, (r, g, b)) pairs
+            tolerance maximum difference per channel
+    """
+    lut = np.zeros(1 << 24, dtype=np.uint8)
+    for label, color in palette:
+        r, g, b = (np.flatnonzero(near) for near in near_color(color, tolerance).T)
+        lut[(r[:, None, None] << 16) | (g[:, None] << 8) | b] = label
+    return lut
+
+
+def colors_to_labels(mask, types_to_colors=TYPES_TO_COLORS, label_enc=LABEL_ENC, tolerance=MASK_COLOR_TOLERANCE):
+    """ Outputs the label map of a color mask, the label of the plant type
+        whose color is within tolerance of each pixel, 0 if none is.
+        Args
+            mask RGB image
+            types_to_colors colors of the plant types, later types win ties
+            label_enc labels of the plant types
+            tolerance maximum difference per channel
+    """
+    palette = tuple((label_enc[plant_type], tuple(color)) for plant_type, color in types_to_colors.items())
+    return label_lut(palette, tolerance)[pack_rgb(mask)].astype(int)
+
+
+def labels_to_colors(label_map, colors=COLORS):
+    """ Outputs the color mask of a label map, black for unknown labels.
+        Args
+            label_map matrix of labels
+            colors color of each label
+    """
+    palette = np.vstack((np.asarray(colors, dtype=int), [(0, 0, 0)]))
+    label_map = np.asarray(label_map)
+    return palette[np.where((label_map >= 0) & (label_map < len(colors)), label_map, len(colors))]
+
+
+def binary_mask(plant_type, mask, types_to_colors=TYPES_TO_COLORS, tolerance=MASK_COLOR_TOLERANCE):
+    """ Outputs a uint8 RGB image, white where the mask is within tolerance of
+        the color of plant_type and black elsewhere.
+        Args
+            plant_type plant type to isolate
+            mask RGB image
+            types_to_colors colors of the plant types
+            tolerance maximum difference per channel
+    """
+    near = near_color(types_to_colors[plant_type], tolerance)
+    mask = np.asarray(mask)
+    inside = near[mask[..., 0], 0] & near[mask[..., 1], 1] & near[mask[..., 2], 2]
+    return np.repeat(inside[..., np.newaxis] * np.uint8(255), 3, axis=-1)
+
+
+def confidence_map(label_map, scor):
+    """ Returns an image of confidence for all predictions, whiter where the
+        predicted label is more confident.
+        Args
+            label_map matrix of predicted labels
+            scor the confidence of each predicted label
+    """
+    level = (255 * np.asarray(scor)).astype(int)
+    return np.stack((np.full(level.shape, 255), level, level), axis=-1)
+
+
+def correct_density_map(truth_label_map, label_map, scor):
+    """ Returns an image of confidence for correct predictions, black where the
+        prediction is wrong.
+        Args
+            truth_label_map matrix of ground truth labels
+            label_map matrix of predicted labels
+            scor the confidence of each predicted label
+    """
+    level = (255 * np.asarray(scor)).astype(int)
+    dmap = np.stack((level, level, np.full(level.shape, 255)), axis=-1)
+    dmap[np.asarray(truth_label_map) != np.asarray(label_map)] = 0
+    return dmap
+
+
+def sensitive_map(truth_label_map, label_map, scor):
+    """ Returns an image of confidence for incorrect predictions, black where the
+        prediction is right.
+        Args
+            truth_label_map matrix of ground truth labels
+            label_map matrix of predicted labels
+            scor the confidence of each predicted label
+    """
+    level = np.minimum((255 * np.asarray(scor)).astype(int) * 3, 255)
+    dmap = np.stack((np.full(level.shape, 255), level, level), axis=-1)
+    dmap[np.asarray(truth_label_map) == np.asarray(label_map)] = 0
+    return dmap
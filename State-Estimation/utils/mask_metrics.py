@@ -0,0 +1,108 @@
+import math
+import numpy as np
+from utils.geometry_utils import *
+from utils.centers_test import find_color
+from utils.circle_fitter import CircleFitter
+
+
+def com_extreme_points(old_center, plant_mask, radius=100):
+    '''Returns the center of mass of the plant pixels within radius of old_center (along
+    the axes) and its extreme points (max x, max y, min x, min y), same as
+    plant_COM_extreme_points. Ties go to the point with the larger other coordinate.
+    old_center: (x, y) pixel
+    plant_mask: boolean image of the plant pixels
+    radius: half size of the searched box
+    '''
+    x0, y0 = old_center
+    left, top = max(x0 - radius, 0), max(y0 - radius, 0)
+    ys, xs = np.nonzero(plant_mask[top:max(y0 + radius + 1, 0), left:max(x0 + radius + 1, 0)])
+    if not len(xs):
+        return old_center, ((-float("inf"), -float("inf")), (-float("inf"), -float("inf")),
+                            (float("inf"), float("inf")), (float("inf"), float("inf")))
+    xs, ys = xs + left, ys + top
+    center = (int(xs.sum()) / len(xs), int(ys.sum()) / len(ys))
+    extreme = [np.lexsort((ys, xs))[-1], np.lexsort((xs, ys))[-1], np.lexsort((-ys, xs))[0], np.lexsort((-xs, ys))[0]]
+    return center, tuple((int(xs[i]), int(ys[i])) for i in extreme)
+
+
+def plant_area(center, max_r, plant_mask, outside_radius=None):
+    '''Returns the number of plant pixels in the box of half size max_r around center,
+    same as get_total_plant_area.
+    center: (x, y) pixel
+    max_r: half size of the box, truncated to an int
+    plant_mask: boolean image of the plant pixels
+    outside_radius: only count the pixels further than this from center if given
+    '''
+    max_r = int(max_r)
+    left, top = max(center[0] - max_r, 0), max(center[1] - max_r, 0)
+    right, bottom = max(center[0] + max_r, 0), max(center[1] + max_r, 0)
+    box = plant_mask[top:bottom, left:right]
+    if outside_radius is None:
+        return int(np.count_nonzero(box))
+    xs = np.arange(left, left + box.shape[1]) - center[0]
+    ys = np.arange(top, top + box.shape[0]) - center[1]
+    outside = np.sqrt(xs ** 2 + ys[:, np.newaxis] ** 2) > outside_radius
+    return int(np.count_nonzero(box & outside))
+
+
+def disk_points(mask, center, r):
+    '''Returns whether each point of the disk of avg_fill_ratio is in the image and the
+    mask value there, as boolean arrays over the disk offsets. The disk has the rows
+    -int(r) to int(r), and the columns -dx to dx - 1 in each row.
+    mask: boolean image
+    center: (x, y), possibly fractional, points are truncated like int()
+    r: radius of the disk
+    '''
+    i = np.arange(-int(r), int(r) + 1)
+    # float_power rounds like ** on python floats.
+    dx = np.float_power(r**2 - i**2, .5).astype(int)
+    j = np.arange(-dx.max(), dx.max())
+    xs, ys = np.trunc(center[0] + i).astype(int), np.trunc(center[1] + j).astype(int)
+    valid_x, valid_y = (xs >= 0) & (xs < mask.shape[1]), (ys >= 0) & (ys < mask.shape[0])
+    valid = (j >= -dx[:, np.newaxis]) & (j < dx[:, np.newaxis]) & valid_x[:, np.newaxis] & valid_y
+    values = np.zeros(valid.shape, dtype=bool)
+    values[np.ix_(valid_x, valid_y)] = mask[np.ix_(ys[valid_y], xs[valid_x])].T
+    return valid, values & valid
+
+
+class MaskMetrics:
+    def __init__(self, img_arr):
+        '''Area, fill, exclusion and center of mass metrics of the circles fit to one
+        mask. The mask is decoded once, and the pixels of each plant color are found
+        once for all circles.
+        img_arr: RGB mask
+        '''
+        self.img_arr = img_arr
+        self.colored = np.any(img_arr > 100, axis=-1)
+        self.fitter = CircleFitter(img_arr)
+
+    def plant_mask(self, center):
+        '''Returns the boolean image of the pixels of the plant color closest to center,
+        the plant pixels of convert_to_plant_colorspace.
+        '''
+        return self.fitter.plant_mask(find_color(center, self.img_arr)[0])
+
+    def max_COM_radius(self, old_center, radius=100):
+        '''Same as max_COM_radius, the center of mass of the plant at old_center and the
+        distance to its furthest extreme point.
+        '''
+        center, extrema = com_extreme_points(old_center, self.plant_mask(old_center), radius)
+        return center, distance(max(extrema, key=lambda p: distance(p, center)), center)
+
+    def fill_ratio(self, c, r):
+        '''Share of the pixels of the circle in the image that are not black.'''
+        valid, colored = disk_points(self.colored, c, r)
+        return int(np.count_nonzero(colored)) / int(np.count_nonzero(valid))
+
+    def circle_to_plant_area_ratio(self, c, r):
+        '''Plant area around c, up to its max COM radius, over the area of the circle.'''
+        c = (round(c[0]), round(c[1]))
+        com, max_r = self.max_COM_radius(c, 120)
+        return plant_area(c, max_r, self.plant_mask(c)) / (math.pi * r**2)
+
+    def excluded_plant_area(self, c, r):
+        '''Share of the plant area around c, up to its max COM radius, outside the circle.'''
+        c = (round(c[0]), round(c[1]))
+        com, max_r = self.max_COM_radius(c, 140)
+        plant_mask = self.plant_mask(c)
+        return plant_area(c, max_r, plant_mask, r) / plant_area(c, max_r, plant_mask)
@@ -2,16 +2,16 @@ import cv2
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.patches import Circle
-import math
 import pickle as pkl
 from scipy.spatial import KDTree
 from itertools import combinations
-import heapq
-from collections import deque
 # from linearity import *
 from utils.center_constants import *
 from utils.geometry_utils import *
 from utils.centers_test import *
+from utils.mask_codec import binary_mask
+from utils.circle_fitter import CircleFitter, read_mask
+from utils.mask_metrics import MaskMetrics, com_extreme_points, plant_area
 # from linearity import *
 
 #####################################
@@ -78,54 +78,7 @@ def convert_to_plant_colorspace(old_center, img_arr, img, plant_type):
     return plant_img, plant_img_arr
 
 def plant_COM_extreme_points(old_center, img_arr, radius = 100):
-    total_x, total_y, count = 0, 0, 0
-    max_x, max_y, min_x, min_y = (-float("inf"), -float("inf")), (-float("inf"), -float("inf")), \
-        (float("inf"), float("inf")), (float("inf"), float("inf"))
-    for i in range(-radius, radius + 1):
-        for j in range(-radius, radius + 1):
-            cur_p = old_center[0] - i, old_center[1] - j
-            if not valid_point(cur_p, img_arr):
-                continue
-            if not_black(cur_p, img_arr):
-                total_x += cur_p[0]
-                total_y += cur_p[1]
-                count += 1
-                max_x, max_y, min_x, min_y = update_min_max(cur_p, max_x, max_y, min_x, min_y)
-    return ((total_x / count, total_y / count) if count > 0 else old_center), (max_x, max_y, min_x, min_y)
-
-def bfs(center, img_arr, termination_cond=lambda arr, recent_color_pts, p: len(arr) > 400, arr_oversided = lambda arr, r: 6.3*r < len(arr)):
-    visited = set()
-    color_pts = set()
-    recent_color_pts = 0
-    def distance_to_center(p1):
-        return sq_distance(p1, center)
-
-    def is_valid_color(point):
-        temp_rbg = img_arr[round(point[1])][round(point[0])]
-        temp_rbg = (temp_rbg[0], temp_rbg[1], temp_rbg[2])
-        return temp_rbg in COLORS
-    benchmark_r = 10
-    q = [(0, center)]
-    recent = deque([1])
-    while q:
-        current_r, cur_point = heapq.heappop(q)
-        benchmark_r = max(benchmark_r, current_r)
-        visited.add(cur_point)
-        if not_black(cur_point, img_arr):
-            color_pts.add(cur_point)
-            recent.append(1)
-            recent_color_pts += 1
-        else:
-            recent.append(0)
-        if arr_oversided(recent, benchmark_r):
-            color_pt = recent.popleft()
-            if color_pt:
-                recent_color_pts -= 1
-        if termination_cond(recent, recent_color_pts, cur_point):
-            return color_pts
-        for n in neighbors(cur_point, img_arr, visited):
-            heapq.heappush(q, (distance_to_center(n), n))
-    return color_pts
+    return com_extreme_points(old_center, np.any(img_arr > 100, axis=-1), radius)
 
 def get_models():
     return pkl.load(open(RADIUS_MODELS_PATH, "rb" ))
@@ -239,15 +192,7 @@ def merge_circles(circles):
     return list(merged)
 
 def prepare_binary_mask(plant_type, mask):
-    color = TYPES_TO_COLORS[plant_type]
-    offset = 5
-    indices = np.where(np.all(np.abs(mask - np.full(mask.shape, color)) <= offset, axis=-1))
-    coordinates = zip(indices[0], indices[1])
-    binary_mask = np.full(mask.shape, (0, 0, 0))
-    for coord in coordinates:
-        binary_mask[coord[0], coord[1]] = [255, 255, 255]
-    binary_mask = binary_mask.astype(np.uint8)
-    return binary_mask
+    return binary_mask(plant_type, mask, TYPES_TO_COLORS)
 
 def draw_circles_on_canvas(plant_circles, mask):
     canvas = np.full(mask.shape, [255, 255, 255]).astype(np.uint8)
@@ -270,48 +215,16 @@ def draw_circles_on_canvas(plant_circles, mask):
 
 
 def bfs_circle(path, old_center, max_radius=100, min_radius = 40, plant_type=None, side=None, **kwargs):
-    '''Uses BFS and a termination condition to find the plant.
+    '''Grows a disk around the prior center until the plant ends to find the plant.
     Path: relative path of the image
     old_center: prior center
     max_radius: max search distance
     min_radius: min radius for searching
 
+    To fit several circles to one image, read it once with read_mask and use a CircleFitter.
     '''
-    def termination_cond(arr, recent_color_pts, point):
-        plant_ended = recent_color_pts / len(arr) < .1
-        too_long = distance(point, old_center) > max_radius
-        too_small = distance(point, old_center) < min_radius
-        return (plant_ended or too_long) and not too_small
-
-    img, img_arr = get_img(path)
-    x, y, z = img.shape
-    if side == 'right':
-        cv2.rectangle(img, (0, 0), (y // 2, x), (0,0,0), -1)
-    if side == 'left':
-        cv2.rectangle(img, (y // 2, 0), (y, x), (0,0,0), -1)
-    img_arr = np.asarray(img)
-    img, _ = convert_to_plant_colorspace(old_center, img_arr, img, plant_type)
-    taken_circles = kwargs.get("taken_circles", tuple())
-    for circ_dict in taken_circles:
-        circ = circ_dict["circle"]
-        if int(round(circ[1])) >= 0:
-            img = cv2.circle(img, (int(circ[0][0]), int(circ[0][1])), int(round(circ[1])), (0,0,0), -1)
-
-
-    color_points = bfs(old_center, np.asarray(img), termination_cond)
-    sum_x, sum_y, extreme_pt = 0, 0, old_center
-    for p in color_points:
-        sum_x += p[0]
-        sum_y += p[1]
-        if distance(p, old_center) > distance(extreme_pt, old_center):
-            extreme_pt = p
-    center = (sum_x / len(color_points), sum_y / len(color_points))
-    center = ((center[0] + old_center[0]) / 2, (center[1] + old_center[1]) / 2)
-    extreme_pt = max(color_points, key=lambda p: sq_distance(center, p))
-    # extrema = get_extrema((round(center[0]), round(center[1])), path, radius)
-    # r =  max([distance(center, pt) for pt in extrema])
-    # r = distance(extreme_pt, center)
-    return center, min(extreme_pt, (center[0]+max_radius, center[1]), key=lambda p: sq_distance(center, p))
+    fitter = CircleFitter(read_mask(path, side))
+    return fitter.fit(old_center, max_radius, min_radius, plant_type, kwargs.get("taken_circles", tuple()))
 
 
 def extreme_points_circle(path, old_center, radius = 100):
@@ -329,9 +242,7 @@ def max_COM_radius(path, old_center, radius = 100):
     and the distance to the farthest extreme point as the radius
     '''
     img, img_arr = get_img(path)
-    img, img_arr = convert_to_plant_colorspace(old_center, img_arr, img)
-    center, (max_x, max_y, min_x, min_y) = plant_COM_extreme_points(old_center, img_arr, radius)
-    return center, distance(max(max_x, max_y, min_x, min_y, key=lambda p: distance(p,center)), center)
+    return MaskMetrics(img_arr).max_COM_radius(old_center, radius)
 
 def avg_COM_radius(path, old_center, radius = 100):
     '''
@@ -339,8 +250,7 @@ def avg_COM_radius(path, old_center, radius = 100):
     and the average distances to the extreme points as the radius
     '''
     img, img_arr = get_img(path)
-    img, img_arr = convert_to_plant_colorspace(old_center, img_arr, img)
-    center, (max_x, max_y, min_x, min_y) = plant_COM_extreme_points(old_center, img_arr, radius)
+    center, (max_x, max_y, min_x, min_y) = com_extreme_points(old_center, MaskMetrics(img_arr).plant_mask(old_center), radius)
     return center, sum([distance(p,center) for p in [max_x, max_y, min_x, min_y]]) / 4
 
 def min_COM_radius(path, old_center, radius = 100):
@@ -349,8 +259,7 @@ def min_COM_radius(path, old_center, radius = 100):
     and the distance to the CLOSEST extreme point as the radius
     '''
     img, img_arr = get_img(path)
-    img, img_arr = convert_to_plant_colorspace(old_center, img_arr, img)
-    center, (max_x, max_y, min_x, min_y) = plant_COM_extreme_points(old_center, img_arr, radius)
+    center, (max_x, max_y, min_x, min_y) = com_extreme_points(old_center, MaskMetrics(img_arr).plant_mask(old_center), radius)
     return center, distance(min(max_x, max_y, min_x, min_y, key=lambda p: distance(p,center)), center)
 
 def contour_fit_circles(path, benchmark_circles):
@@ -385,68 +294,33 @@ def contour_fit_circles(path, benchmark_circles):
 ########## ACCURACY METRICS ##########
 ######################################
 
+# The metrics read the mask once and share it across circles, see MaskMetrics.
+
 def avg_fill_ratio(centers, radii, path):
     img, img_arr = get_img(path)
-    color_ratios = []
-    for c, r in zip(centers, radii):
-        if r == float("inf") or r == None   :
-            continue
-        total_points, color_points = 0, 0
-        for i in range(-int(r), int(r)+1):
-            dx = int((r**2 - i**2)**.5)
-            for j in range(-dx, dx):
-                cur_p = int(c[0]+i), int(c[1]+j)
-                if valid_point(cur_p, img_arr):
-                    total_points += 1
-                    if not_black(cur_p, img_arr):
-                        color_points += 1
-        color_ratios.append(color_points / total_points)
+    metrics = MaskMetrics(img_arr)
+    color_ratios = [metrics.fill_ratio(c, r) for c, r in zip(centers, radii) if not (r == float("inf") or r == None)]
     return sum(color_ratios) / len(color_ratios)
 
-def get_total_plant_area(c, max_r, img_arr, condition = lambda x, y: True):
-    ''' Gets the total plant area based on an optional condition (lambda x, y: f(x,y)) inside of the circle
-    defined by c, max_r'''
-    color_count = 0
+def get_total_plant_area(c, max_r, img_arr, outside_radius = None):
+    ''' Gets the total plant area inside of the box of half size max_r around c, optionally only the
+    part further than outside_radius from c'''
     c = (round(c[0]), round(c[1]))
-    max_r = int(max_r)
-    for i in range(-max_r, max_r):
-        for j in range(-max_r, max_r):
-            cur_p = (round(c[0] + i), round(c[1] + j))
-            if valid_point(cur_p, img_arr) and not_black(cur_p, img_arr) \
-                and condition(cur_p[0], cur_p[1]):
-                color_count += 1
-    return color_count
+    return plant_area(c, max_r, np.any(img_arr > 100, axis=-1), outside_radius)
 
 def avg_circle_to_plant_area_ratio(centers, radii, path):
-    color_ratios = []
     original_img, original_img_arr = get_img(path)
-    for c, r in zip(centers, radii):
-        c = (round(c[0]), round(c[1]))
-        img, img_arr = convert_to_plant_colorspace(c, original_img_arr, original_img)
-        # Find the max viable radius for this plant
-        com, max_r = max_COM_radius(path, c, 120)
-        max_r = int(max_r)
-        color_count = 0
-        for i in range(-max_r, max_r):
-            for j in range(-max_r, max_r):
-                cur_p = (round(c[0] + i), round(c[1] + j))
-                if valid_point(cur_p, img_arr) and not_black(cur_p, img_arr):
-                    color_count += 1
-        color_ratios.append(color_count / (math.pi * r**2))
+    metrics = MaskMetrics(original_img_arr)
+    color_ratios = [metrics.circle_to_plant_area_ratio(c, r) for c, r in zip(centers, radii)]
     return sum(color_ratios) / len(color_ratios)
 
 def avg_excluded_plant_area(centers, radii, path):
     color_ratios = []
     original_img, original_img_arr = get_img(path)
+    metrics = MaskMetrics(original_img_arr)
     for c, r in zip(centers, radii):
-        c = (round(c[0]), round(c[1]))
-        img, img_arr = convert_to_plant_colorspace(c, original_img_arr, original_img)
-        # Find the max viable radius for this plant
-        com, max_r = max_COM_radius(path, c, 140)
-        excluded_plant = get_total_plant_area(c, max_r, img_arr, lambda x, y: distance((x,y), c) > r)
-        total_plant = get_total_plant_area(c, max_r, img_arr)
         try:
-            color_ratios.append(excluded_plant / total_plant)
+            color_ratios.append(metrics.excluded_plant_area(c, r))
         except ZeroDivisionError:
             continue
     return sum(color_ratios) / len(color_ratios)
@@ -0,0 +1,60 @@
+import os
+import hashlib
+import pickle as pkl
+from utils.constants import CACHE_LOC
+
+
+def file_digest(path, chunk_size=1 << 20):
+    '''Returns the SHA-1 hex digest of the contents of a file.
+    path: path of the file
+    chunk_size: bytes read at a time
+    '''
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stage_key(stage, *inputs):
+    '''Returns the key of a stage run on inputs, the SHA-1 hex digest of their pickle.
+    The key of an upstream stage or the digest of an input file stands for its contents.
+    stage: name of the stage
+    inputs: keys, digests and parameters the stage output depends on
+    '''
+    return hashlib.sha1(pkl.dumps((stage,) + inputs, protocol=4)).hexdigest()
+
+
+class StageCache:
+    def __init__(self, root=CACHE_LOC):
+        '''On disk cache of the outputs of the tracking stages, addressed by the key of
+        the stage and its inputs. Changing a parameter of a stage changes its key and
+        the keys of the stages downstream of it, so only those are recomputed.
+        root: folder of the cache, one subfolder per stage
+        '''
+        self.root = root
+
+    def path(self, stage, key):
+        '''Returns the path of the output of a stage.'''
+        return os.path.join(self.root, stage, key + ".p")
+
+    def run(self, stage, compute, *inputs):
+        '''Returns the key of the stage and its output, loaded from the cache or computed
+        and stored if missing.
+        stage: name of the stage
+        compute: function of no arguments computing the output
+        inputs: keys, digests and parameters the output depends on, see stage_key
+        '''
+        key = stage_key(stage, *inputs)
+        path = self.path(stage, key)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                return key, pkl.load(f)
+        out = compute()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written aside and renamed, so an interrupted run never leaves a partial output.
+        tmp_path = path + ".{}.tmp".format(os.getpid())
+        with open(tmp_path, "wb") as f:
+            pkl.dump(out, f, protocol=4)
+        os.replace(tmp_path, path)
+        return key, out
@@ -0,0 +1,98 @@
+import numpy as np
+from utils.constants import IM_HEIGHT, IM_WIDTH, TILE_STRIDE, TILE_BATCH_SIZE
+
+
+def tile_starts(length, tile_length, stride=TILE_STRIDE):
+    """ Outputs the offsets of the tiles along one image axis: one every stride
+        pixels, plus a last one flush with the far edge of the image.
+        Args
+            length size of the image along the axis
+            tile_length size of a tile along the axis
+            stride distance between consecutive tiles
+    """
+    return list(range(0, length - tile_length, stride)) + [max(0, length - tile_length)]
+
+
+def tile_offsets(image_shape, stride=TILE_STRIDE):
+    """ Outputs the (row, col) offsets of all tiles covering an image, in row major
+        order, the order in which later tiles overwrite earlier ones.
+        Args
+            image_shape shape of the overhead image
+            stride distance between consecutive tiles
+    """
+    return [(i, j) for i in tile_starts(image_shape[0], IM_HEIGHT, stride)
+            for j in tile_starts(image_shape[1], IM_WIDTH, stride)]
+
+
+def predict_tile_batches(test_image, model, stride=TILE_STRIDE, batch_size=TILE_BATCH_SIZE):
+    """ Extracts all tiles of an overhead image up front and predicts them in
+        batches with a single forward pass each.
+        Yields (offsets, softmaxes) per batch, softmaxes is a batch x IM_HEIGHT x
+        IM_WIDTH x N_CLASSES array.
+        Args
+            test_image RGB overhead image
+            model Semantic segmentation model used for prediction
+            stride distance between consecutive tiles
+            batch_size number of tiles per forward pass
+    """
+    offsets = tile_offsets(test_image.shape, stride)
+    for start in range(0, len(offsets), batch_size):
+        batch_offsets = offsets[start:start + batch_size]
+        tiles = np.zeros((len(batch_offsets), IM_HEIGHT, IM_WIDTH, 3), dtype=np.float32)
+        for tile, (i, j) in zip(tiles, batch_offsets):
+            tile[:] = test_image[i:i+IM_HEIGHT, j:j+IM_WIDTH]
+        yield batch_offsets, np.asarray(model.predict_on_batch(tiles))
+
+
+def generate_full_scores(test_image, model, stride=TILE_STRIDE, batch_size=TILE_BATCH_SIZE, blend=False):
+    """ Outputs the softmax scores of every pixel of an overhead image, a
+        height x width x N_CLASSES array.
+        Where tiles overlap, the last tile wins unless blend is set, in which case
+        the softmaxes of all tiles covering a pixel are averaged.
+        Args
+            test_image RGB overhead image
+            model Semantic segmentation model used for prediction
+            stride distance between consecutive tiles
+            batch_size number of tiles per forward pass
+            blend average overlapping tiles instead of overwriting them
+    """
+    scores = None
+    counts = np.zeros(test_image.shape[:2]) if blend else None
+    for batch_offsets, softmaxes in predict_tile_batches(test_image, model, stride, batch_size):
+        if scores is None:
+            scores = np.zeros(test_image.shape[:2] + softmaxes.shape[-1:])
+        for softmax, (i, j) in zip(softmaxes, batch_offsets):
+            if blend:
+                scores[i:i+IM_HEIGHT, j:j+IM_WIDTH] += softmax
+                counts[i:i+IM_HEIGHT, j:j+IM_WIDTH] += 1
+            else:
+                scores[i:i+IM_HEIGHT, j:j+IM_WIDTH] = softmax
+    if blend:
+        scores /= np.maximum(counts, 1)[..., None]
+    return scores
+
+
+def generate_label_and_score_maps(test_image, model, stride=TILE_STRIDE, batch_size=TILE_BATCH_SIZE, blend=False):
+    """ Outputs the predicted label (argmax) and its score (max softmax) for every
+        pixel of an overhead image.
+        Without blending, the maps are stitched tile by tile so the full softmax
+        array is never held in memory.
+        Args
+            test_image RGB overhead image
+            model Semantic segmentation model used for prediction
+            stride distance between consecutive tiles
+            batch_size number of tiles per forward pass
+            blend average overlapping tiles instead of overwriting them
+    """
+    if blend:
+        scores = generate_full_scores(test_image, model, stride, batch_size, blend)
+        return np.argmax(scores, axis=-1), np.amax(scores, axis=-1)
+    base_map = np.full((test_image.shape[0], test_image.shape[1]), 0)
+    prescor = np.full((test_image.shape[0], test_image.shape[1]), 0.)
+    for batch_offsets, softmaxes in predict_tile_batches(test_image, model, stride, batch_size):
+        predictions = np.argmax(softmaxes, axis=-1)
+        scors = np.amax(softmaxes, axis=-1)
+        for prediction, scor, (i, j) in zip(predictions, scors, batch_offsets):
+            base_map[i:i+IM_HEIGHT, j:j+IM_WIDTH] = prediction
+            prescor[i:i+IM_HEIGHT, j:j+IM_WIDTH] = scor
+    return base_map, prescor